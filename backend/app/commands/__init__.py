@@ -0,0 +1,5 @@
+"""
+Maintenance commands
+
+Run with: python -m app.commands.<name> --help
+"""
@@ -0,0 +1,251 @@
+"""
+Compact memory_exercise_sessions: intern configs, drop derivable score breakdowns
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Run after migration 012 and the deploy of the version that reads configs
+from exercise_configs, then apply migration 013. Until then sessions not
+compacted yet are served from their inline config, so the command may also
+run before the deploy to shorten the run after it. Walks the table in
+primary-key order a chunk at a time:
+  1. sessions still carrying an inline config get the id of its interned
+     copy in exercise_configs, and the inline config is cleared,
+  2. stored score breakdowns equal to the one derived from the columns
+     are cleared; the others (e.g. scored under older rules, see
+     app.commands.rescore) are kept.
+
+Every chunk is committed on its own, so the command can run online and be
+interrupted and re-run. Prints the size of the table (heap, TOAST or
+SQLite overflow pages, indexes) and the time of a full scan before and
+after. On PostgreSQL the freed space is reused by new rows after a
+VACUUM; VACUUM FULL (or pg_repack) gives it back to the operating system.
+
+Usage:
+    python -m app.commands.compact_sessions
+    python -m app.commands.compact_sessions --dry-run
+    python -m app.commands.compact_sessions --report-only
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import JSON, Integer, bindparam, column, inspect, or_, select, table, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal, engine
+from app.services import scoring
+from app.services.config_service import ConfigService, config_hash
+
+TABLE = "memory_exercise_sessions"
+
+# Rows fetched per round trip by the scan of the report
+SCAN_CHUNK_SIZE = 10000
+
+_SCORE_COLUMNS = (
+    "exercise_type", "difficulty", "is_completed", "final_score", "time_elapsed_ms", "total_moves",
+    "correct_moves", "incorrect_moves", "max_sequence_reached",
+)
+
+
+def _sessions(with_inline_config: bool):
+    """Lightweight table of the columns compaction touches (the ORM no longer maps config)"""
+    columns = [
+        column("id", Integer), column("config_id", Integer), column("score_breakdown", JSON(none_as_null=True)),
+        *(column(name) for name in _SCORE_COLUMNS),
+    ]
+    if with_inline_config:
+        columns.append(column("config", JSON(none_as_null=True)))
+    return table(TABLE, *columns)
+
+
+def compact(db: Session, chunk_size: int = 10000, dry_run: bool = False) -> Tuple[int, int, int]:
+    """
+    Compact every session, committing after each chunk
+
+    Returns:
+        (scanned, configs interned, breakdowns dropped) session counts
+    """
+    inline = "config" in {c["name"] for c in inspect(db.get_bind()).get_columns(TABLE)}
+    sessions = _sessions(inline)
+    pending = [sessions.c.score_breakdown.isnot(None)]
+    if inline:
+        pending.append(sessions.c.config_id.is_(None))
+    configs = ConfigService.load_all(db)
+
+    set_config = (
+        update(sessions)
+        .where(sessions.c.id == bindparam("b_id"))
+        .values(config_id=bindparam("b_config_id"), config=None)
+    ) if inline else None
+    drop_breakdown = (
+        update(sessions)
+        .where(sessions.c.id == bindparam("b_id"))
+        .values(score_breakdown=None)
+    )
+
+    scanned = interned = dropped = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            # JSON 'null' (stored by older versions) reads as None like SQL NULL
+            select(sessions, sessions.c.score_breakdown.isnot(None).label("has_breakdown"))
+            .where(sessions.c.id > last_id, or_(*pending))
+            .order_by(sessions.c.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            break
+
+        # 1. Intern inline configs
+        config_params = []
+        if inline:
+            inline_rows = [row for row in rows if row["config_id"] is None and row["config"] is not None]
+            ids = ConfigService.intern_many(db, [row["config"] for row in inline_rows])
+            for row in inline_rows:
+                config_id = ids[config_hash(row["config"])]
+                configs.setdefault(config_id, row["config"])
+                config_params.append({"b_id": row["id"], "b_config_id": config_id})
+
+        # 2. Drop breakdowns equal to the derived ones ('null' JSON included)
+        breakdown_params = [{"b_id": row["id"]} for row in _derivable(rows, configs)]
+
+        if not dry_run:
+            if config_params:
+                db.execute(set_config, config_params)
+            if breakdown_params:
+                db.execute(drop_breakdown, breakdown_params)
+            db.commit()
+        else:
+            db.rollback()
+
+        scanned += len(rows)
+        interned += len(config_params)
+        dropped += len(breakdown_params)
+        last_id = rows[-1]["id"]
+
+    return scanned, interned, dropped
+
+
+def _derivable(rows: List, configs: Dict[int, Dict[str, Any]]) -> List:
+    """Rows storing a JSON 'null' breakdown or the one score_breakdown would derive anyway"""
+    derivable = [row for row in rows if row["has_breakdown"] and row["score_breakdown"] is None]
+    scored = [
+        row for row in rows
+        if row["score_breakdown"] is not None and row["is_completed"] and row["final_score"] is not None
+    ]
+    if scored:
+        derived = scoring.row_breakdowns(
+            [row["exercise_type"] for row in scored],
+            [row["difficulty"] for row in scored],
+            [_config(row, configs) for row in scored],
+            [row["final_score"] for row in scored],
+            [row["time_elapsed_ms"] for row in scored],
+            [row["total_moves"] for row in scored],
+            [row["correct_moves"] for row in scored],
+            [row["incorrect_moves"] for row in scored],
+            [row["max_sequence_reached"] for row in scored],
+        )
+        derivable.extend(row for row, breakdown in zip(scored, derived) if row["score_breakdown"] == breakdown)
+    return derivable
+
+
+def _config(row, configs: Dict[int, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if row["config_id"] is not None:
+        return configs.get(row["config_id"])
+    return row.get("config")
+
+
+def storage_report(conn: Connection) -> Dict[str, float]:
+    """Rows, sizes in bytes (None where the database cannot tell) and full scan times of the table"""
+    report: Dict[str, Optional[float]] = {"heap": None, "toast": None, "indexes": None}
+    if conn.dialect.name == "postgresql":
+        # Leaf partitions of the partitioned table (007), or the table itself
+        heap, toast, indexes = conn.execute(text(
+            """
+            SELECT coalesce(sum(pg_relation_size(c.oid)), 0),
+                   coalesce(sum(CASE WHEN c.reltoastrelid <> 0 THEN pg_total_relation_size(c.reltoastrelid) END), 0),
+                   coalesce(sum(pg_indexes_size(c.oid)), 0)
+            FROM pg_partition_tree(CAST(:table AS regclass)) t
+            JOIN pg_class c ON c.oid = t.relid
+            WHERE t.isleaf
+            """
+        ), {"table": TABLE}).one()
+        report.update(heap=heap, toast=toast, indexes=indexes)
+    elif conn.dialect.name == "sqlite":
+        try:
+            pages = conn.execute(text(
+                "SELECT name, pagetype, sum(pgsize) FROM dbstat "
+                "WHERE name = :table OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = :table AND type = 'index') "
+                "GROUP BY name, pagetype"
+            ), {"table": TABLE}).all()
+        except Exception:  # SQLite built without the dbstat table
+            pages = None
+        if pages is not None:
+            report.update(heap=0, toast=0, indexes=0)
+            for name, pagetype, size in pages:
+                key = "indexes" if name != TABLE else "toast" if pagetype == "overflow" else "heap"
+                report[key] += size
+    if report["heap"] is not None:
+        report["total"] = report["heap"] + report["toast"] + report["indexes"]
+
+    # In the database: every row read up to its last column, nothing sent
+    started = time.perf_counter()
+    conn.execute(text(f"SELECT count(updated_at) FROM {TABLE}")).scalar()
+    report["db_scan_seconds"] = time.perf_counter() - started
+
+    # To the client, as exports and rescoring read it
+    started = time.perf_counter()
+    rows = 0
+    result = conn.execution_options(yield_per=SCAN_CHUNK_SIZE).execute(text(f"SELECT * FROM {TABLE}"))
+    for chunk in result.partitions():
+        rows += len(chunk)
+    report["rows"] = rows
+    report["scan_seconds"] = time.perf_counter() - started
+    return report
+
+
+def _print_report(label: str, report: Dict[str, float]) -> None:
+    sizes = ", ".join(
+        f"{name} {report[name] / 1048576:.1f} MiB"
+        for name in ("heap", "toast", "indexes", "total") if report.get(name) is not None
+    ) or "sizes unavailable"
+    rate = report["rows"] / report["scan_seconds"] if report["scan_seconds"] else 0.0
+    print(
+        f"{label}: {report['rows']} rows, {sizes}; full scan {report['db_scan_seconds']:.2f}s in the database, "
+        f"{report['scan_seconds']:.2f}s to the client ({rate:,.0f} rows/s)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Sessions read and written per batch")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing it")
+    parser.add_argument("--report-only", action="store_true", help="Only print the size and scan report")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        _print_report("Before" if not args.report_only else "Sessions", storage_report(conn))
+    if args.report_only:
+        return
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        scanned, interned, dropped = compact(db, args.chunk_size, args.dry_run)
+        print(
+            f"Scanned {scanned} sessions in {time.perf_counter() - started:.1f}s: "
+            f"{interned} configs interned, {dropped} score breakdowns dropped"
+            f"{' (dry run)' if args.dry_run else ''}"
+        )
+    finally:
+        db.close()
+
+    if not args.dry_run:
+        with engine.connect() as conn:
+            _print_report("After", storage_report(conn))
+
+
+if __name__ == "__main__":
+    main()
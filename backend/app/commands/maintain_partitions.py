@@ -0,0 +1,166 @@
+"""
+Maintain the monthly partitions of memory_exercise_sessions (PostgreSQL)
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Run daily (cron / scheduled job) after migrations 007 and 014:
+  1. creates the partitions of the coming months, moving rows of those
+     months out of the default partition,
+  2. detaches partitions older than the retention window,
+  3. exports each detached partition to Parquet (see app.services.session_archive)
+     and drops it once the file is written.
+
+A partition detached by an interrupted run is picked up again by the next
+one, so the command is safe to re-run at any point.
+
+Usage:
+    python -m app.commands.maintain_partitions
+    python -m app.commands.maintain_partitions --retention-months 12 --dry-run
+    python -m app.commands.maintain_partitions --keep-detached
+"""
+
+import argparse
+import re
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.database import engine
+from app.services import session_archive
+
+PARENT = "memory_exercise_sessions"
+LOCK_TIMEOUT = "5s"
+
+_PARTITION_NAME = re.compile(r"^memory_exercise_sessions_p(\d{4})(\d{2})$")
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month `count` months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _monthly_tables(conn: Connection, attached: bool) -> List[Tuple[str, date]]:
+    """Monthly partition tables that are (or are no longer) attached to the parent"""
+    rows = conn.execute(text(
+        """
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = current_schema()
+        WHERE c.relkind = 'r'
+          AND c.relname LIKE :pattern
+          AND EXISTS (
+              SELECT 1 FROM pg_inherits i
+              WHERE i.inhrelid = c.oid AND i.inhparent = CAST(:parent AS regclass)
+          ) = :attached
+        """
+    ), {"pattern": f"{PARENT}_p%", "parent": PARENT, "attached": attached}).scalars()
+
+    tables = []
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            tables.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(tables, key=lambda item: item[1])
+
+
+def create_upcoming(conn: Connection, months_ahead: int, dry_run: bool) -> List[str]:
+    """
+    Create the partitions of the current month and the next `months_ahead` months
+
+    A month with rows in the default partition briefly locks the parent
+    while they are moved (see migrations/014), under the same lock_timeout
+    as detach_expired.
+    """
+    current = date.today().replace(day=1)
+    months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+    if dry_run:
+        return [f"{PARENT}_p{month:%Y%m}" for month in months]
+    conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+    created = [
+        conn.execute(text("SELECT create_memory_session_partition(:month)"), {"month": month}).scalar_one()
+        for month in months
+    ]
+    conn.execute(text("RESET lock_timeout"))
+    return created
+
+
+def detach_expired(conn: Connection, retention_months: int, dry_run: bool) -> List[str]:
+    """
+    Detach partitions whose whole month is older than the retention window
+
+    DETACH ... CONCURRENTLY is not allowed while a default partition exists,
+    so the plain form is used: it briefly takes an ACCESS EXCLUSIVE lock on
+    the parent. lock_timeout makes it give up (and the next run retry)
+    rather than queue behind a long query and stall every session request.
+    """
+    cutoff = add_months(date.today().replace(day=1), -retention_months)
+    expired = [name for name, month in _monthly_tables(conn, attached=True) if add_months(month, 1) <= cutoff]
+    if not dry_run:
+        conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        for name in expired:
+            conn.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION "{name}"'))
+        conn.execute(text("RESET lock_timeout"))
+    return expired
+
+
+def archive_detached(conn: Connection, archive_dir: str, keep_detached: bool, dry_run: bool) -> List[Tuple[str, int]]:
+    """
+    Export every detached monthly table to Parquet, then drop it
+
+    Tables whose file already exists (kept with --keep-detached, or left by
+    an interrupted run) are not exported again. Returns (table, rows
+    exported) pairs.
+    """
+    archived = []
+    for name, month in _monthly_tables(conn, attached=False):
+        path = session_archive.archive_path(month, archive_dir)
+        if dry_run:
+            archived.append((name, 0))
+            continue
+        rows = 0
+        if not path.exists():
+            # Server-side cursors need a transaction: read on a separate connection
+            with conn.engine.connect() as reader:
+                rows = session_archive.export_table(reader, name, path)
+        if not keep_detached:
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        archived.append((name, rows))
+    return archived
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months-ahead", type=int, default=settings.SESSION_PARTITION_MONTHS_AHEAD)
+    parser.add_argument(
+        "--retention-months",
+        type=int,
+        default=settings.SESSION_RETENTION_MONTHS,
+        help="Months of sessions kept in the database (0 = never detach)",
+    )
+    parser.add_argument("--archive-dir", default=settings.SESSION_ARCHIVE_DIR)
+    parser.add_argument("--keep-detached", action="store_true", help="Do not drop tables after exporting them")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be done")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        parser.error("session partitioning requires PostgreSQL")
+
+    # Autocommit: each DDL statement commits (and releases its locks) on its own
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in create_upcoming(conn, args.months_ahead, args.dry_run):
+            print(f"Partition {name} ready")
+
+        if args.retention_months > 0:
+            for name in detach_expired(conn, args.retention_months, args.dry_run):
+                print(f"Detached {name}")
+
+        for name, rows in archive_detached(conn, args.archive_dir, args.keep_detached, args.dry_run):
+            print(f"Archived {name} ({rows} sessions)")
+
+
+if __name__ == "__main__":
+    main()
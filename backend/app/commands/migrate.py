@@ -0,0 +1,44 @@
+"""
+Create the database tables that do not exist yet
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Run once per deploy, before starting the API (the app no longer creates
+tables on import). Existing tables are left untouched: schema changes to
+them ship as SQL files in migrations/.
+
+Usage:
+    python -m app.commands.migrate
+    python -m app.commands.migrate --wait 60     # retry while the database starts
+"""
+
+import argparse
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from app import models  # noqa: F401  (registers every table on Base.metadata)
+from app.core.database import Base, engine
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wait", type=float, default=30.0, help="Seconds to keep retrying an unreachable database")
+    args = parser.parse_args()
+
+    deadline = time.monotonic() + args.wait
+    while True:
+        try:
+            Base.metadata.create_all(bind=engine)
+            break
+        except OperationalError as e:
+            if time.monotonic() >= deadline:
+                raise
+            print(f"Database unreachable, retrying: {e.orig}")
+            time.sleep(1)
+
+    print(f"Schema ready ({len(Base.metadata.tables)} tables)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Rebuild leaderboard_entries from completed sessions
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Usage:
+    python -m app.commands.rebuild_leaderboards
+"""
+
+import argparse
+
+from app.core.database import SessionLocal
+from app.services import session_archive
+from app.services.leaderboard_service import LeaderboardService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ignore-archive", action="store_true", help=session_archive.IGNORE_ARCHIVE_HELP)
+    args = parser.parse_args()
+
+    refusal = session_archive.rebuild_refusal()
+    if refusal and not args.ignore_archive:
+        parser.error(refusal)
+
+    db = SessionLocal()
+    try:
+        written = LeaderboardService.rebuild(db)
+    finally:
+        db.close()
+
+    print(f"Rebuilt {written} leaderboard entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Rebuild skill_ratings by replaying ranked sessions
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Sessions are replayed per user and exercise type in start order, streamed
+from the database, so memory use does not depend on the history size.
+Months archived by maintain_partitions would be left out, so the command
+refuses to run once there are some (unless --ignore-archive).
+
+Usage:
+    python -m app.commands.rebuild_ratings
+    python -m app.commands.rebuild_ratings --chunk-size 50000
+"""
+
+import argparse
+import time
+
+from app.core.database import SessionLocal
+from app.services import session_archive
+from app.services.rating_service import REBUILD_CHUNK_SIZE, RatingService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--chunk-size", type=int, default=REBUILD_CHUNK_SIZE, help="Sessions read and ratings written per batch"
+    )
+    parser.add_argument("--ignore-archive", action="store_true", help=session_archive.IGNORE_ARCHIVE_HELP)
+    args = parser.parse_args()
+
+    refusal = session_archive.rebuild_refusal()
+    if refusal and not args.ignore_archive:
+        parser.error(refusal)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        written = RatingService.rebuild(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+
+    print(f"Rebuilt {written} skill ratings in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
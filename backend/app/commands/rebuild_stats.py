@@ -0,0 +1,43 @@
+"""
+Rebuild the user_exercise_stats rollup from session history
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Only sessions still in the database are counted, so the command refuses
+to run once maintain_partitions has archived months; --ignore-archive
+rebuilds without them.
+
+Usage:
+    python -m app.commands.rebuild_stats            # All users
+    python -m app.commands.rebuild_stats --user-id 42
+"""
+
+import argparse
+
+from app.core.database import SessionLocal
+from app.services import session_archive
+from app.services.stats_service import StatsRollupService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rows")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows written per batch")
+    parser.add_argument("--ignore-archive", action="store_true", help=session_archive.IGNORE_ARCHIVE_HELP)
+    args = parser.parse_args()
+
+    refusal = session_archive.rebuild_refusal()
+    if refusal and not args.ignore_archive:
+        parser.error(refusal)
+
+    db = SessionLocal()
+    try:
+        written = StatsRollupService.rebuild(db, user_id=args.user_id, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+
+    print(f"Rebuilt {written} user_exercise_stats rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Rescore completed sessions with the current scoring rules
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Walks memory_exercise_sessions in primary-key order a chunk at a time,
+scores each chunk with the vectorized scoring module and writes back only
+the sessions whose score changed or that store a breakdown (which then
+matches the derived one and is dropped). Rollups, leaderboards,
+score sketches and ratings are rebuilt afterwards since all are derived
+from final_score. Those rebuilds read the database only, so the command
+refuses to run once months are archived unless --skip-rebuild or
+--ignore-archive is passed.
+
+Usage:
+    python -m app.commands.rescore
+    python -m app.commands.rescore --exercise-type sequence_memory --dry-run
+    python -m app.commands.rescore --chunk-size 20000 --skip-rebuild
+"""
+
+import argparse
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.memory_exercise import MemoryExerciseSession, MemoryExerciseType
+from app.services import scoring, session_archive
+from app.services.config_service import ConfigService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.rating_service import RatingService
+from app.services.score_distribution import ScoreDistributionService
+from app.services.stats_service import StatsRollupService
+
+
+def _chunk_query(last_id: int, chunk_size: int, exercise_type: Optional[str]):
+    """Next chunk of completed sessions after last_id"""
+    query = (
+        select(
+            MemoryExerciseSession.id,
+            MemoryExerciseSession.final_score,
+            MemoryExerciseSession.stored_score_breakdown.isnot(None),
+            MemoryExerciseSession.exercise_type,
+            MemoryExerciseSession.difficulty,
+            func.coalesce(MemoryExerciseSession.total_moves, 0),
+            func.coalesce(MemoryExerciseSession.correct_moves, 0),
+            func.coalesce(MemoryExerciseSession.incorrect_moves, 0),
+            func.coalesce(MemoryExerciseSession.time_elapsed_ms, 0),
+            MemoryExerciseSession.max_sequence_reached,
+            MemoryExerciseSession.config_id,
+        )
+        .where(
+            MemoryExerciseSession.is_completed == True,  # noqa: E712
+            MemoryExerciseSession.id > last_id,
+        )
+        .order_by(MemoryExerciseSession.id)
+        .limit(chunk_size)
+    )
+    if exercise_type:
+        query = query.where(MemoryExerciseSession.exercise_type == exercise_type)
+    return query
+
+
+def rescore(
+    db: Session,
+    chunk_size: int = 10000,
+    exercise_type: Optional[str] = None,
+    dry_run: bool = False
+) -> Tuple[int, int]:
+    """
+    Rescore every completed session, committing after each chunk
+
+    Returns:
+        (scanned, changed) session counts
+    """
+    scanned = changed = 0
+    last_id = 0
+    configs = ConfigService.load_all(db)
+    while True:
+        rows = db.execute(_chunk_query(last_id, chunk_size, exercise_type)).all()
+        if not rows:
+            break
+        (ids, old_scores, has_breakdowns, types, difficulties, total, correct, incorrect,
+         elapsed, max_sequence, config_ids) = zip(*rows)
+        time_limit, time_weight, accuracy_weight = _config_values(db, configs, ids, config_ids)
+
+        scores = scoring.score_columns(
+            is_completed=np.ones(len(rows), dtype=bool),
+            total_moves=total,
+            correct_moves=correct,
+            time_elapsed_ms=elapsed,
+            max_sequence_reached=[value or 0 for value in max_sequence],
+            is_sequence_memory=np.array(types, dtype=object) == MemoryExerciseType.SEQUENCE_MEMORY.value,
+            difficulty_multiplier=scoring.difficulty_multipliers(difficulties),
+            time_limit_ms=time_limit,
+            time_weight=time_weight,
+            accuracy_weight=accuracy_weight,
+        )
+        final_scores = scores.final_score.tolist()
+
+        params = [
+            {"id": session_id, "final_score": final_score, "stored_score_breakdown": None}
+            for session_id, old_score, has_breakdown, final_score
+            in zip(ids, old_scores, has_breakdowns, final_scores)
+            if old_score != final_score or has_breakdown
+        ]
+        if params and not dry_run:
+            # ORM bulk UPDATE by primary key: one executemany per chunk
+            db.execute(update(MemoryExerciseSession), params)
+            db.commit()
+
+        scanned += len(rows)
+        changed += len(params)
+        last_id = ids[-1]
+
+    return scanned, changed
+
+
+def _config_values(db: Session, configs: Dict[int, Dict[str, Any]], ids, config_ids) -> Tuple[list, list, list]:
+    """
+    time_limit_ms, time_weight and accuracy_weight per session, with the scoring fallbacks
+
+    Sessions not compacted yet (null config_id) are scored with their inline config.
+    """
+    values = {config_id: _weights(config) for config_id, config in configs.items()}
+    legacy = [session_id for session_id, config_id in zip(ids, config_ids) if config_id is None]
+    inline = dict(db.execute(
+        select(MemoryExerciseSession.id, MemoryExerciseSession.inline_config)
+        .where(MemoryExerciseSession.id.in_(legacy))
+    ).tuples().all()) if legacy else {}
+    time_limit, time_weight, accuracy_weight = zip(*(
+        values[config_id] if config_id is not None else _weights(inline.get(session_id))
+        for session_id, config_id in zip(ids, config_ids)
+    ))
+    return list(time_limit), list(time_weight), list(accuracy_weight)
+
+
+def _weights(config: Optional[Dict[str, Any]]) -> Tuple[float, float, float]:
+    return (
+        scoring.config_value(config, "time_limit_ms", scoring.DEFAULT_TIME_LIMIT_MS),
+        scoring.config_value(config, "time_weight", scoring.DEFAULT_WEIGHT),
+        scoring.config_value(config, "accuracy_weight", scoring.DEFAULT_WEIGHT),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Sessions read and written per batch")
+    parser.add_argument(
+        "--exercise-type",
+        choices=[exercise_type.value for exercise_type in MemoryExerciseType],
+        default=None,
+        help="Only rescore this exercise type",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    parser.add_argument("--skip-rebuild", action="store_true", help="Do not rebuild rollups, leaderboards, sketches and ratings")
+    parser.add_argument("--ignore-archive", action="store_true", help=session_archive.IGNORE_ARCHIVE_HELP)
+    args = parser.parse_args()
+
+    refusal = session_archive.rebuild_refusal()
+    if refusal and not args.skip_rebuild and not args.dry_run and not args.ignore_archive:
+        parser.error(refusal)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        scanned, changed = rescore(db, args.chunk_size, args.exercise_type, args.dry_run)
+        elapsed = time.perf_counter() - started
+        print(f"Scanned {scanned} sessions in {elapsed:.1f}s, {changed} {'would change' if args.dry_run else 'rescored'}")
+
+        if changed and not args.dry_run and not args.skip_rebuild:
+            print(f"Rebuilt {StatsRollupService.rebuild(db)} user_exercise_stats rows")
+            print(f"Rebuilt {LeaderboardService.rebuild(db)} leaderboard entries")
+            print(f"Rebuilt {ScoreDistributionService.rebuild(db)} score sketch buckets")
+            print(f"Rebuilt {RatingService.rebuild(db)} skill ratings")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Response cache - Serialized responses with ETag and generation-based invalidation
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Entries live under a namespace (e.g. one leaderboard partition, one user's
+stats). Every namespace has a generation counter that is part of the entry
+keys, so invalidating a namespace is a single counter bump: entries of the
+old generation are never read again and age out through their TTL.
+
+The in-process backend is per worker; with several workers, use the Redis
+backend (CACHE_BACKEND=redis) so invalidations reach every process. Entries
+carry a TTL and generation counters do not, so Redis should run with a
+volatile-* maxmemory policy.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response, status
+from pydantic_core import to_json
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Session.info key collecting namespaces to invalidate once the service call returns
+_STALE_KEY = "stale_cache_namespaces"
+
+# Stored entries are the quoted ETag followed by the JSON body
+_ETAG_LENGTH = 34
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        # LRU of its own; generations come from one counter shared by every
+        # namespace, so a namespace evicted here restarts at a generation no
+        # stored entry has (a miss) instead of rolling back to an old one
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._last_generation = 0
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def generation(self, namespace: str) -> int:
+        with self._lock:
+            generation = self._generations.get(namespace)
+            if generation is None:
+                return self._new_generation(namespace)
+            self._generations.move_to_end(namespace)
+            return generation
+
+    async def bump(self, namespaces: Iterable[str]) -> None:
+        with self._lock:
+            for namespace in namespaces:
+                self._new_generation(namespace)
+
+    def _new_generation(self, namespace: str) -> int:
+        """Give a namespace a generation never used before (lock held)"""
+        self._last_generation += 1
+        self._generations[namespace] = self._last_generation
+        self._generations.move_to_end(namespace)
+        while len(self._generations) > self.max_entries:
+            self._generations.popitem(last=False)
+        return self._last_generation
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+class RedisCacheBackend:
+    """
+    Redis (or any RESP-compatible server) backend
+
+    Errors are logged and treated as cache misses so an unavailable cache
+    degrades to uncached responses instead of failing requests.
+    """
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)") from e
+        self._client = redis_asyncio.Redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self._client.get(f"cache:{key}")
+        except Exception:
+            logger.warning("Cache read failed for %s", key, exc_info=True)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            await self._client.set(f"cache:{key}", value, ex=ttl)
+        except Exception:
+            logger.warning("Cache write failed for %s", key, exc_info=True)
+
+    async def generation(self, namespace: str) -> int:
+        try:
+            value = await self._client.get(f"gen:{namespace}")
+        except Exception:
+            logger.warning("Cache generation read failed for %s", namespace, exc_info=True)
+            return -1  # Never matches a stored entry
+        return int(value) if value is not None else 0
+
+    async def bump(self, namespaces: Iterable[str]) -> None:
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for namespace in namespaces:
+                    pipe.incr(f"gen:{namespace}")
+                await pipe.execute()
+        except Exception:
+            logger.warning("Cache invalidation failed", exc_info=True)
+
+    async def clear(self) -> None:
+        async for key in self._client.scan_iter(match="cache:*"):
+            await self._client.delete(key)
+
+
+def create_backend():
+    """Backend selected by CACHE_BACKEND"""
+    if settings.CACHE_BACKEND == "redis":
+        if not settings.REDIS_URL:
+            raise RuntimeError("CACHE_BACKEND=redis requires REDIS_URL")
+        return RedisCacheBackend(settings.REDIS_URL)
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(settings.CACHE_MAX_ENTRIES)
+    raise RuntimeError(f"Unknown CACHE_BACKEND {settings.CACHE_BACKEND!r}")
+
+
+backend = create_backend()
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag for a response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    cache_control: str,
+    status_code: int = status.HTTP_200_OK
+) -> Response:
+    """JSON response, or 304 Not Modified when If-None-Match already has this ETag"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+async def cached_response(
+    request: Request,
+    namespace: str,
+    variant: str,
+    build: Callable[[], Awaitable[Any]],
+    ttl: int,
+    cache_control: str
+) -> Response:
+    """
+    Serve a JSON response from the cache, building and storing it on a miss
+
+    Args:
+        namespace: Invalidation unit (see invalidate())
+        variant: Distinguishes responses within the namespace (query parameters)
+        build: Coroutine producing the response payload
+        ttl: Server-side entry lifetime in seconds
+        cache_control: Cache-Control header sent to clients
+    """
+    generation = await backend.generation(namespace)
+    key = f"{namespace}:{generation}:{variant}"
+
+    stored = await backend.get(key) if generation >= 0 else None
+    if stored is None:
+        body = to_json(await build())
+        stored = make_etag(body).encode() + body
+        if generation >= 0:
+            await backend.set(key, stored, ttl)
+
+    return etag_response(request, stored[_ETAG_LENGTH:], stored[:_ETAG_LENGTH].decode(), cache_control)
+
+
+def mark_stale(db: Session, *namespaces: str) -> None:
+    """Record namespaces to invalidate after the current (sync) service call"""
+    db.info.setdefault(_STALE_KEY, set()).update(namespaces)
+
+
+async def invalidate_marked(info: Dict[str, Any]) -> None:
+    """Invalidate the namespaces recorded by mark_stale() (pass AsyncSession.info)"""
+    namespaces = info.pop(_STALE_KEY, None)
+    if namespaces:
+        await backend.bump(namespaces)
+
+
+async def invalidate(*namespaces: str) -> None:
+    """Invalidate namespaces directly"""
+    await backend.bump(namespaces)
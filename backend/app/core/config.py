@@ -4,7 +4,7 @@ Application configuration using Pydantic Settings
 @copyright Jay The Ermite
 """
 
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 
@@ -19,6 +19,14 @@ class Settings(BaseSettings):
     DATABASE_NAME: str = "brain_training"
     DATABASE_USER: str = "brain_training"
     DATABASE_PASSWORD: str = "changeme"
+    ASYNC_DATABASE_URL: Optional[str] = None  # Defaults to DATABASE_URL with the asyncpg driver
+    DATABASE_REPLICA_URL: Optional[str] = None  # Read replica for leaderboard/history/distribution reads
+    DATABASE_REPLICA_RETRY_SECONDS: int = 30  # Reads stay on the primary this long after a replica failure
+    DATABASE_POOL_SIZE: int = 10  # Per engine and per worker process
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT: int = 30  # Seconds to wait for a connection before failing
+    DATABASE_POOL_RECYCLE_SECONDS: int = 1800  # Keep below server/proxy idle timeouts
+    DATABASE_POOL_PRE_PING: bool = False  # Test each connection on checkout (one extra round trip)
 
     # API
     API_TITLE: str = "Brain Training API"
@@ -31,10 +39,63 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Server (gunicorn.conf.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # 0 = one per CPU; CACHE_BACKEND=memory allows only one
+    SERVER_PRELOAD: bool = True  # Import the app once in the master, then fork the workers
+    STARTUP_WARM_CONNECTIONS: int = 2  # Pooled connections each worker opens at startup (0 = none)
+    STARTUP_WARM_LEADERBOARDS: bool = True  # Load the overall and per-type boards at startup
+    STARTUP_WARM_TIMEOUT_SECONDS: float = 5.0  # Workers start serving after this even if warm-up is stuck
+
     # Application
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
     LOG_LEVEL: str = "INFO"
+    SLOW_QUERY_MS: int = 200  # Statements at least this slow are logged (0 = off)
+
+    # Leaderboards
+    LEADERBOARD_CACHE_TTL_SECONDS: int = 60  # In-process board reload interval
+    LEADERBOARD_MAX_BOARDS: int = 1000  # In-process boards kept (LRU, empty boards evicted first)
+
+    # Session partitions (PostgreSQL, see migrations/007)
+    SESSION_PARTITION_MONTHS_AHEAD: int = 3  # Monthly partitions created in advance
+    SESSION_RETENTION_MONTHS: int = 24  # Older partitions are archived and dropped (0 = keep all)
+    SESSION_ARCHIVE_DIR: str = "archive/sessions"  # Parquet files of archived partitions
+
+    # Response cache
+    CACHE_BACKEND: str = "memory"  # memory (per process) or redis
+    REDIS_URL: Optional[str] = None
+    CACHE_MAX_ENTRIES: int = 10000  # memory backend LRU size
+    CACHE_TTL_SECONDS: int = 300  # Server-side lifetime of cached stats responses
+    LEADERBOARD_MAX_AGE_SECONDS: int = 5  # Cache-Control max-age sent with public leaderboards
+    PRESETS_MAX_AGE_SECONDS: int = 3600  # Cache-Control max-age sent with config presets
+
+    # Puzzles (see app/services/puzzle_service.py)
+    PUZZLE_POOL_SIZE: int = 256  # Seeds pregenerated per preset at import (0 = generate every request)
+    PUZZLE_MAX_AGE_SECONDS: int = 86400  # Cache-Control max-age of a puzzle requested by seed
+
+    # Write-behind buffer for in-progress session updates (see app/services/progress_buffer.py)
+    PROGRESS_BUFFER_ENABLED: bool = True
+    PROGRESS_FLUSH_INTERVAL_SECONDS: float = 2.0  # Most progress a crash can lose
+    PROGRESS_BUFFER_MAX_SESSIONS: int = 5000  # Pending sessions that trigger an early flush
+
+    # Live session channel (WebSocket, see app/routes/live_sessions.py)
+    LIVE_WINDOW: int = 32  # Progress messages a client may send ahead of the server's acks
+    LIVE_ACK_DELAY_MS: int = 50  # Acks are coalesced for at most this long
+    LIVE_IDLE_TIMEOUT_SECONDS: float = 120.0  # Silent connections are closed (the client can resume)
+
+    # Score distribution sketches (see app/services/score_distribution.py)
+    SCORE_SKETCH_FLUSH_INTERVAL_SECONDS: float = 10.0  # Most completions a crash can leave uncounted
+    SCORE_SKETCH_CACHE_TTL_SECONDS: int = 60  # In-process reload interval of the persisted sketches
+
+    # Replay verification of completed sessions (see app/services/verification_service.py)
+    VERIFICATION_ENABLED: bool = False  # Rank only sessions whose move log replays consistently
+    VERIFICATION_WORKERS: int = 2  # Replay processes per API worker
+    VERIFICATION_QUEUE_SIZE: int = 1000  # Queued sessions per API worker; the sweep picks up the overflow
+    VERIFICATION_SWEEP_INTERVAL_SECONDS: float = 30.0  # Requeue sessions left pending this long
+    VERIFICATION_MIN_MOVE_MS: int = 80  # Faster moves count as too fast
+    VERIFICATION_MAX_FAST_MOVE_SHARE: float = 0.2  # Share of too-fast moves that rejects a session
 
     @field_validator("CORS_ORIGINS")
     @classmethod
@@ -4,38 +4,168 @@ Database configuration and session management
 @copyright Jay The Ermite
 """
 
-from sqlalchemy import create_engine
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+from sqlalchemy import create_engine, exc, Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.core.config import settings
+from app.core.metrics import REPLICA_FALLBACKS, TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Async drivers used when DATABASE_URL names a sync one
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Translate a sync database URL to the matching async driver"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _pool_options(url: str, name: str, is_async: bool = False) -> dict:
+    """
+    Connection pool settings (SQLite stand-ins use the driver's default pool)
+
+    Liveness is kept without a query per checkout (pre-ping is opt-in):
+    connections are replaced once older than DATABASE_POOL_RECYCLE_SECONDS,
+    which should stay below any server/proxy idle timeout; LIFO checkout lets
+    surplus connections go idle and get recycled instead of all staying
+    warm; and a disconnect error invalidates the whole pool, so after a
+    database restart only the statements already in flight fail.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+        "pool_use_lifo": True,
+    }
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-)
+
+# Sync engine for maintenance commands and scripts
+engine = create_engine(settings.DATABASE_URL, **_pool_options(settings.DATABASE_URL, "sync"))
+instrument_engine(engine, "sync")
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine serving API requests
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL, "async", is_async=True))
+instrument_engine(async_engine.sync_engine, "async")
+
+# Optional read replica for read-only API calls (see read_from_replica)
+replica_engine = None
+if settings.DATABASE_REPLICA_URL:
+    _replica_url = async_database_url(settings.DATABASE_REPLICA_URL)
+    replica_engine = create_async_engine(_replica_url, **_pool_options(_replica_url, "replica", is_async=True))
+    instrument_engine(replica_engine.sync_engine, "replica")
+
+# Session.info flag routing the session's statements to the replica
+_USE_REPLICA = "use_replica"
+
+# Errors meaning "the replica cannot serve this", as opposed to a bad query
+_REPLICA_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError)
+
+# time.monotonic() until which the replica is skipped after a failure
+_replica_down_until = 0.0
+
+
+class RoutingSession(Session):
+    """Session sending its statements to the replica while flagged read-only"""
+
+    def get_bind(self, mapper=None, clause=None, **kw) -> Engine:
+        if replica_engine is not None and self.info.get(_USE_REPLICA) and not self._flushing:
+            return replica_engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def replica_available() -> bool:
+    """Whether reads should currently try the replica"""
+    return replica_engine is not None and time.monotonic() >= _replica_down_until
+
+
+async def read_from_replica(db: AsyncSession, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Await a read-only call with the session routed to the replica
+
+    If the replica cannot be reached (or its pool is exhausted), the call
+    is retried on the primary and the replica is skipped for
+    DATABASE_REPLICA_RETRY_SECONDS. Replicas lag: only route reads that
+    tolerate slightly stale data (leaderboards, history), never a
+    read-after-write of the same request, nor one cached under a
+    generation the write just bumped.
+    """
+    global _replica_down_until
+    if not replica_available():
+        return await call()
+
+    db.info[_USE_REPLICA] = True
+    try:
+        return await call()
+    except _REPLICA_ERRORS as e:
+        _replica_down_until = time.monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+        REPLICA_FALLBACKS.inc()
+        logger.warning("Read replica unavailable, reading from the primary: %s", e)
+    finally:
+        db.info.pop(_USE_REPLICA, None)
+
+    await db.rollback()
+    return await call()
+
+
+# Objects stay usable after commit; there is no lazy reload under asyncio
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
 # Create base class for declarative models
 Base = declarative_base()
 
 
-def get_db() -> Session:
+async def get_db() -> AsyncIterator[AsyncSession]:
     """
-    Dependency for FastAPI routes to get database session
+    Dependency for FastAPI routes to get an async database session
 
     Usage:
         @app.get("/items")
-        def get_items(db: Session = Depends(get_db)):
-            return db.query(Item).all()
+        async def get_items(db: AsyncSession = Depends(get_db)):
+            return (await db.scalars(select(Item))).all()
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def dialect_insert(db: Session, table: Table):
+    """
+    Build an INSERT supporting ON CONFLICT clauses for the session's dialect
+
+    Usage:
+        stmt = dialect_insert(db, Item.__table__).values(...).on_conflict_do_nothing()
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
@@ -0,0 +1,206 @@
+"""
+Metrics - Prometheus instrumentation of requests, queries and connection pools
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Exposed in the Prometheus text format by GET /metrics:
+  - http_request_duration_seconds   latency per route template and status
+  - http_request_db_queries         statements executed per request
+  - http_request_db_seconds         time spent in the database per request
+  - db_query_duration_seconds       every statement, by verb
+  - db_slow_queries_total           statements slower than SLOW_QUERY_MS (also logged)
+  - db_pool_checkout_wait_seconds   time waiting for a pooled connection
+  - db_pool_*                       pool size, checked out and overflow connections
+  - db_replica_fallbacks_total      reads moved back to the primary
+  - progress_buffer_*               write-behind buffer counters (app.services.progress_buffer)
+  - session_verification_*          replay queue and latency (app.services.verification_service)
+  - live_session*                   WebSocket progress connections and messages (app.routes.live_sessions)
+
+Metrics are per process; with several workers, scrape each of them (or
+run prometheus_client in multiprocess mode).
+"""
+
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Database statements executed per HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing statements per HTTP request", ["route"],
+    buckets=_LATENCY_BUCKETS,
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Statement execution time", ["engine", "verb"],
+    buckets=_QUERY_BUCKETS,
+)
+SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ["engine", "verb"])
+REPLICA_FALLBACKS = Counter("db_replica_fallbacks_total", "Reads retried on the primary because the replica failed")
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection", ["pool"],
+    buckets=_QUERY_BUCKETS,
+)
+
+# Route template of requests not matching any route (keeps label cardinality bounded)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestStats:
+    """Database activity of the current request"""
+
+    __slots__ = ("route", "queries", "db_seconds")
+
+    def __init__(self):
+        self.route = UNMATCHED_ROUTE
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Set by MetricsMiddleware; also visible inside AsyncSession.run_sync greenlets
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Start time of the statement running on each DBAPI connection
+_QUERY_START = "metrics_query_start"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and database activity per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            stats.route = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_DURATION.labels(scope["method"], stats.route, str(status_code)).observe(
+                time.perf_counter() - started
+            )
+            REQUEST_DB_QUERIES.labels(stats.route).observe(stats.queries)
+            REQUEST_DB_SECONDS.labels(stats.route).observe(stats.db_seconds)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Time every statement of an engine (pass async_engine.sync_engine for async engines)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info[_QUERY_START] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop(_QUERY_START, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        verb = _verb(statement)
+        QUERY_DURATION.labels(name, verb).observe(elapsed)
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+        if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            SLOW_QUERIES.labels(name, verb).inc()
+            logger.warning(
+                "Slow query (%.1f ms, %s%s): %s",
+                elapsed * 1000,
+                name,
+                f", executemany x{len(parameters)}" if executemany else "",
+                " ".join(statement.split())[:1000],
+            )
+
+    _pools[name] = engine
+
+
+def _verb(statement: str) -> str:
+    """First keyword of a statement (SELECT, INSERT, ...)"""
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+
+class _TimedCheckout:
+    """Pool mixin observing how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.logging_name or "default").observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool reporting checkout wait (name it with create_engine(pool_logging_name=...))"""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool reporting checkout wait"""
+
+
+# Instrumented engines, for the pool gauges
+_pools: Dict[str, Engine] = {}
+
+
+class _PoolCollector(Collector):
+    """Pool occupancy read at scrape time"""
+
+    def collect(self) -> Iterator:
+        size = GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"])
+        overflow = GaugeMetricFamily(
+            "db_pool_overflow", "Connections opened beyond the pool size (negative: unused capacity)", labels=["engine"]
+        )
+        for name, engine in _pools.items():
+            pool: Pool = engine.pool
+            if isinstance(pool, QueuePool):
+                size.add_metric([name], pool.size())
+                checked_out.add_metric([name], pool.checkedout())
+                overflow.add_metric([name], pool.overflow())
+        yield size
+        yield checked_out
+        yield overflow
+
+
+REGISTRY.register(_PoolCollector())
@@ -0,0 +1,67 @@
+"""
+Startup - Per-worker warm-up run from the application lifespan
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Runs in each worker after it starts (after the fork when the app is
+preloaded), so it opens connections and fills in-process caches for that
+worker only. Failures are logged and ignored: a worker must come up even
+while the database is briefly unreachable, and anything not warmed is
+loaded on first use.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, async_engine, replica_engine
+from app.models.memory_exercise import MemoryExerciseType
+from app.services.leaderboard_service import LeaderboardService, partition_key
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_pool(engine: AsyncEngine, connections: int) -> None:
+    """Open `connections` pooled connections, then return them all to the pool"""
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+
+async def warm_leaderboards() -> int:
+    """Load the overall and per-exercise-type boards into this worker"""
+    keys = [partition_key()] + [partition_key(exercise_type.value) for exercise_type in MemoryExerciseType]
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(LeaderboardService.warm, keys)
+
+
+async def warm_up() -> None:
+    """Warm the connection pools and leaderboards within STARTUP_WARM_TIMEOUT_SECONDS; never raises"""
+    started = time.perf_counter()
+    connections = min(settings.STARTUP_WARM_CONNECTIONS, settings.DATABASE_POOL_SIZE)
+    steps = []
+    if connections > 0:
+        steps.append(("pool", warm_pool(async_engine, connections)))
+        if replica_engine is not None:
+            steps.append(("replica pool", warm_pool(replica_engine, connections)))
+    if settings.STARTUP_WARM_LEADERBOARDS:
+        steps.append(("leaderboards", warm_leaderboards()))
+
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(step for _, step in steps), return_exceptions=True),
+            settings.STARTUP_WARM_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        logger.warning("Startup warm-up gave up after %s s", settings.STARTUP_WARM_TIMEOUT_SECONDS)
+        return
+    for (name, _), result in zip(steps, results):
+        if isinstance(result, Exception):
+            logger.warning("Startup warm-up of %s failed: %s", name, result)
+    logger.info("Worker warm-up finished in %.0f ms", (time.perf_counter() - started) * 1000)
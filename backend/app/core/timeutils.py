@@ -0,0 +1,17 @@
+"""
+Time helpers shared by services
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from typing import Optional
+from datetime import datetime, timezone
+
+
+def epoch_seconds(value: Optional[datetime]) -> float:
+    """Seconds since epoch, treating naive datetimes as UTC (None means now)"""
+    if value is None:
+        value = datetime.utcnow()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
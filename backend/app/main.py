@@ -4,22 +4,58 @@ Brain Training FastAPI Application
 @copyright Jay The Ermite
 """
 
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.core.config import settings
-from app.core.database import engine, Base
-from app.routes import memory_exercises
+from app.core.metrics import MetricsMiddleware
+from app.core.startup import warm_up
+from app.routes import live_sessions, memory_exercises
+from app.services.progress_buffer import progress_buffer
+from app.services.score_distribution import score_sketches
+from app.services.verification_service import session_verifier
+
+logging.basicConfig(
+    level=settings.LOG_LEVEL.upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm this worker up, then run the progress buffer and score sketch
+    flushers and, if enabled, the session verifier
+
+    Tables are created by app.commands.migrate, not here. The flushers' last
+    flush happens on shutdown; sessions still queued for verification are
+    picked up by the sweep of another (or the next) worker.
+    """
+    await warm_up()
+    tasks = [asyncio.create_task(progress_buffer.run()), asyncio.create_task(score_sketches.run())]
+    if settings.VERIFICATION_ENABLED:
+        tasks.append(asyncio.create_task(session_verifier.run()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.API_TITLE,
     version=settings.API_VERSION,
     description="Brain Training API - Cognitive exercises backend for @theermite/brain-training package",
+    debug=settings.DEBUG,
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -29,10 +65,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Latency and database timing per route (outermost, so CORS preflights are counted too)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(memory_exercises.router, prefix=settings.API_PREFIX)
+app.include_router(live_sessions.router, prefix=settings.API_PREFIX)
 
 
 @app.get("/")
@@ -48,9 +89,19 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    health = {"status": "healthy", "progress_buffer": progress_buffer.stats(), "live": live_sessions.live_stats.stats()}
+    if settings.VERIFICATION_ENABLED:
+        health["verification"] = session_verifier.stats()
+    return health
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of this worker"""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
 
 
 if __name__ == "__main__":
+    # Single process, for development; production: gunicorn -c gunicorn.conf.py app.main:app
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host=settings.SERVER_HOST, port=settings.SERVER_PORT)
@@ -5,16 +5,32 @@ SQLAlchemy Models
 """
 
 from app.models.base import Base, BaseModel
+from app.models.exercise_config import ExerciseConfig
 from app.models.memory_exercise import (
     MemoryExerciseSession,
     MemoryExerciseType,
     DifficultyLevel,
+    VerificationStatus,
 )
+from app.models.user_exercise_stats import UserExerciseStats
+from app.models.leaderboard import LeaderboardEntry
+from app.models.session_ingest_key import SessionIngestKey
+from app.models.session_move_chunk import SessionMoveChunk
+from app.models.score_sketch import ScoreSketchBucket
+from app.models.skill_rating import SkillRating
 
 __all__ = [
     "Base",
     "BaseModel",
+    "ExerciseConfig",
     "MemoryExerciseSession",
     "MemoryExerciseType",
     "DifficultyLevel",
+    "VerificationStatus",
+    "UserExerciseStats",
+    "LeaderboardEntry",
+    "SessionIngestKey",
+    "SessionMoveChunk",
+    "ScoreSketchBucket",
+    "SkillRating",
 ]
@@ -17,7 +17,11 @@ class BaseModel(Base):
 
     __abstract__ = True
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # Fetch server-generated values with RETURNING during the flush instead
+    # of expiring them, so writes never need a refresh() round trip
+    __mapper_args__ = {"eager_defaults": True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -0,0 +1,29 @@
+"""
+Exercise config models - Content-addressed exercise configs shared by sessions
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, JSON, String
+from app.core.database import Base
+
+
+class ExerciseConfig(Base):
+    """
+    One distinct MemoryExerciseConfig, referenced by memory_exercise_sessions.config_id
+
+    Rows are keyed by the SHA-256 of the config's canonical JSON and never
+    updated (see app.services.config_service), so nearly every session
+    shares one of the few preset rows instead of carrying its own copy.
+    """
+
+    __tablename__ = "exercise_configs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    config_hash = Column(String(64), nullable=False, unique=True)  # Hex SHA-256 of the canonical JSON
+    config = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ExerciseConfig(id={self.id}, hash={self.config_hash[:12]})>"
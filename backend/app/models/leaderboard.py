@@ -0,0 +1,33 @@
+"""
+Leaderboard models - Best completed session per user and leaderboard partition
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from sqlalchemy import Column, String, Integer, Float, DateTime
+from app.core.database import Base
+
+
+class LeaderboardEntry(Base):
+    """
+    A user's best completed session within one leaderboard partition
+
+    The partition key is "<exercise_type>:<difficulty>:<exercise_id>" where any
+    part may be "*", so every filter combination accepted by /leaderboard maps
+    to exactly one partition maintained on session completion.
+    """
+
+    __tablename__ = "leaderboard_entries"
+
+    partition_key = Column(String(100), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+
+    session_id = Column(Integer, nullable=False)
+    final_score = Column(Float, nullable=False)
+    accuracy = Column(Float, nullable=False)
+    time_elapsed_ms = Column(Integer, nullable=False)
+    difficulty = Column(String(20), nullable=False)
+    completed_at = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<LeaderboardEntry(partition={self.partition_key}, user_id={self.user_id}, score={self.final_score})>"
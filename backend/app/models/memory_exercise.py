@@ -5,9 +5,12 @@ Memory Exercise models - Visual memory exercise sessions and results
 """
 
 from enum import Enum as PyEnum
-from sqlalchemy import Column, String, Integer, Float, Boolean, JSON, DateTime
+from typing import Any, Dict, Optional
+from sqlalchemy import Column, String, Integer, Float, Boolean, JSON, DateTime, Index, column, or_, text
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from .base import BaseModel
+from .exercise_config import ExerciseConfig
 
 
 class MemoryExerciseType(str, PyEnum):
@@ -26,6 +29,14 @@ class DifficultyLevel(str, PyEnum):
     EXPERT = "expert"
 
 
+class VerificationStatus(str, PyEnum):
+    """Outcome of the replay check of a completed session (see app/services/verification_service.py)"""
+    PENDING = "pending"
+    VERIFIED = "verified"
+    REJECTED = "rejected"
+    UNVERIFIABLE = "unverifiable"  # Offline (batch) session: no move log or server seed, never ranked
+
+
 class MemoryExerciseSession(BaseModel):
     """
     Memory exercise play session - tracks a single playthrough
@@ -34,19 +45,53 @@ class MemoryExerciseSession(BaseModel):
 
     __tablename__ = "memory_exercise_sessions"
 
+    # Indexes follow the query shapes (see migrations/004_tune_memory_session_indexes.sql)
+    __table_args__ = (
+        # History: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("idx_memory_sessions_user_created", "user_id", text("created_at DESC"), text("id DESC")),
+        # History filtered by type: WHERE user_id = ? AND exercise_type = ? ORDER BY created_at DESC, id DESC
+        Index(
+            "idx_memory_sessions_user_type_created",
+            "user_id", "exercise_type", text("created_at DESC"), text("id DESC"),
+        ),
+        # Ranking scans only completed, scored sessions; query with
+        # "is_completed == True" so the planner can match the predicate
+        Index(
+            "idx_memory_sessions_leaderboard",
+            "exercise_type", "difficulty", text("final_score DESC"),
+            postgresql_where=text("is_completed AND final_score IS NOT NULL"),
+            sqlite_where=text("is_completed = 1 AND final_score IS NOT NULL"),
+        ),
+        # Verification sweep: WHERE verification_status = 'pending'
+        Index(
+            "idx_memory_sessions_verification_pending",
+            "id",
+            postgresql_where=text("verification_status = 'pending'"),
+            sqlite_where=text("verification_status = 'pending'"),
+        ),
+    )
+
     # User reference (managed by parent application)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
 
     # Optional: exercise_id if parent app manages exercises
-    exercise_id = Column(Integer, nullable=True, index=True)
+    exercise_id = Column(Integer, nullable=True)
 
     # Exercise configuration
-    exercise_type = Column(String(50), nullable=False, index=True)
-    difficulty = Column(String(20), nullable=False, index=True)
-    config = Column(JSON, nullable=False)  # Full MemoryExerciseConfig as JSON
+    exercise_type = Column(String(50), nullable=False)
+    difficulty = Column(String(20), nullable=False)
+    # exercise_configs.id (see app.services.config_service); always set on new
+    # sessions, null between migrations 012 and 013 for sessions not compacted
+    # yet, NOT NULL in the database once 013 has run
+    config_id = Column(Integer, nullable=True)
+    # Config stored inline before migration 012, until app.commands.compact_sessions
+    # interns it (null config_id); dropped by migration 013, so never in the DDL and
+    # only loaded on access, for such sessions (see config)
+    inline_config = deferred(column("config", JSON), expire_on_flush=False)
+    puzzle_seed = Column(Integer, nullable=True)  # Seed of the puzzle served (see app.services.puzzle_service)
 
     # Session status
-    is_completed = Column(Boolean, default=False, index=True)
+    is_completed = Column(Boolean, default=False)
     completed_at = Column(DateTime, nullable=True)
 
     # Performance metrics
@@ -58,9 +103,28 @@ class MemoryExerciseSession(BaseModel):
     # Sequence-specific (for sequence memory)
     max_sequence_reached = Column(Integer, nullable=True)
 
-    # Final score and breakdown
-    final_score = Column(Float, nullable=True, index=True)
-    score_breakdown = Column(JSON, nullable=True)  # Detailed scoring info
+    # Final score; the breakdown is derived from the columns (score_breakdown)
+    # and only stored when it differs, e.g. scored under older rules
+    final_score = Column(Float, nullable=True)
+    stored_score_breakdown = Column("score_breakdown", JSON(none_as_null=True), nullable=True)
+
+    # Replay verification; null for sessions completed while it was disabled
+    verification_status = Column(String(20), nullable=True)
+    verification_flags = Column(JSON, nullable=True)  # Failed checks of a rejected session
+
+    # Loaded with the session (a join on the primary key of a table of a few rows);
+    # an outer join, so sessions not compacted yet are still found
+    exercise_config = relationship(
+        ExerciseConfig,
+        primaryjoin="foreign(MemoryExerciseSession.config_id) == ExerciseConfig.id",
+        lazy="joined",
+        viewonly=True,
+    )
+
+    @classmethod
+    def ranked(cls):
+        """Filter of sessions that are ranked (leaderboards, distributions, ratings): verified or never queued"""
+        return or_(cls.verification_status.is_(None), cls.verification_status == VerificationStatus.VERIFIED.value)
 
     def __repr__(self) -> str:
         return f"<MemoryExerciseSession(id={self.id}, user_id={self.user_id}, type={self.exercise_type}, score={self.final_score})>"
@@ -71,6 +135,39 @@ class MemoryExerciseSession(BaseModel):
             return 0.0
         return (self.correct_moves / self.total_moves) * 100
 
+    @property
+    def accuracy(self) -> float:
+        """Accuracy percentage, read by MemoryExerciseSessionResponse"""
+        return self.get_accuracy()
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """Full MemoryExerciseConfig as JSON (loads inline_config of a session not compacted yet)"""
+        if self.exercise_config is None:
+            return self.inline_config
+        return self.exercise_config.config
+
+    @property
+    def score_breakdown(self) -> Optional[dict]:
+        """
+        Detailed scoring info of a scored session: the stored breakdown if
+        there is one, else derived from the columns
+
+        Derived breakdowns are kept with the values they were derived from;
+        scoring.derive_breakdowns fills them for many sessions in one pass.
+        """
+        if self.stored_score_breakdown is not None:
+            return self.stored_score_breakdown
+        if not self.is_completed or self.final_score is None:
+            return None
+        from app.services import scoring
+
+        derived = getattr(self, "_derived_breakdown", None)
+        if derived is None or derived[0] != scoring.breakdown_inputs(self):
+            scoring.derive_breakdowns([self])
+            derived = self._derived_breakdown
+        return derived[1]
+
     def calculate_score(self) -> float:
         """
         Calculate final score based on performance metrics and config weights
@@ -78,74 +175,20 @@ class MemoryExerciseSession(BaseModel):
         Returns:
             float: Final score (0-100)
         """
-        if not self.is_completed or self.total_moves == 0:
-            return 0.0
-
-        config = self.config
-        time_weight = config.get("time_weight", 0.5)
-        accuracy_weight = config.get("accuracy_weight", 0.5)
-
-        # Calculate accuracy (0-100)
-        accuracy_score = self.get_accuracy()
-
-        # Calculate time score (faster = better)
-        time_limit = config.get("time_limit_ms", 60000)  # Default 60s
-        if self.time_elapsed_ms > 0 and time_limit > 0:
-            # Inverse proportion: less time = higher score
-            time_ratio = min(1.0, self.time_elapsed_ms / time_limit)
-            time_score = (1.0 - time_ratio) * 100
-        else:
-            time_score = 0.0
-
-        # Weighted base score
-        base_score = (accuracy_score * accuracy_weight) + (time_score * time_weight)
-
-        # Sequence bonus for Sequence Memory
-        sequence_bonus = 0.0
-        if self.exercise_type == MemoryExerciseType.SEQUENCE_MEMORY.value and self.max_sequence_reached:
-            sequence_bonus = min(20, self.max_sequence_reached * 2)
-
-        # Difficulty multiplier
-        difficulty_multipliers = {
-            DifficultyLevel.EASY.value: 1.0,
-            DifficultyLevel.MEDIUM.value: 1.2,
-            DifficultyLevel.HARD.value: 1.5,
-            DifficultyLevel.EXPERT.value: 2.0,
-        }
-        multiplier = difficulty_multipliers.get(self.difficulty, 1.0)
-
-        # Final score
-        final = (base_score + sequence_bonus) * multiplier
+        from app.services import scoring  # scoring imports this module
 
-        return min(100.0, final)  # Cap at 100
+        return float(scoring.score_sessions([self]).final_score[0])
 
     def generate_score_breakdown(self) -> dict:
-        """Generate detailed score breakdown"""
-        accuracy = self.get_accuracy()
-
-        # Calculate time score
-        time_limit = self.config.get("time_limit_ms", 60000)
-        time_ratio = min(1.0, self.time_elapsed_ms / time_limit) if time_limit > 0 else 0
-        time_score = (1.0 - time_ratio) * 100
-
-        # Difficulty multiplier
-        difficulty_multipliers = {
-            DifficultyLevel.EASY.value: 1.0,
-            DifficultyLevel.MEDIUM.value: 1.2,
-            DifficultyLevel.HARD.value: 1.5,
-            DifficultyLevel.EXPERT.value: 2.0,
-        }
-        multiplier = difficulty_multipliers.get(self.difficulty, 1.0)
-
-        return {
-            "accuracy": accuracy,
-            "accuracy_score": accuracy * self.config.get("accuracy_weight", 0.5),
-            "time_score": time_score * self.config.get("time_weight", 0.5),
-            "time_elapsed_ms": self.time_elapsed_ms,
-            "total_moves": self.total_moves,
-            "correct_moves": self.correct_moves,
-            "incorrect_moves": self.incorrect_moves,
-            "max_sequence": self.max_sequence_reached,
-            "difficulty_multiplier": multiplier,
-            "final_score": self.final_score or 0.0,
-        }
+        """Generate detailed score breakdown (with the current rules, whatever is stored)"""
+        from app.services import scoring
+
+        return scoring.breakdowns(
+            scoring.score_sessions([self]),
+            [self.final_score],
+            [self.time_elapsed_ms],
+            [self.total_moves],
+            [self.correct_moves],
+            [self.incorrect_moves],
+            [self.max_sequence_reached],
+        )[0]
@@ -0,0 +1,33 @@
+"""
+Score sketch models - Bucket counts of the per exercise type and difficulty score distributions
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from sqlalchemy import Column, BigInteger, Integer, String
+from app.core.database import Base
+
+
+class ScoreSketchBucket(Base):
+    """
+    Completed sessions whose final score falls in one sketch bucket
+
+    Bucket i holds scores in (gamma^(i-1), gamma^i]; bucket 0 also holds
+    zero scores (see app.services.score_distribution). Sketches merge by
+    adding counts, so every worker flushes its own increments with an
+    upsert and no row is ever read-modified-written.
+    """
+
+    __tablename__ = "score_sketch_buckets"
+
+    exercise_type = Column(String(50), primary_key=True)
+    difficulty = Column(String(20), primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+
+    count = Column(BigInteger, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<ScoreSketchBucket(type={self.exercise_type}, difficulty={self.difficulty}, "
+            f"bucket={self.bucket}, count={self.count})>"
+        )
@@ -0,0 +1,28 @@
+"""
+Session ingest keys - Idempotency keys of batch-ingested sessions
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime
+from app.core.database import Base
+
+
+class SessionIngestKey(Base):
+    """
+    Client idempotency key claimed by a batch-ingested session
+
+    Kept out of memory_exercise_sessions so uniqueness per user does not
+    depend on how that table is indexed or partitioned.
+    """
+
+    __tablename__ = "session_ingest_keys"
+
+    user_id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(64), primary_key=True)
+    session_id = Column(Integer, nullable=True)  # Set once the session row exists
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<SessionIngestKey(user_id={self.user_id}, key={self.idempotency_key}, session_id={self.session_id})>"
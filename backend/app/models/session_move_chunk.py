@@ -0,0 +1,35 @@
+"""
+Session move chunks - Packed per-move telemetry of a session
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, BigInteger, Integer, LargeBinary, DateTime
+from app.core.database import Base
+
+
+class SessionMoveChunk(Base):
+    """
+    One appended batch of move events, packed column-wise
+
+    Rows are append-only: a batch is never rewritten, so recording moves
+    costs one INSERT regardless of how many moves the session already has.
+    See app.services.telemetry_service for the payload format.
+    """
+
+    __tablename__ = "session_move_chunks"
+
+    # SQLite only auto-increments INTEGER PRIMARY KEY
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    session_id = Column(Integer, nullable=False, index=True)
+
+    base_offset_ms = Column(Integer, nullable=False)  # Offset of the first move of the batch
+    move_count = Column(Integer, nullable=False)
+    correct_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<SessionMoveChunk(id={self.id}, session_id={self.session_id}, moves={self.move_count})>"
@@ -0,0 +1,43 @@
+"""
+Skill rating models - Glicko rating per user and exercise type
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, text
+from app.core.database import Base
+
+
+class SkillRating(Base):
+    """
+    A user's rating and rating deviation on one exercise type
+
+    Updated in place by every ranked completion (see
+    app.services.rating_service), so neither reading a rating nor ranking a
+    ladder touches memory_exercise_sessions. The deviation is stored as of
+    last_completed_at; readers widen it for the time elapsed since.
+    """
+
+    __tablename__ = "skill_ratings"
+
+    # Ladder: WHERE exercise_type = ? ORDER BY rating DESC, user_id
+    __table_args__ = (
+        Index("idx_skill_ratings_ladder", "exercise_type", text("rating DESC"), "user_id"),
+    )
+
+    user_id = Column(Integer, primary_key=True)
+    exercise_type = Column(String(50), primary_key=True)
+
+    rating = Column(Float, nullable=False)
+    deviation = Column(Float, nullable=False)
+    sessions = Column(Integer, nullable=False, default=0)  # Rated sessions
+    last_completed_at = Column(DateTime, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<SkillRating(user_id={self.user_id}, type={self.exercise_type}, "
+            f"rating={self.rating:.0f}, deviation={self.deviation:.0f})>"
+        )
@@ -0,0 +1,71 @@
+"""
+User exercise stats rollup - Incrementally maintained per-user aggregates
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, BigInteger, Float, JSON, DateTime
+from app.core.database import Base
+
+
+class UserExerciseStats(Base):
+    """
+    Running aggregates for one user × exercise type × difficulty
+
+    Updated in place when a session is created or completed so that
+    /stats never has to scan memory_exercise_sessions.
+    """
+
+    __tablename__ = "user_exercise_stats"
+
+    user_id = Column(Integer, primary_key=True)
+    exercise_type = Column(String(50), primary_key=True)
+    difficulty = Column(String(20), primary_key=True)
+
+    # Counters
+    total_attempts = Column(Integer, nullable=False, default=0)
+    completed_attempts = Column(Integer, nullable=False, default=0)
+
+    # Running sums over completed sessions
+    score_count = Column(Integer, nullable=False, default=0)  # Completed sessions with a score
+    score_sum = Column(Float, nullable=False, default=0.0)
+    score_sq_sum = Column(Float, nullable=False, default=0.0)
+    score_index_sum = Column(Float, nullable=False, default=0.0)  # Σ(ordinal × score), for the trend slope
+    accuracy_sum = Column(Float, nullable=False, default=0.0)
+    time_sum_ms = Column(BigInteger, nullable=False, default=0)
+
+    # Records
+    best_score = Column(Float, nullable=True)
+    best_accuracy = Column(Float, nullable=True)
+    fastest_time_ms = Column(Integer, nullable=True)
+    longest_sequence = Column(Integer, nullable=True)
+
+    # Ring buffer of the most recent completions, newest first: [epoch_seconds, score, accuracy]
+    recent = Column(JSON, nullable=False, default=list)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<UserExerciseStats(user_id={self.user_id}, type={self.exercise_type}, "
+            f"difficulty={self.difficulty}, completed={self.completed_attempts})>"
+        )
+
+    def improvement_rate(self) -> Optional[float]:
+        """Least-squares slope of score per completed session (ordinals 1..n)"""
+        n = self.score_count
+        if n < 2:
+            return None
+        sum_x = n * (n + 1) / 2
+        sum_xx = n * (n + 1) * (2 * n + 1) / 6
+        denominator = n * sum_xx - sum_x * sum_x
+        return (n * self.score_index_sum - sum_x * self.score_sum) / denominator
+
+    def score_variance(self) -> Optional[float]:
+        """Population variance of scores"""
+        if not self.score_count:
+            return None
+        mean = self.score_sum / self.score_count
+        return max(0.0, self.score_sq_sum / self.score_count - mean * mean)
@@ -0,0 +1,317 @@
+"""
+Live session routes - WebSocket channel for in-game progress
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+One connection per game replaces the stream of progress PUTs:
+
+    WS /api/v1/memory-exercises/sessions/live?user_id=
+
+First message, a JSON object:
+    {"op": "start", "config": {...}, "exercise_id": null}
+    {"op": "resume", "session_id": 42}
+answered with
+    {"op": "ready", "session_id": 42, "puzzle_seed": 123, "window": 32,
+     "progress": [total, correct, incorrect, elapsed_ms, max_sequence]}
+The puzzle seed is assigned by the server (a puzzle_seed sent with start is
+ignored); fetch the puzzle with it.
+
+Then progress, one JSON array per update with absolute values:
+    [seq, total_moves, correct_moves, incorrect_moves, time_elapsed_ms, max_sequence_reached]
+seq counts 1, 2, ... on each connection; max_sequence_reached may be null.
+Progress is applied to the session's snapshot in the progress buffer (no
+validation model, no transaction), so it costs what a buffered PUT costs
+minus the HTTP request. Finally
+    {"op": "complete"}
+writes the session through update_session (scoring, stats, leaderboards)
+in one transaction, answers {"op": "completed", "session": {...}} and
+closes the connection.
+
+Backpressure: the server acknowledges applied progress with
+{"op": "ack", "seq": n}, coalesced for LIVE_ACK_DELAY_MS or half a window,
+and a client may have at most `window` messages unacknowledged. Incoming
+messages go through a queue of `window` entries; when the progress buffer
+is full it is flushed before the next ack, so a slow database slows the
+acks and, through the window, the clients. A client exceeding the window
+is disconnected.
+
+Resume: after a disconnect, reconnect with "resume". Progress values are
+absolute, so nothing has to be replayed: "ready" carries the counters the
+server has, and the client sends its latest update if they differ. This
+works on any worker (a session's progress reaches the database within one
+flush interval).
+
+Connection and message counters are exposed as live_session* in GET
+/metrics and under "live" in /health.
+
+Protocol errors are answered with {"op": "error", "detail": ...} and
+close code 1008; silent connections are closed after
+LIVE_IDLE_TIMEOUT_SECONDS with code 1001.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.memory_exercise import MemoryExerciseSession
+from app.schemas.memory_exercise import (
+    MemoryExerciseSessionCreate,
+    MemoryExerciseSessionResponse,
+    MemoryExerciseSessionUpdate,
+)
+from app.services.memory_exercise_service import AsyncMemoryExerciseService
+from app.services.progress_buffer import PROGRESS_FIELDS, progress_buffer
+from app.services.telemetry_service import SessionCompletedError
+
+router = APIRouter(prefix="/memory-exercises", tags=["memory-exercises"])
+
+
+class LiveProtocolError(Exception):
+    """A client message that breaks the live session protocol"""
+
+
+class _LiveStats:
+    """Per-process connection and message counters"""
+
+    def __init__(self):
+        self.open = 0
+        self.opened = 0
+        self.messages = 0
+        self.acks = 0
+        self.completions = 0
+        self.protocol_errors = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "open": self.open,
+            "opened": self.opened,
+            "messages": self.messages,
+            "acks": self.acks,
+            "completions": self.completions,
+            "protocol_errors": self.protocol_errors,
+        }
+
+
+live_stats = _LiveStats()
+
+
+@router.websocket("/sessions/live")
+async def live_session(websocket: WebSocket, user_id: int = Query(..., description="User ID for authorization")):
+    """Stream a session's progress over one connection (protocol in the module docstring)"""
+    await websocket.accept()
+    live_stats.open += 1
+    live_stats.opened += 1
+    try:
+        await _serve(websocket, user_id)
+    except WebSocketDisconnect:
+        pass
+    except LiveProtocolError as e:
+        live_stats.protocol_errors += 1
+        await websocket.send_bytes(orjson.dumps({"op": "error", "detail": str(e)}))
+        await websocket.close(status.WS_1008_POLICY_VIOLATION)
+    finally:
+        live_stats.open -= 1
+
+
+async def _serve(websocket: WebSocket, user_id: int) -> None:
+    """Handshake, then apply progress until completion, disconnect or idle timeout"""
+    try:
+        hello = await asyncio.wait_for(_receive(websocket), settings.LIVE_IDLE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        await websocket.close(status.WS_1001_GOING_AWAY)
+        return
+    session = await _open(hello, user_id)
+    window = settings.LIVE_WINDOW
+    await _send(websocket, {
+        "op": "ready",
+        "session_id": session.id,
+        "puzzle_seed": session.puzzle_seed,
+        "window": window,
+        "progress": _progress(session),
+    })
+
+    # The reader stops pulling from the socket while `window` messages wait
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=window)
+    reader = asyncio.create_task(_read(websocket, inbox))
+    ack_delay = settings.LIVE_ACK_DELAY_MS / 1000
+    applied = acked = 0
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    inbox.get(), ack_delay if applied > acked else settings.LIVE_IDLE_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                if applied > acked:
+                    acked = await _ack(websocket, applied)
+                    continue
+                await websocket.close(status.WS_1001_GOING_AWAY)
+                return
+            if message is None:
+                return  # Disconnected; the session stays open for a resume
+            if isinstance(message, list):
+                seq, values = _parse_progress(message)
+                if seq != applied + 1:
+                    raise LiveProtocolError(f"Expected seq {applied + 1}")
+                if seq - acked > window:
+                    raise LiveProtocolError("Window exceeded")
+                session = _apply_progress(session, values)
+                applied = seq
+                live_stats.messages += 1
+                if progress_buffer.full:
+                    await progress_buffer.flush()
+                if applied - acked >= max(1, window // 2):
+                    acked = await _ack(websocket, applied)
+                continue
+            op = message.get("op") if isinstance(message, dict) else None
+            if op == "complete":
+                session = await _complete(session)
+                live_stats.completions += 1
+                await websocket.send_bytes(
+                    b'{"op":"completed","session":'
+                    + MemoryExerciseSessionResponse.model_validate(session).model_dump_json().encode()
+                    + b"}"
+                )
+                await websocket.close(status.WS_1000_NORMAL_CLOSURE)
+                return
+            if op == "invalid":
+                raise LiveProtocolError(message.get("detail", "Invalid message"))
+            raise LiveProtocolError("Expected a progress array or a complete message")
+    finally:
+        reader.cancel()
+        # Wait for it to stop; its CancelledError (or error on a closed socket) is returned, not raised
+        await asyncio.gather(reader, return_exceptions=True)
+
+
+async def _open(hello, user_id: int) -> MemoryExerciseSession:
+    """Create or look up the session named by the first message; returns a detached snapshot"""
+    if not isinstance(hello, dict) or hello.get("op") not in ("start", "resume"):
+        raise LiveProtocolError("First message must be a start or resume message")
+
+    async with AsyncSessionLocal() as db:
+        if hello["op"] == "start":
+            try:
+                data = MemoryExerciseSessionCreate.model_validate({**hello, "user_id": user_id})
+            except ValidationError as e:
+                raise LiveProtocolError(f"Invalid start message: {e.errors()[0]['msg']}")
+            session = await AsyncMemoryExerciseService.create_session(db, user_id, data)
+        else:
+            session_id = hello.get("session_id")
+            if not isinstance(session_id, int):
+                raise LiveProtocolError("resume needs a session_id")
+            session = await AsyncMemoryExerciseService.get_session(db, session_id, user_id)
+            if session is None:
+                raise LiveProtocolError("Session not found")
+            if session.is_completed:
+                raise LiveProtocolError("Session is already completed")
+        if session in db:
+            db.expunge(session)
+    return session
+
+
+def _apply_progress(session: MemoryExerciseSession, values: Tuple[Optional[int], ...]) -> MemoryExerciseSession:
+    """Write progress values to the session's buffered snapshot; returns the snapshot"""
+    # A progress PUT on this worker may have buffered its own snapshot meanwhile
+    snapshot = progress_buffer.get(session.id, session.user_id) or session
+    for name, value in zip(PROGRESS_FIELDS, values):
+        if value is not None:
+            setattr(snapshot, name, value)
+    progress_buffer.put(snapshot)
+    return snapshot
+
+
+async def _complete(session: MemoryExerciseSession) -> MemoryExerciseSession:
+    """Write the session through with the connection's latest progress, scoring it"""
+    data = MemoryExerciseSessionUpdate(
+        completed_at=datetime.utcnow(),
+        **{name: getattr(session, name) for name in PROGRESS_FIELDS},
+    )
+    async with AsyncSessionLocal() as db:
+        try:
+            return await AsyncMemoryExerciseService.update_session(db, session.id, session.user_id, data)
+        except (ValueError, SessionCompletedError) as e:
+            raise LiveProtocolError(str(e))
+
+
+def _parse_progress(message: List) -> Tuple[int, Tuple[Optional[int], ...]]:
+    """(seq, values in PROGRESS_FIELDS order) of a progress array"""
+    if len(message) != len(PROGRESS_FIELDS) + 1:
+        raise LiveProtocolError(f"Progress has {len(PROGRESS_FIELDS) + 1} values")
+    seq, *values = message
+    for index, value in enumerate(message):
+        # max_sequence_reached (last) may be null; bool is an int subclass
+        if value is None and index == len(message) - 1:
+            continue
+        if type(value) is not int or value < 0:
+            raise LiveProtocolError("Progress values must be non-negative integers")
+    return seq, tuple(values)
+
+
+def _progress(session: MemoryExerciseSession) -> List[Optional[int]]:
+    """Progress values of a session, as sent in progress messages (without seq)"""
+    return [getattr(session, name) for name in PROGRESS_FIELDS]
+
+
+async def _receive(websocket: WebSocket):
+    """Next message decoded from JSON (text or binary frames); raises WebSocketDisconnect"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+    raw = message.get("bytes") if message.get("bytes") is not None else message.get("text")
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        raise LiveProtocolError("Messages must be JSON")
+
+
+async def _read(websocket: WebSocket, inbox: asyncio.Queue) -> None:
+    """Move incoming messages to the inbox; None marks the end of the connection"""
+    try:
+        while True:
+            await inbox.put(await _receive(websocket))
+    except WebSocketDisconnect:
+        await inbox.put(None)
+    except LiveProtocolError as e:
+        # Raised again in the serving loop, which owns the socket
+        await inbox.put({"op": "invalid", "detail": str(e)})
+
+
+async def _ack(websocket: WebSocket, seq: int) -> int:
+    await _send(websocket, {"op": "ack", "seq": seq})
+    live_stats.acks += 1
+    return seq
+
+
+async def _send(websocket: WebSocket, message: dict) -> None:
+    await websocket.send_bytes(orjson.dumps(message))
+
+
+class _LiveStatsCollector(Collector):
+    """Connection and message counters for GET /metrics"""
+
+    def __init__(self, stats: _LiveStats):
+        self.stats = stats
+
+    def collect(self) -> Iterator:
+        yield GaugeMetricFamily("live_sessions_open", "Open live session connections", value=self.stats.open)
+        yield CounterMetricFamily("live_sessions_opened", "Live session connections accepted", value=self.stats.opened)
+        yield CounterMetricFamily("live_session_messages", "Progress messages applied", value=self.stats.messages)
+        yield CounterMetricFamily("live_session_acks", "Acks sent", value=self.stats.acks)
+        yield CounterMetricFamily(
+            "live_session_completions", "Sessions completed over a live connection", value=self.stats.completions
+        )
+        yield CounterMetricFamily(
+            "live_session_protocol_errors", "Connections closed for a protocol error", value=self.stats.protocol_errors
+        )
+
+
+REGISTRY.register(_LiveStatsCollector(live_stats))
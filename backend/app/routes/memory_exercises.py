@@ -4,54 +4,95 @@ Memory Exercise API routes
 @copyright Jay The Ermite
 """
 
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+import random
+from typing import Dict, List, Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import cache
+from app.core.config import settings
 from app.core.database import get_db
+from app.models.memory_exercise import MemoryExerciseSession
 from app.schemas.memory_exercise import (
     MemoryExerciseSessionCreate,
     MemoryExerciseSessionUpdate,
+    MemoryExerciseSessionBatch,
+    MemoryExerciseBatchResult,
     MemoryExerciseSessionResponse,
     MemoryExerciseStats,
     MemoryExerciseLeaderboard,
+    MemoryExerciseLeaderboardRank,
+    MemoryExerciseMoveAppendResult,
+    MemoryExerciseMoveBatch,
+    MemoryExerciseMoves,
+    MemoryExerciseProgress,
+    MemoryExercisePuzzle,
+    MemoryExercisePuzzleRequest,
+    MemoryExerciseRating,
+    MemoryExerciseRatingLadder,
+    MemoryExerciseScoreDistribution,
+    ProgressInterval,
     ConfigPreset,
     MemoryExerciseConfig,
     MemoryExerciseType,
     DifficultyLevel,
+    MAX_PUZZLE_SEED,
+    to_naive_utc,
 )
-from app.services.memory_exercise_service import MemoryExerciseService
+from app.services import leaderboard_service, rating_service, stats_service
+from app.services.leaderboard_service import partition_key
+from app.services.export_service import MEDIA_TYPES as EXPORT_MEDIA_TYPES, ExportFormat, export_query, stream_export
+from app.services.memory_exercise_service import AsyncMemoryExerciseService, encode_cursor
+from app.services.puzzle_service import PuzzleService
+from app.services.progress_buffer import ProgressRequiredError
+from app.services.telemetry_service import MoveOrderError, SessionCompletedError
 
 router = APIRouter(prefix="/memory-exercises", tags=["memory-exercises"])
 
+# Session endpoints serialize ORM objects straight to JSON bytes with the
+# compiled pydantic-core serializer; response_model stays for the OpenAPI schema
+_SESSION_LIST = TypeAdapter(List[MemoryExerciseSessionResponse])
+
+# Per-user responses: browsers keep them but revalidate with the ETag
+_PRIVATE = "private, no-cache"
+
+
+def _session_response(session: MemoryExerciseSession, status_code: int = status.HTTP_200_OK) -> Response:
+    """JSON response for one session"""
+    return Response(
+        MemoryExerciseSessionResponse.model_validate(session).model_dump_json(),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
 
 @router.post("/sessions", status_code=status.HTTP_201_CREATED, response_model=MemoryExerciseSessionResponse)
 async def create_session(
     session_data: MemoryExerciseSessionCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new memory exercise session"""
-    session = MemoryExerciseService.create_session(db, session_data.user_id, session_data)
-    return MemoryExerciseSessionResponse(
-        id=session.id,
-        user_id=session.user_id,
-        exercise_id=session.exercise_id,
-        exercise_type=session.exercise_type,
-        difficulty=session.difficulty,
-        config=session.config,
-        is_completed=session.is_completed,
-        total_moves=session.total_moves,
-        correct_moves=session.correct_moves,
-        incorrect_moves=session.incorrect_moves,
-        time_elapsed_ms=session.time_elapsed_ms,
-        max_sequence_reached=session.max_sequence_reached,
-        final_score=session.final_score,
-        score_breakdown=session.score_breakdown,
-        accuracy=session.get_accuracy(),
-        created_at=session.created_at,
-        updated_at=session.updated_at,
-        completed_at=session.completed_at,
-    )
+    session = await AsyncMemoryExerciseService.create_session(db, session_data.user_id, session_data)
+    return _session_response(session, status.HTTP_201_CREATED)
+
+
+@router.post("/sessions/batch", response_model=MemoryExerciseBatchResult)
+async def ingest_sessions(
+    batch: MemoryExerciseSessionBatch,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record finished sessions played offline
+
+    All valid items are scored and inserted in one transaction. Each item
+    carries an idempotency_key (unique per user): resending a batch reports
+    already-stored items as duplicates with their existing session_id.
+    """
+    return await AsyncMemoryExerciseService.ingest_sessions(db, batch.sessions)
 
 
 @router.put("/sessions/{session_id}", response_model=MemoryExerciseSessionResponse)
@@ -59,66 +100,98 @@ async def update_session(
     session_id: int,
     update_data: MemoryExerciseSessionUpdate,
     user_id: int = Query(..., description="User ID for authorization"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Update a memory exercise session with performance data"""
+    """
+    Update a memory exercise session with performance data
+
+    With several server workers, send total_moves, correct_moves,
+    incorrect_moves and time_elapsed_ms along with completed_at: progress
+    buffered by another worker would otherwise be lost (422). A completed
+    session can no longer be updated (409).
+    """
     try:
-        session = MemoryExerciseService.update_session(db, session_id, user_id, update_data)
-        return MemoryExerciseSessionResponse(
-            id=session.id,
-            user_id=session.user_id,
-            exercise_id=session.exercise_id,
-            exercise_type=session.exercise_type,
-            difficulty=session.difficulty,
-            config=session.config,
-            is_completed=session.is_completed,
-            total_moves=session.total_moves,
-            correct_moves=session.correct_moves,
-            incorrect_moves=session.incorrect_moves,
-            time_elapsed_ms=session.time_elapsed_ms,
-            max_sequence_reached=session.max_sequence_reached,
-            final_score=session.final_score,
-            score_breakdown=session.score_breakdown,
-            accuracy=session.get_accuracy(),
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            completed_at=session.completed_at,
-        )
+        session = await AsyncMemoryExerciseService.update_session(db, session_id, user_id, update_data)
+    except ProgressRequiredError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except SessionCompletedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    return _session_response(session)
+
+
+@router.get("/sessions/export")
+async def export_sessions(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="ndjson, csv or arrow (IPC stream)"),
+    user_id: int = Query(..., description="User ID for authorization (only their sessions are exported)"),
+    exercise_type: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="created_at lower bound (inclusive)"),
+    end: Optional[datetime] = Query(None, description="created_at upper bound (exclusive)")
+):
+    """
+    Stream a user's session history in bulk, oldest first
+
+    The body is produced while rows are read from a server-side cursor,
+    so any range can be exported in one request at constant memory.
+    """
+    query = export_query(user_id, exercise_type, to_naive_utc(start), to_naive_utc(end))
+    return StreamingResponse(
+        stream_export(query, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="memory_exercise_sessions.{format.value}"'},
+    )
 
 
 @router.get("/sessions/{session_id}", response_model=MemoryExerciseSessionResponse)
 async def get_session(
     session_id: int,
     user_id: int = Query(..., description="User ID for authorization"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a session by ID"""
-    session = MemoryExerciseService.get_session(db, session_id, user_id)
+    session = await AsyncMemoryExerciseService.get_session(db, session_id, user_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    return MemoryExerciseSessionResponse(
-        id=session.id,
-        user_id=session.user_id,
-        exercise_id=session.exercise_id,
-        exercise_type=session.exercise_type,
-        difficulty=session.difficulty,
-        config=session.config,
-        is_completed=session.is_completed,
-        total_moves=session.total_moves,
-        correct_moves=session.correct_moves,
-        incorrect_moves=session.incorrect_moves,
-        time_elapsed_ms=session.time_elapsed_ms,
-        max_sequence_reached=session.max_sequence_reached,
-        final_score=session.final_score,
-        score_breakdown=session.score_breakdown,
-        accuracy=session.get_accuracy(),
-        created_at=session.created_at,
-        updated_at=session.updated_at,
-        completed_at=session.completed_at,
-    )
+    return _session_response(session)
+
+
+@router.post("/sessions/{session_id}/moves", response_model=MemoryExerciseMoveAppendResult)
+async def append_moves(
+    session_id: int,
+    batch: MemoryExerciseMoveBatch,
+    user_id: int = Query(..., description="User ID for authorization"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record per-move events of an in-progress session
+
+    Send events in order, in batches of up to 10000; a batch starting
+    before the last recorded move is refused with 409. The session's
+    total/correct/incorrect moves and elapsed time are derived from the
+    events, so clients streaming moves only need to send completed_at
+    when the session ends.
+    """
+    try:
+        return await AsyncMemoryExerciseService.append_moves(db, session_id, user_id, batch)
+    except (SessionCompletedError, MoveOrderError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/sessions/{session_id}/moves", response_model=MemoryExerciseMoves)
+async def get_moves(
+    session_id: int,
+    user_id: int = Query(..., description="User ID for authorization"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the recorded move events of a session with per-move reaction times"""
+    moves = await AsyncMemoryExerciseService.get_moves(db, session_id, user_id)
+    if moves is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return moves
 
 
 @router.get("/sessions", response_model=List[MemoryExerciseSessionResponse])
@@ -127,115 +200,307 @@ async def get_user_sessions(
     exercise_type: Optional[str] = None,
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
-):
-    """Get user's session history"""
-    sessions = MemoryExerciseService.get_user_sessions(db, user_id, exercise_type, limit, offset)
-    return [
-        MemoryExerciseSessionResponse(
-            id=s.id,
-            user_id=s.user_id,
-            exercise_id=s.exercise_id,
-            exercise_type=s.exercise_type,
-            difficulty=s.difficulty,
-            config=s.config,
-            is_completed=s.is_completed,
-            total_moves=s.total_moves,
-            correct_moves=s.correct_moves,
-            incorrect_moves=s.incorrect_moves,
-            time_elapsed_ms=s.time_elapsed_ms,
-            max_sequence_reached=s.max_sequence_reached,
-            final_score=s.final_score,
-            score_breakdown=s.score_breakdown,
-            accuracy=s.get_accuracy(),
-            created_at=s.created_at,
-            updated_at=s.updated_at,
-            completed_at=s.completed_at,
-        )
-        for s in sessions
-    ]
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page (replaces offset)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get user's session history
+
+    Full pages carry an X-Next-Cursor header; passing it back as ``cursor``
+    fetches the next page at the same cost as the first one.
+    """
+    try:
+        sessions = await AsyncMemoryExerciseService.get_user_sessions(db, user_id, exercise_type, limit, offset, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Next-Cursor": encode_cursor(sessions[-1])} if len(sessions) == limit else None
+    return Response(
+        _SESSION_LIST.dump_json(_SESSION_LIST.validate_python(sessions, from_attributes=True)),
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.get("/leaderboard", response_model=List[MemoryExerciseLeaderboard])
 async def get_leaderboard(
+    request: Request,
     exercise_id: Optional[int] = None,
-    exercise_type: Optional[str] = None,
-    difficulty: Optional[str] = None,
+    exercise_type: Optional[MemoryExerciseType] = None,
+    difficulty: Optional[DifficultyLevel] = None,
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    user_id: Optional[int] = Query(None, description="Flags this user's entry as is_current_user"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get leaderboard for an exercise (best session per user)"""
+    exercise_type = exercise_type.value if exercise_type else None
+    difficulty = difficulty.value if difficulty else None
+    return await cache.cached_response(
+        request,
+        leaderboard_service.cache_namespace(partition_key(exercise_type, difficulty, exercise_id)),
+        f"top:{limit}:{user_id}",
+        lambda: AsyncMemoryExerciseService.get_leaderboard(db, exercise_id, exercise_type, difficulty, limit, user_id),
+        settings.LEADERBOARD_CACHE_TTL_SECONDS,
+        _PRIVATE if user_id is not None else f"public, max-age={settings.LEADERBOARD_MAX_AGE_SECONDS}",
+    )
+
+
+@router.get("/leaderboard/rank", response_model=MemoryExerciseLeaderboardRank)
+async def get_leaderboard_rank(
+    request: Request,
+    user_id: int = Query(..., description="User ID"),
+    exercise_id: Optional[int] = None,
+    exercise_type: Optional[MemoryExerciseType] = None,
+    difficulty: Optional[DifficultyLevel] = None,
+    neighbours: int = Query(2, ge=0, le=25),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get leaderboard for an exercise"""
-    return MemoryExerciseService.get_leaderboard(db, exercise_id, exercise_type, difficulty, limit)
+    """Get a user's leaderboard rank with the entries around it"""
+    exercise_type = exercise_type.value if exercise_type else None
+    difficulty = difficulty.value if difficulty else None
+
+    async def build():
+        rank = await AsyncMemoryExerciseService.get_user_rank(
+            db, user_id, exercise_id, exercise_type, difficulty, neighbours
+        )
+        if rank is None:
+            raise HTTPException(status_code=404, detail="User has no completed session on this leaderboard")
+        return rank
+
+    return await cache.cached_response(
+        request,
+        leaderboard_service.cache_namespace(partition_key(exercise_type, difficulty, exercise_id)),
+        f"rank:{user_id}:{neighbours}",
+        build,
+        settings.LEADERBOARD_CACHE_TTL_SECONDS,
+        _PRIVATE,
+    )
 
 
 @router.get("/stats", response_model=List[MemoryExerciseStats])
 async def get_user_stats(
+    request: Request,
     user_id: int = Query(..., description="User ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get user statistics"""
-    return MemoryExerciseService.get_user_stats(db, user_id)
+    return await cache.cached_response(
+        request,
+        stats_service.cache_namespace(user_id),
+        "all",
+        lambda: AsyncMemoryExerciseService.get_user_stats(db, user_id),
+        settings.CACHE_TTL_SECONDS,
+        _PRIVATE,
+    )
+
+
+@router.get("/ratings", response_model=List[MemoryExerciseRating])
+async def get_user_ratings(
+    request: Request,
+    user_id: int = Query(..., description="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a user's skill rating and rating deviation for every exercise type played"""
+    return await cache.cached_response(
+        request,
+        stats_service.cache_namespace(user_id),
+        "ratings",
+        lambda: AsyncMemoryExerciseService.get_user_ratings(db, user_id),
+        settings.CACHE_TTL_SECONDS,
+        _PRIVATE,
+    )
+
+
+@router.get("/ratings/ladder", response_model=List[MemoryExerciseRatingLadder])
+async def get_rating_ladder(
+    request: Request,
+    exercise_type: MemoryExerciseType = Query(...),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    user_id: Optional[int] = Query(None, description="Flags this user's entry as is_current_user"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the skill ratings of an exercise type, highest first"""
+    return await cache.cached_response(
+        request,
+        rating_service.cache_namespace(exercise_type.value),
+        f"ladder:{limit}:{offset}:{user_id}",
+        lambda: AsyncMemoryExerciseService.get_rating_ladder(db, exercise_type.value, limit, offset, user_id),
+        settings.LEADERBOARD_CACHE_TTL_SECONDS,
+        _PRIVATE if user_id is not None else f"public, max-age={settings.LEADERBOARD_MAX_AGE_SECONDS}",
+    )
+
+
+@router.get("/progress", response_model=MemoryExerciseProgress)
+async def get_user_progress(
+    request: Request,
+    user_id: int = Query(..., description="User ID"),
+    exercise_type: MemoryExerciseType = Query(...),
+    interval: ProgressInterval = Query(ProgressInterval.DAY, description="day, week (from Monday) or month"),
+    difficulty: Optional[DifficultyLevel] = None,
+    start: Optional[datetime] = Query(None, description="created_at lower bound (inclusive)"),
+    end: Optional[datetime] = Query(None, description="created_at upper bound (exclusive)"),
+    points: Optional[int] = Query(None, ge=3, le=2000, description="Downsample to at most this many points (LTTB)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a user's average and best score, accuracy and session count over time
+
+    One point per bucket with completed sessions, oldest first. With
+    ``points``, long series keep the buckets that best preserve the shape
+    of the average score curve; total_buckets tells how many there were.
+    """
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    difficulty_value = difficulty.value if difficulty else None
+    return await cache.cached_response(
+        request,
+        stats_service.cache_namespace(user_id),
+        f"progress:{exercise_type.value}:{interval.value}:{difficulty_value}:{start}:{end}:{points}",
+        lambda: AsyncMemoryExerciseService.get_user_progress(
+            db, user_id, exercise_type.value, interval, difficulty_value, start, end, points
+        ),
+        settings.CACHE_TTL_SECONDS,
+        _PRIVATE,
+    )
+
+
+@router.get("/scores/distribution", response_model=MemoryExerciseScoreDistribution)
+async def get_score_distribution(
+    exercise_type: MemoryExerciseType,
+    difficulty: DifficultyLevel,
+    user_id: Optional[int] = Query(None, description="Report the percentile of this user's best score"),
+    score: Optional[float] = Query(None, ge=0, le=100, description="Report the percentile of this score instead"),
+    bins: int = Query(20, ge=1, le=100, description="Histogram bins over 0-100"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the final score distribution of an exercise type and difficulty
+
+    Answered from a mergeable sketch of all completed sessions, so the cost
+    does not grow with the history: quantiles are within relative_accuracy
+    of the exact scores, and counts include completions up to one sketch
+    flush interval old on other workers.
+    """
+    return await AsyncMemoryExerciseService.get_score_distribution(
+        db, exercise_type.value, difficulty.value, user_id, score, bins
+    )
+
+
+# Presets are static: built and serialized once at import
+CONFIG_PRESETS: Dict[MemoryExerciseType, List[ConfigPreset]] = {
+    MemoryExerciseType.MEMORY_CARDS: [
+        ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
+            exercise_type=MemoryExerciseType.MEMORY_CARDS,
+            difficulty=DifficultyLevel.EASY,
+            grid_rows=4, grid_cols=4,
+            time_limit_ms=300000,
+            time_weight=0.3, accuracy_weight=0.7
+        )),
+        ConfigPreset(name="Moyen", difficulty=DifficultyLevel.MEDIUM, config=MemoryExerciseConfig(
+            exercise_type=MemoryExerciseType.MEMORY_CARDS,
+            difficulty=DifficultyLevel.MEDIUM,
+            grid_rows=6, grid_cols=6,
+            time_limit_ms=420000,
+            time_weight=0.4, accuracy_weight=0.6
+        )),
+        ConfigPreset(name="Difficile", difficulty=DifficultyLevel.HARD, config=MemoryExerciseConfig(
+            exercise_type=MemoryExerciseType.MEMORY_CARDS,
+            difficulty=DifficultyLevel.HARD,
+            grid_rows=8, grid_cols=8,
+            time_limit_ms=600000,
+            time_weight=0.5, accuracy_weight=0.5
+        )),
+    ],
+    MemoryExerciseType.PATTERN_RECALL: [
+        ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
+            exercise_type=MemoryExerciseType.PATTERN_RECALL,
+            difficulty=DifficultyLevel.EASY,
+            grid_rows=3, grid_cols=3,
+            colors=["#3B82F6", "#EF4444", "#10B981", "#F59E0B"],
+            preview_duration_ms=3000,
+            time_limit_ms=60000,
+            time_weight=0.3, accuracy_weight=0.7
+        )),
+    ],
+    MemoryExerciseType.SEQUENCE_MEMORY: [
+        ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
+            exercise_type=MemoryExerciseType.SEQUENCE_MEMORY,
+            difficulty=DifficultyLevel.EASY,
+            grid_rows=3, grid_cols=3,
+            initial_sequence_length=3,
+            max_sequence_length=20,
+            preview_duration_ms=1000,
+            time_weight=0.2, accuracy_weight=0.8
+        )),
+    ],
+    MemoryExerciseType.IMAGE_PAIRS: [
+        ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
+            exercise_type=MemoryExerciseType.IMAGE_PAIRS,
+            difficulty=DifficultyLevel.EASY,
+            grid_rows=4, grid_cols=4,
+            time_limit_ms=300000,
+            time_weight=0.3, accuracy_weight=0.7
+        )),
+    ],
+}
+_PRESET_BODIES = {
+    exercise_type: to_json(CONFIG_PRESETS.get(exercise_type, [])) for exercise_type in MemoryExerciseType
+}
+_PRESET_ETAGS = {exercise_type: cache.make_etag(body) for exercise_type, body in _PRESET_BODIES.items()}
 
 
 @router.get("/presets/{exercise_type}", response_model=List[ConfigPreset])
-async def get_config_presets(exercise_type: MemoryExerciseType):
+async def get_config_presets(request: Request, exercise_type: MemoryExerciseType):
     """Get configuration presets for an exercise type"""
-    # Define presets for each exercise type
-    presets_map = {
-        MemoryExerciseType.MEMORY_CARDS: [
-            ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
-                exercise_type=MemoryExerciseType.MEMORY_CARDS,
-                difficulty=DifficultyLevel.EASY,
-                grid_rows=4, grid_cols=4,
-                time_limit_ms=300000,
-                time_weight=0.3, accuracy_weight=0.7
-            )),
-            ConfigPreset(name="Moyen", difficulty=DifficultyLevel.MEDIUM, config=MemoryExerciseConfig(
-                exercise_type=MemoryExerciseType.MEMORY_CARDS,
-                difficulty=DifficultyLevel.MEDIUM,
-                grid_rows=6, grid_cols=6,
-                time_limit_ms=420000,
-                time_weight=0.4, accuracy_weight=0.6
-            )),
-            ConfigPreset(name="Difficile", difficulty=DifficultyLevel.HARD, config=MemoryExerciseConfig(
-                exercise_type=MemoryExerciseType.MEMORY_CARDS,
-                difficulty=DifficultyLevel.HARD,
-                grid_rows=8, grid_cols=8,
-                time_limit_ms=600000,
-                time_weight=0.5, accuracy_weight=0.5
-            )),
-        ],
-        MemoryExerciseType.PATTERN_RECALL: [
-            ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
-                exercise_type=MemoryExerciseType.PATTERN_RECALL,
-                difficulty=DifficultyLevel.EASY,
-                grid_rows=3, grid_cols=3,
-                colors=["#3B82F6", "#EF4444", "#10B981", "#F59E0B"],
-                preview_duration_ms=3000,
-                time_limit_ms=60000,
-                time_weight=0.3, accuracy_weight=0.7
-            )),
-        ],
-        MemoryExerciseType.SEQUENCE_MEMORY: [
-            ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
-                exercise_type=MemoryExerciseType.SEQUENCE_MEMORY,
-                difficulty=DifficultyLevel.EASY,
-                grid_rows=3, grid_cols=3,
-                initial_sequence_length=3,
-                max_sequence_length=20,
-                preview_duration_ms=1000,
-                time_weight=0.2, accuracy_weight=0.8
-            )),
-        ],
-        MemoryExerciseType.IMAGE_PAIRS: [
-            ConfigPreset(name="Facile", difficulty=DifficultyLevel.EASY, config=MemoryExerciseConfig(
-                exercise_type=MemoryExerciseType.IMAGE_PAIRS,
-                difficulty=DifficultyLevel.EASY,
-                grid_rows=4, grid_cols=4,
-                time_limit_ms=300000,
-                time_weight=0.3, accuracy_weight=0.7
-            )),
-        ],
-    }
-
-    return presets_map.get(exercise_type, [])
+    return cache.etag_response(
+        request,
+        _PRESET_BODIES[exercise_type],
+        _PRESET_ETAGS[exercise_type],
+        f"public, max-age={settings.PRESETS_MAX_AGE_SECONDS}",
+    )
+
+
+# Puzzles of every preset for seeds 0..PUZZLE_POOL_SIZE-1, generated once at import
+_PRESET_CONFIGS: Dict[tuple, MemoryExerciseConfig] = {
+    (exercise_type, preset.difficulty): preset.config
+    for exercise_type, presets in CONFIG_PRESETS.items()
+    for preset in presets
+}
+PuzzleService.pregenerate(list(_PRESET_CONFIGS.values()), settings.PUZZLE_POOL_SIZE)
+
+
+@router.get("/puzzles/{exercise_type}/{difficulty}", response_model=MemoryExercisePuzzle)
+async def get_preset_puzzle(
+    request: Request,
+    exercise_type: MemoryExerciseType,
+    difficulty: DifficultyLevel,
+    seed: Optional[int] = Query(None, ge=0, le=MAX_PUZZLE_SEED, description="Omit for a random pregenerated seed"),
+):
+    """
+    Get the puzzle of a config preset
+
+    Without a seed, one of the pregenerated seeds is picked at random (for
+    practice); a session's puzzle is the one of its server-assigned
+    puzzle_seed. Puzzles requested by seed never change and are cacheable.
+    """
+    config = _PRESET_CONFIGS.get((exercise_type, difficulty))
+    if config is None:
+        raise HTTPException(status_code=404, detail="No preset for this exercise type and difficulty")
+
+    if seed is None:
+        seed = random.randrange(PuzzleService.pool_size(config) or MAX_PUZZLE_SEED)
+        cache_control = "no-store"
+    else:
+        cache_control = f"public, max-age={settings.PUZZLE_MAX_AGE_SECONDS}"
+    body, etag = PuzzleService.get_puzzle(config, seed)
+    return cache.etag_response(request, body, etag, cache_control)
+
+
+@router.post("/puzzles", response_model=MemoryExercisePuzzle)
+async def get_puzzle(request: Request, puzzle_request: MemoryExercisePuzzleRequest):
+    """Get the puzzle of any config for a seed (pregenerated for preset layouts)"""
+    try:
+        body, etag = PuzzleService.get_puzzle(puzzle_request.config, puzzle_request.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cache.etag_response(request, body, etag, "private, no-cache")
@@ -4,12 +4,19 @@ Memory Exercise Pydantic schemas for request/response validation
 @copyright Jay The Ermite
 """
 
-from typing import Optional, Dict, Any, List
-from datetime import datetime
-from pydantic import BaseModel, Field
+from typing import Annotated, Optional, Dict, Any, List
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, field_validator, model_validator
 from enum import Enum
 
 
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Store timestamps as naive UTC (columns are TIMESTAMP WITHOUT TIME ZONE)"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
 class MemoryExerciseType(str, Enum):
     """Types of visual memory exercises"""
     MEMORY_CARDS = "memory_cards"
@@ -42,8 +49,21 @@ class MemoryExerciseConfig(BaseModel):
     accuracy_weight: float = 0.5
 
 
+# Puzzle seeds are stored in an INTEGER column
+MAX_PUZZLE_SEED = 2 ** 31 - 1
+
+# Largest grid a puzzle may have; move cells index into it
+MAX_GRID_CELLS = 400
+
+# Move offsets end up in INTEGER columns (time_elapsed_ms, base_offset_ms)
+MAX_MOVE_OFFSET_MS = 2 ** 31 - 1
+
+# How far ahead of the server clock an offline client's timestamps may be
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
 class MemoryExerciseSessionCreate(BaseModel):
-    """Create a new memory exercise session"""
+    """Create a new memory exercise session (its puzzle seed is assigned by the server)"""
     user_id: int
     exercise_id: Optional[int] = None
     config: MemoryExerciseConfig
@@ -60,6 +80,111 @@ class MemoryExerciseSessionUpdate(BaseModel):
     final_score: Optional[float] = None
     score_breakdown: Optional[Dict[str, Any]] = None
 
+    _normalize_completed_at = field_validator("completed_at")(to_naive_utc)
+
+
+class MemoryExerciseSessionBatchItem(BaseModel):
+    """A finished session recorded offline and synced later (without a puzzle seed or move log)"""
+    idempotency_key: str = Field(..., min_length=1, max_length=64, description="Client-generated, unique per user")
+    user_id: int
+    exercise_id: Optional[int] = None
+    config: MemoryExerciseConfig
+    created_at: Optional[datetime] = None
+    completed_at: datetime
+    total_moves: int = Field(0, ge=0)
+    correct_moves: int = Field(0, ge=0)
+    incorrect_moves: int = Field(0, ge=0)
+    time_elapsed_ms: int = Field(0, ge=0)
+    max_sequence_reached: Optional[int] = Field(None, ge=0)
+
+    _normalize_timestamps = field_validator("created_at", "completed_at")(to_naive_utc)
+
+    @model_validator(mode="after")
+    def check_move_counts(self) -> "MemoryExerciseSessionBatchItem":
+        """Move counts add up and the session started before it ended, which is not in the future"""
+        if self.correct_moves + self.incorrect_moves != self.total_moves:
+            raise ValueError("correct_moves + incorrect_moves must equal total_moves")
+        if self.created_at is not None and self.created_at > self.completed_at:
+            raise ValueError("created_at cannot be after completed_at")
+        if self.completed_at > to_naive_utc(datetime.now(timezone.utc)) + MAX_CLOCK_SKEW:
+            raise ValueError("completed_at cannot be in the future")
+        return self
+
+
+class MemoryExerciseSessionBatch(BaseModel):
+    """
+    Batch of finished sessions
+
+    Items are validated one by one so a bad item is reported without
+    rejecting the rest of the batch.
+    """
+    sessions: List[Dict[str, Any]] = Field(..., min_length=1, max_length=500)
+
+
+class BatchItemStatus(str, Enum):
+    """Outcome of one batch item"""
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    INVALID = "invalid"
+
+
+class MemoryExerciseBatchItemResult(BaseModel):
+    """Per-item result of a batch ingestion"""
+    index: int
+    idempotency_key: Optional[str] = None
+    status: BatchItemStatus
+    session_id: Optional[int] = None
+    errors: List[str] = []
+
+
+class MemoryExerciseBatchResult(BaseModel):
+    """Batch ingestion summary"""
+    created: int
+    duplicates: int
+    invalid: int
+    results: List[MemoryExerciseBatchItemResult]
+
+
+class MemoryExerciseMoveBatch(BaseModel):
+    """
+    Move events of a session, one list per field (event i is the i-th
+    element of each list)
+    """
+    offset_ms: List[Annotated[int, Field(ge=0, le=MAX_MOVE_OFFSET_MS)]] = Field(
+        ..., min_length=1, max_length=10000, description="Milliseconds since session start, non-decreasing"
+    )
+    cell: List[Annotated[int, Field(ge=0, lt=MAX_GRID_CELLS)]] = Field(..., description="Grid cell index of the move")
+    correct: List[bool]
+
+    @model_validator(mode="after")
+    def check_columns(self) -> "MemoryExerciseMoveBatch":
+        """Lists have one entry per move and offsets are ordered"""
+        count = len(self.offset_ms)
+        if len(self.cell) != count or len(self.correct) != count:
+            raise ValueError("offset_ms, cell and correct must have the same length")
+        if any(a > b for a, b in zip(self.offset_ms, self.offset_ms[1:])):
+            raise ValueError("offset_ms must be non-decreasing")
+        return self
+
+
+class MemoryExerciseMoveAppendResult(BaseModel):
+    """Session aggregates after appending moves"""
+    session_id: int
+    appended: int
+    total_moves: int
+    correct_moves: int
+    incorrect_moves: int
+    time_elapsed_ms: int
+
+
+class MemoryExerciseMoves(BaseModel):
+    """Recorded move events of a session, in order"""
+    session_id: int
+    offset_ms: List[int]
+    cell: List[int]
+    correct: List[bool]
+    reaction_ms: List[int]  # Time since the previous move (the first move: since session start)
+
 
 class ScoreBreakdown(BaseModel):
     """Detailed score breakdown"""
@@ -83,6 +208,7 @@ class MemoryExerciseSessionResponse(BaseModel):
     exercise_type: str
     difficulty: str
     config: Dict[str, Any]
+    puzzle_seed: Optional[int] = None
     is_completed: bool
     total_moves: int
     correct_moves: int
@@ -91,6 +217,8 @@ class MemoryExerciseSessionResponse(BaseModel):
     max_sequence_reached: Optional[int]
     final_score: Optional[float]
     score_breakdown: Optional[Dict[str, Any]]
+    verification_status: Optional[str] = None
+    verification_flags: Optional[List[str]] = None
     accuracy: float
     created_at: datetime
     updated_at: datetime
@@ -129,6 +257,103 @@ class MemoryExerciseLeaderboard(BaseModel):
     is_current_user: bool
 
 
+class MemoryExerciseLeaderboardRank(BaseModel):
+    """A user's leaderboard position with the entries around it"""
+    rank: int
+    total_players: int
+    entries: List[MemoryExerciseLeaderboard]
+
+
+class MemoryExerciseRating(BaseModel):
+    """A user's Glicko skill rating on one exercise type"""
+    user_id: int
+    exercise_type: MemoryExerciseType
+    rating: float
+    deviation: float  # Rating deviation now (grows while the user does not play)
+    sessions: int  # Sessions rated
+    last_completed_at: datetime
+
+
+class MemoryExerciseRatingLadder(BaseModel):
+    """Ladder entry: ratings of one exercise type, highest first"""
+    rank: int
+    user_id: int
+    rating: float
+    deviation: float
+    sessions: int
+    last_completed_at: datetime
+    is_current_user: bool
+
+
+class ProgressInterval(str, Enum):
+    """Time bucket of a progress series"""
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class MemoryExerciseProgressPoint(BaseModel):
+    """Aggregates of the completed sessions started in one time bucket"""
+    bucket_start: datetime
+    sessions: int
+    avg_score: Optional[float]
+    max_score: Optional[float]
+    avg_accuracy: float
+
+
+class MemoryExerciseProgress(BaseModel):
+    """A user's progress over time for one exercise type"""
+    user_id: int
+    exercise_type: MemoryExerciseType
+    difficulty: Optional[DifficultyLevel] = None
+    interval: ProgressInterval
+    total_buckets: int  # Buckets before downsampling
+    points: List[MemoryExerciseProgressPoint]
+
+
+class ScoreHistogramBin(BaseModel):
+    """Completed sessions with a final score in [lower, upper) (the last bin includes its upper bound)"""
+    lower: float
+    upper: float
+    count: int
+
+
+class MemoryExerciseScoreDistribution(BaseModel):
+    """Final score distribution of an exercise type and difficulty, from an approximate sketch"""
+    exercise_type: MemoryExerciseType
+    difficulty: DifficultyLevel
+    total_sessions: int
+    relative_accuracy: float  # Bound on the relative error of each quantile
+    quantiles: Dict[str, float]  # "p50" is the median score, ...
+    histogram: List[ScoreHistogramBin]
+    user_id: Optional[int] = None
+    score: Optional[float] = None  # The user's best score, or the score asked for
+    percentile: Optional[float] = None  # Share of completed sessions scoring below `score`, in percent
+
+
+class MemoryExercisePuzzle(BaseModel):
+    """
+    What the player is shown, reproducible from the config and seed
+
+    Cells are numbered row by row. Only the fields of the exercise type are set.
+    """
+    exercise_type: MemoryExerciseType
+    seed: int
+    generator_version: int
+    grid_rows: int
+    grid_cols: int
+    pairs: Optional[List[int]] = None  # Memory Cards, Image Pairs: pair id of each cell (odd grids: last cell empty)
+    pattern: Optional[List[Optional[int]]] = None  # Pattern Recall: color index of each cell, null = blank
+    colors: Optional[List[str]] = None  # Pattern Recall: palette indexed by pattern
+    sequence: Optional[List[int]] = None  # Sequence Memory: cells to repeat, level n shows the first n
+
+
+class MemoryExercisePuzzleRequest(BaseModel):
+    """Puzzle of an arbitrary config"""
+    config: MemoryExerciseConfig
+    seed: int = Field(..., ge=0, le=MAX_PUZZLE_SEED)
+
+
 class ConfigPreset(BaseModel):
     """Configuration preset for an exercise type"""
     name: str
@@ -0,0 +1,95 @@
+"""
+Config Service - Content-addressed storage of exercise configs
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Sessions reference their config by id (memory_exercise_sessions.config_id)
+instead of each row carrying the JSON. A config is stored once per distinct
+content in exercise_configs, keyed by the SHA-256 of its canonical JSON
+(sorted keys, no whitespace). Nearly every session uses a preset, so the
+table holds a handful of rows.
+
+Rows are never updated, so the id of a committed hash is cached per
+process: creating a session then attaches the config row to the database
+session without a query.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Union
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.database import dialect_insert
+from app.models.exercise_config import ExerciseConfig
+from app.schemas.memory_exercise import MemoryExerciseConfig
+
+# Config hash -> exercise_configs.id
+_ids: Dict[str, int] = {}
+
+
+def canonical_config(config: Union[MemoryExerciseConfig, Dict[str, Any]]) -> Dict[str, Any]:
+    """JSON-ready dict of a config, as stored"""
+    if isinstance(config, MemoryExerciseConfig):
+        return config.model_dump(mode="json")
+    return config
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """Hex SHA-256 of a config's canonical JSON"""
+    return hashlib.sha256(orjson.dumps(config, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class ConfigService:
+    """Service interning configs into exercise_configs"""
+
+    @staticmethod
+    def intern(db: Session, config: Union[MemoryExerciseConfig, Dict[str, Any]]) -> ExerciseConfig:
+        """Row of a config, inserted if new, attached to db (caller commits)"""
+        config = canonical_config(config)
+        digest = config_hash(config)
+        config_id = _ids.get(digest)
+        if config_id is None:
+            config_id = ConfigService.intern_many(db, [config])[digest]
+
+        row = ExerciseConfig(id=config_id, config_hash=digest, config=config)
+        make_transient_to_detached(row)
+        return db.merge(row, load=False)
+
+    @staticmethod
+    def intern_many(db: Session, configs: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Ids of JSON-ready configs by hash, inserting the new ones (caller commits)
+
+        Concurrent inserts of one config are resolved by the unique hash:
+        the loser's row is skipped and the winner's id read back. Ids of rows
+        inserted here are cached only once read again after the commit.
+        """
+        by_hash = {config_hash(config): config for config in configs}
+        ids = {digest: _ids[digest] for digest in by_hash if digest in _ids}
+        missing = [digest for digest in by_hash if digest not in ids]
+        if missing:
+            existing = _select_ids(db, missing)
+            _ids.update(existing)
+            ids.update(existing)
+            new = [digest for digest in missing if digest not in existing]
+            if new:
+                db.execute(
+                    dialect_insert(db, ExerciseConfig.__table__)
+                    .values([{"config_hash": digest, "config": by_hash[digest]} for digest in new])
+                    .on_conflict_do_nothing()
+                )
+                ids.update(_select_ids(db, new))
+        return ids
+
+    @staticmethod
+    def load_all(db: Session) -> Dict[int, Dict[str, Any]]:
+        """Every stored config by id (a few rows), for column-wise scans of sessions"""
+        return dict(db.execute(select(ExerciseConfig.id, ExerciseConfig.config)).tuples().all())
+
+
+def _select_ids(db: Session, digests: List[str]) -> Dict[str, int]:
+    return dict(db.execute(
+        select(ExerciseConfig.config_hash, ExerciseConfig.id).where(ExerciseConfig.config_hash.in_(digests))
+    ).tuples().all())
@@ -0,0 +1,165 @@
+"""
+Export Service - Streaming bulk export of session history
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+import csv
+import io
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, List, Optional
+
+import orjson
+import pyarrow as pa
+from sqlalchemy import Select, select
+
+from app.core.database import AsyncSessionLocal, read_from_replica
+from app.models.memory_exercise import MemoryExerciseSession
+from app.services.session_archive import (
+    SESSION_ARROW_SCHEMA,
+    inline_configs_query,
+    session_columns,
+    to_record_batch,
+    with_inline_configs,
+    with_score_breakdowns,
+)
+
+# Rows fetched per server-side cursor round trip (and per output chunk)
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportFormat(str, Enum):
+    """Output formats of the session export"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+}
+
+
+def export_query(
+    user_id: Optional[int] = None,
+    exercise_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Select:
+    """Sessions with created_at in [start, end), oldest first; columns as in SESSION_ARROW_SCHEMA"""
+    table = MemoryExerciseSession.__table__
+    query = select(*session_columns(table)).order_by(table.c.created_at, table.c.id)
+    if user_id is not None:
+        query = query.where(table.c.user_id == user_id)
+    if exercise_type:
+        query = query.where(table.c.exercise_type == exercise_type)
+    if start is not None:
+        query = query.where(table.c.created_at >= start)
+    if end is not None:
+        query = query.where(table.c.created_at < end)
+    return query
+
+
+async def stream_export(query: Select, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """
+    Encode the rows of an export query chunk by chunk
+
+    Opens its own session: the response body is produced after the request's
+    dependencies (and their session) have been closed. Rows come through a
+    server-side cursor (on the read replica if configured), so memory use
+    does not depend on the result size; derived score breakdowns are filled
+    in per chunk.
+    """
+    encode = _ENCODERS[export_format]()
+    async with AsyncSessionLocal() as db:
+        result = await read_from_replica(db, lambda: db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE)))
+        header = encode.start()
+        if header:
+            yield header
+        async for rows in result.partitions():
+            inline = inline_configs_query(MemoryExerciseSession.__table__, rows)
+            if inline is not None:
+                rows = with_inline_configs(rows, dict((await db.execute(inline)).tuples().all()))
+            yield encode.chunk(with_score_breakdowns(rows))
+        footer = encode.finish()
+        if footer:
+            yield footer
+
+
+class _NdjsonEncoder:
+    """One JSON object per line; config, score_breakdown and verification_flags are embedded as JSON"""
+
+    _names = SESSION_ARROW_SCHEMA.names
+    _json_columns = ("config", "score_breakdown", "verification_flags")
+
+    def start(self) -> bytes:
+        return b""
+
+    def chunk(self, rows: List) -> bytes:
+        lines = []
+        for row in rows:
+            item = dict(zip(self._names, row))
+            for name in self._json_columns:
+                if item[name] is not None:
+                    item[name] = orjson.loads(item[name])
+            lines.append(orjson.dumps(item))
+        return b"\n".join(lines) + b"\n"
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _CsvEncoder:
+    """Header row then one line per session; JSON columns as text"""
+
+    def start(self) -> bytes:
+        return self._encode([SESSION_ARROW_SCHEMA.names])
+
+    def chunk(self, rows: List) -> bytes:
+        return self._encode(rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+    @staticmethod
+    def _encode(rows: List) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class _ArrowEncoder:
+    """Arrow IPC stream: schema, one record batch per chunk, end-of-stream marker"""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._writer = None
+
+    def start(self) -> bytes:
+        self._writer = pa.ipc.new_stream(pa.PythonFile(self._buffer, mode="w"), SESSION_ARROW_SCHEMA)
+        return self._drain()
+
+    def chunk(self, rows: List) -> bytes:
+        self._writer.write_batch(to_record_batch(rows))
+        return self._drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        """Bytes written since the last drain"""
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+_ENCODERS = {
+    ExportFormat.NDJSON: _NdjsonEncoder,
+    ExportFormat.CSV: _CsvEncoder,
+    ExportFormat.ARROW: _ArrowEncoder,
+}
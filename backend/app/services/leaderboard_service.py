@@ -0,0 +1,367 @@
+"""
+Leaderboard Service - Best score per user, ranked in process
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import product
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import String, cast, delete, desc, func, insert, literal, select
+
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.core.timeutils import epoch_seconds
+from app.models.leaderboard import LeaderboardEntry
+from app.models.memory_exercise import MemoryExerciseSession
+from app.schemas.memory_exercise import MemoryExerciseLeaderboard, MemoryExerciseLeaderboardRank
+from app.services.stats_service import accuracy_expr
+
+# Placeholder for an unfiltered dimension in partition keys
+WILDCARD = "*"
+
+_ENTRY_COLUMNS = (
+    "user_id",
+    "session_id",
+    "final_score",
+    "accuracy",
+    "time_elapsed_ms",
+    "difficulty",
+    "completed_at",
+)
+
+
+class _Entry(NamedTuple):
+    """In-memory copy of a LeaderboardEntry row"""
+    user_id: int
+    session_id: int
+    final_score: float
+    accuracy: float
+    time_elapsed_ms: int
+    difficulty: str
+    completed_at: datetime
+
+
+def partition_key(
+    exercise_type: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    exercise_id: Optional[int] = None
+) -> str:
+    """Leaderboard partition for a combination of filters (None = any)"""
+    return ":".join(WILDCARD if part is None else str(part) for part in (exercise_type, difficulty, exercise_id))
+
+
+def cache_namespace(key: str) -> str:
+    """Response cache namespace of a partition"""
+    return f"leaderboard:{key}"
+
+
+def session_partition_keys(session: MemoryExerciseSession) -> List[str]:
+    """Every leaderboard partition a completed session competes in"""
+    exercise_ids = (session.exercise_id, None) if session.exercise_id is not None else (None,)
+    return [
+        partition_key(exercise_type, difficulty, exercise_id)
+        for exercise_type, difficulty, exercise_id in product(
+            (session.exercise_type, None), (session.difficulty, None), exercise_ids
+        )
+    ]
+
+
+def _sort_key(entry: _Entry) -> Tuple[float, float, int]:
+    """Higher score first, then earlier completion, then user id"""
+    return (-entry.final_score, epoch_seconds(entry.completed_at), entry.user_id)
+
+
+class _Board:
+    """Sorted best-per-user entries of one partition"""
+
+    def __init__(self, entries: Iterable[_Entry]):
+        self.entries: Dict[int, _Entry] = {entry.user_id: entry for entry in entries}
+        self.keys = sorted(_sort_key(entry) for entry in self.entries.values())
+        self.loaded_at = time.monotonic()
+
+    def offer(self, entry: _Entry) -> None:
+        """Insert or replace a user's entry if it beats their current best"""
+        current = self.entries.get(entry.user_id)
+        if current is not None:
+            if entry.final_score <= current.final_score:
+                return
+            del self.keys[bisect_left(self.keys, _sort_key(current))]
+        self.entries[entry.user_id] = entry
+        insort(self.keys, _sort_key(entry))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user, None if they have no entry"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        return bisect_left(self.keys, _sort_key(entry)) + 1
+
+    def slice(self, start: int, stop: int) -> List[Tuple[int, _Entry]]:
+        """(rank, entry) pairs for 0-based positions start..stop"""
+        return [
+            (position + 1, self.entries[key[2]])
+            for position, key in enumerate(self.keys[start:stop], start=start)
+        ]
+
+
+# Least recently used first, at most LEADERBOARD_MAX_BOARDS
+_boards: "OrderedDict[str, _Board]" = OrderedDict()
+_boards_lock = threading.Lock()
+# Entries published while a board is read from the database, one list per
+# load in progress, applied to the loaded board before it replaces the old one
+_loading: Dict[str, List[List[_Entry]]] = {}
+
+
+class LeaderboardService:
+    """Service for leaderboard maintenance and queries"""
+
+    @staticmethod
+    def record_completion(db: Session, session: MemoryExerciseSession) -> List[Tuple[str, _Entry]]:
+        """
+        Offer a completed session to every partition it belongs to
+
+        One multi-row upsert keeps the row only where the score beats the
+        user's current best. Returns the partitions that changed; pass them to
+        publish() once the transaction has committed.
+        """
+        if session.final_score is None:
+            return []
+
+        entry = _Entry(
+            user_id=session.user_id,
+            session_id=session.id,
+            final_score=session.final_score,
+            accuracy=session.get_accuracy(),
+            time_elapsed_ms=session.time_elapsed_ms or 0,
+            difficulty=session.difficulty,
+            completed_at=session.completed_at or datetime.utcnow(),
+        )
+        table = LeaderboardEntry.__table__
+        stmt = dialect_insert(db, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.partition_key, table.c.user_id],
+            set_={column: stmt.excluded[column] for column in _ENTRY_COLUMNS[1:]},
+            where=table.c.final_score < stmt.excluded.final_score,
+        ).returning(table.c.partition_key)
+
+        rows = [{"partition_key": key, **entry._asdict()} for key in session_partition_keys(session)]
+        changed = db.execute(stmt.values(rows)).scalars().all()
+        return [(key, entry) for key in changed]
+
+    @staticmethod
+    def publish(changes: List[Tuple[str, _Entry]]) -> None:
+        """Apply committed changes to the boards loaded (or being loaded) in this process"""
+        with _boards_lock:
+            for key, entry in changes:
+                board = _boards.get(key)
+                if board is not None:
+                    board.offer(entry)
+                for missed in _loading.get(key, ()):
+                    missed.append(entry)
+
+    @staticmethod
+    def invalidate(key: Optional[str] = None) -> None:
+        """Drop one (or every) in-process board so it reloads on next access"""
+        with _boards_lock:
+            if key is None:
+                _boards.clear()
+            else:
+                _boards.pop(key, None)
+
+    @staticmethod
+    def warm(db: Session, keys: List[str]) -> int:
+        """Load the boards of the given partitions; returns the number of entries loaded"""
+        return sum(len(_load_board(db, key).entries) for key in keys)
+
+    @staticmethod
+    def get_leaderboard(
+        db: Session,
+        exercise_id: Optional[int] = None,
+        exercise_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        limit: int = 10,
+        user_id: Optional[int] = None
+    ) -> List[MemoryExerciseLeaderboard]:
+        """Top entries of a partition, one per user"""
+        key = partition_key(exercise_type, difficulty, exercise_id)
+        board = _load_board(db, key)
+        with _boards_lock:
+            ranked = board.slice(0, limit)
+        return [_to_schema(rank, entry, user_id) for rank, entry in ranked]
+
+    @staticmethod
+    def get_user_rank(
+        db: Session,
+        user_id: int,
+        exercise_id: Optional[int] = None,
+        exercise_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        neighbours: int = 2
+    ) -> Optional[MemoryExerciseLeaderboardRank]:
+        """A user's rank in a partition with the entries just above and below"""
+        key = partition_key(exercise_type, difficulty, exercise_id)
+        board = _load_board(db, key)
+        with _boards_lock:
+            rank = board.rank(user_id)
+            if rank is None:
+                return None
+            ranked = board.slice(max(0, rank - 1 - neighbours), rank + neighbours)
+            total_players = len(board.entries)
+
+        return MemoryExerciseLeaderboardRank(
+            rank=rank,
+            total_players=total_players,
+            entries=[_to_schema(position, entry, user_id) for position, entry in ranked],
+        )
+
+    @staticmethod
+    def get_user_best(
+        db: Session,
+        user_id: int,
+        exercise_type: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> Optional[float]:
+        """A user's best score in a partition, None if they have no entry"""
+        board = _load_board(db, partition_key(exercise_type, difficulty))
+        with _boards_lock:
+            entry = board.entries.get(user_id)
+        return entry.final_score if entry is not None else None
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """
+        Recompute every partition from completed sessions (pending and
+        rejected ones excluded, see MemoryExerciseSession.ranked)
+
+        Runs one INSERT ... SELECT per wildcard combination, keeping each
+        user's best session. Commits and returns the number of entries.
+        """
+        db.execute(delete(LeaderboardEntry))
+
+        finished_at = func.coalesce(MemoryExerciseSession.completed_at, MemoryExerciseSession.updated_at)
+        dimensions = (
+            MemoryExerciseSession.exercise_type,
+            MemoryExerciseSession.difficulty,
+            cast(MemoryExerciseSession.exercise_id, String),
+        )
+
+        written = 0
+        for used in product((True, False), repeat=3):
+            key_parts = [column if use else literal(WILDCARD, String) for column, use in zip(dimensions, used)]
+            key_expr = key_parts[0] + ":" + key_parts[1] + ":" + key_parts[2]
+
+            criteria = [
+                MemoryExerciseSession.is_completed == True,  # noqa: E712 - matches the partial index predicate
+                MemoryExerciseSession.final_score.isnot(None),
+                MemoryExerciseSession.ranked(),
+            ]
+            if used[2]:
+                criteria.append(MemoryExerciseSession.exercise_id.isnot(None))
+
+            ranked = (
+                select(
+                    key_expr.label("partition_key"),
+                    MemoryExerciseSession.user_id,
+                    MemoryExerciseSession.id.label("session_id"),
+                    MemoryExerciseSession.final_score,
+                    accuracy_expr().label("accuracy"),
+                    func.coalesce(MemoryExerciseSession.time_elapsed_ms, 0).label("time_elapsed_ms"),
+                    MemoryExerciseSession.difficulty,
+                    finished_at.label("completed_at"),
+                    func.row_number().over(
+                        partition_by=[*(col for col, use in zip(dimensions, used) if use), MemoryExerciseSession.user_id],
+                        order_by=(desc(MemoryExerciseSession.final_score), finished_at, MemoryExerciseSession.id),
+                    ).label("best_rank"),
+                )
+                .where(*criteria)
+                .subquery()
+            )
+            columns = ("partition_key", *_ENTRY_COLUMNS)
+            result = db.execute(
+                insert(LeaderboardEntry).from_select(
+                    list(columns),
+                    select(*(ranked.c[column] for column in columns)).where(ranked.c.best_rank == 1),
+                )
+            )
+            written += result.rowcount
+
+        db.commit()
+        LeaderboardService.invalidate()
+        return written
+
+
+def _load_board(db: Session, key: str) -> _Board:
+    """
+    Return the in-process board for a partition, loading it when missing or stale
+
+    The query runs outside the lock: entries published meanwhile (possibly
+    committed after the query's snapshot) are offered to the new board
+    before it is stored, so a concurrent new best is not lost.
+    """
+    missed: List[_Entry] = []
+    with _boards_lock:
+        board = _boards.get(key)
+        if board is not None and time.monotonic() - board.loaded_at < settings.LEADERBOARD_CACHE_TTL_SECONDS:
+            _boards.move_to_end(key)
+            return board
+        _loading.setdefault(key, []).append(missed)
+
+    try:
+        rows = db.execute(
+            select(*(getattr(LeaderboardEntry, column) for column in _ENTRY_COLUMNS))
+            .where(LeaderboardEntry.partition_key == key)
+        ).all()
+        board = _Board(_Entry(*row) for row in rows)
+    except BaseException:
+        with _boards_lock:
+            _stop_loading(key, missed)
+        raise
+    with _boards_lock:
+        _stop_loading(key, missed)
+        for entry in missed:
+            board.offer(entry)
+        _boards[key] = board
+        _boards.move_to_end(key)
+        _evict_boards()
+    return board
+
+
+def _stop_loading(key: str, missed: List[_Entry]) -> None:
+    """Stop collecting published entries for one load (lock held)"""
+    others = [entries for entries in _loading[key] if entries is not missed]
+    if others:
+        _loading[key] = others
+    else:
+        del _loading[key]
+
+
+def _evict_boards() -> None:
+    """Trim _boards to LEADERBOARD_MAX_BOARDS, empty boards first, then least recently used (lock held)"""
+    excess = len(_boards) - settings.LEADERBOARD_MAX_BOARDS
+    if excess <= 0:
+        return
+    for key in [key for key, board in _boards.items() if not board.entries][:excess]:
+        del _boards[key]
+        excess -= 1
+    for _ in range(excess):
+        _boards.popitem(last=False)
+
+
+def _to_schema(rank: int, entry: _Entry, current_user_id: Optional[int]) -> MemoryExerciseLeaderboard:
+    """Convert an in-memory entry to its response schema"""
+    return MemoryExerciseLeaderboard(
+        rank=rank,
+        user_id=entry.user_id,
+        final_score=entry.final_score,
+        accuracy=entry.accuracy,
+        time_elapsed_ms=entry.time_elapsed_ms,
+        difficulty=entry.difficulty,
+        completed_at=entry.completed_at,
+        is_current_user=entry.user_id == current_user_id,
+    )
@@ -4,18 +4,51 @@ Memory Exercise Service - Business logic for memory exercises
 @copyright Jay The Ermite
 """
 
-from typing import List, Optional
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import desc, insert, inspect, select, tuple_, update
 from datetime import datetime
 
-from app.models.memory_exercise import MemoryExerciseSession
+from app.core import cache
+from app.core.config import settings
+from app.core.database import dialect_insert, read_from_replica
+from app.models.exercise_config import ExerciseConfig
+from app.models.memory_exercise import MemoryExerciseSession, VerificationStatus
+from app.models.session_ingest_key import SessionIngestKey
 from app.schemas.memory_exercise import (
+    BatchItemStatus,
+    MemoryExerciseBatchItemResult,
+    MemoryExerciseBatchResult,
+    MemoryExerciseSessionBatchItem,
     MemoryExerciseSessionCreate,
     MemoryExerciseSessionUpdate,
     MemoryExerciseStats,
     MemoryExerciseLeaderboard,
+    MemoryExerciseLeaderboardRank,
+    MemoryExerciseMoveAppendResult,
+    MemoryExerciseMoveBatch,
+    MemoryExerciseMoves,
+    MemoryExerciseProgress,
+    MemoryExerciseRating,
+    MemoryExerciseRatingLadder,
+    MemoryExerciseScoreDistribution,
+    ProgressInterval,
 )
+from app.services import leaderboard_service, rating_service, scoring, session_archive, stats_service
+from app.services.config_service import ConfigService, config_hash
+from app.services.leaderboard_service import LeaderboardService
+from app.services.progress_buffer import PROGRESS_FIELDS, progress_buffer
+from app.services.progress_service import ProgressService
+from app.services.puzzle_service import PuzzleService
+from app.services.rating_service import RatingService
+from app.services.score_distribution import ScoreDistributionService, score_sketches
+from app.services.stats_service import StatsRollupService
+from app.services.telemetry_service import SessionCompletedError, TelemetryService
+from app.services.verification_service import session_verifier
 
 
 class MemoryExerciseService:
@@ -27,18 +60,22 @@ class MemoryExerciseService:
         user_id: int,
         data: MemoryExerciseSessionCreate
     ) -> MemoryExerciseSession:
-        """Create a new memory exercise session"""
+        """Create a new memory exercise session with a server-assigned puzzle seed"""
+        exercise_config = ConfigService.intern(db, data.config)
         session = MemoryExerciseSession(
             user_id=user_id,
             exercise_id=data.exercise_id,
             exercise_type=data.config.exercise_type.value,
             difficulty=data.config.difficulty.value,
-            config=data.config.model_dump(),
+            config_id=exercise_config.id,
+            exercise_config=exercise_config,
+            puzzle_seed=PuzzleService.assign_seed(data.config),
             is_completed=False,
         )
         db.add(session)
+        StatsRollupService.record_attempt(db, session)
         db.commit()
-        db.refresh(session)
+        cache.mark_stale(db, stats_service.cache_namespace(user_id))
         return session
 
     @staticmethod
@@ -46,9 +83,19 @@ class MemoryExerciseService:
         db: Session,
         session_id: int,
         user_id: int,
-        data: MemoryExerciseSessionUpdate
+        data: MemoryExerciseSessionUpdate,
+        buffered: Optional[MemoryExerciseSession] = None
     ) -> MemoryExerciseSession:
-        """Update a memory exercise session with performance data"""
+        """
+        Update a memory exercise session with performance data
+
+        A completion is ranked right away, or with VERIFICATION_ENABLED
+        marked pending until its move log has been replayed. Fields data
+        leaves unset are taken from `buffered`, a progress buffer snapshot,
+        unless the row was written after it. Raises ValueError if the
+        session does not exist and SessionCompletedError once it is
+        completed.
+        """
         session = db.query(MemoryExerciseSession).filter(
             MemoryExerciseSession.id == session_id,
             MemoryExerciseSession.user_id == user_id
@@ -56,6 +103,15 @@ class MemoryExerciseService:
 
         if not session:
             raise ValueError("Session not found")
+        if session.is_completed:
+            # Rollups, leaderboards, sketches and ratings were derived from it
+            raise SessionCompletedError("Session is already completed")
+        _load_inline_configs(db, [session])
+
+        if buffered is not None and (session.updated_at is None or buffered.updated_at >= session.updated_at):
+            data = data.model_copy(update={
+                name: getattr(buffered, name) for name in PROGRESS_FIELDS if getattr(data, name) is None
+            })
 
         # Update fields
         if data.total_moves is not None:
@@ -70,18 +126,169 @@ class MemoryExerciseService:
             session.max_sequence_reached = data.max_sequence_reached
 
         # If completed
-        if data.completed_at:
+        newly_completed = data.completed_at is not None
+        if newly_completed:
             session.is_completed = True
             session.completed_at = data.completed_at
 
             # Calculate score
-            session.final_score = session.calculate_score()
-            session.score_breakdown = session.generate_score_breakdown()
+            scoring.apply_scores([session])
+
+        leaderboard_changes = []
+        ranked = newly_completed and not settings.VERIFICATION_ENABLED
+        if newly_completed:
+            StatsRollupService.record_completion(db, session)
+            if settings.VERIFICATION_ENABLED:
+                session.verification_status = VerificationStatus.PENDING.value
+        if ranked:
+            db.flush()  # Leaderboard entries reference the session id
+            leaderboard_changes = LeaderboardService.record_completion(db, session)
+            RatingService.record_completion(db, session)
 
         db.commit()
-        db.refresh(session)
+        LeaderboardService.publish(leaderboard_changes)
+        if ranked:
+            score_sketches.record(session.exercise_type, session.difficulty, session.final_score)
+            cache.mark_stale(db, rating_service.cache_namespace(session.exercise_type))
+        if newly_completed:
+            cache.mark_stale(
+                db,
+                stats_service.cache_namespace(user_id),
+                *(leaderboard_service.cache_namespace(key) for key, _ in leaderboard_changes),
+            )
         return session
 
+    @staticmethod
+    def ingest_sessions(
+        db: Session,
+        items: List[Dict[str, Any]]
+    ) -> MemoryExerciseBatchResult:
+        """
+        Record a batch of finished sessions in one transaction
+
+        Items are validated individually; sessions started before the
+        retention window (see session_archive.retention_cutoff) are
+        invalid, as they would never be archived. Each valid item claims its
+        (user_id, idempotency_key) first, so a retried or concurrent batch
+        reports the existing session instead of inserting it twice. Claimed
+        items are scored and written with a single multi-row
+        INSERT ... RETURNING. With VERIFICATION_ENABLED they are counted in
+        the user's stats but marked unverifiable and never ranked: an
+        offline session has no server-assigned puzzle seed nor move log to
+        replay.
+        """
+        results: List[Optional[MemoryExerciseBatchItemResult]] = [None] * len(items)
+        valid: Dict[Tuple[int, str], Tuple[int, MemoryExerciseSessionBatchItem]] = {}
+        repeats: List[Tuple[int, Tuple[int, str]]] = []
+        retention_start = session_archive.retention_cutoff()
+
+        for index, raw in enumerate(items):
+            try:
+                item = MemoryExerciseSessionBatchItem.model_validate(raw)
+            except ValidationError as e:
+                results[index] = MemoryExerciseBatchItemResult(
+                    index=index,
+                    idempotency_key=raw.get("idempotency_key") if isinstance(raw.get("idempotency_key"), str) else None,
+                    status=BatchItemStatus.INVALID,
+                    errors=[_format_error(error) for error in e.errors()],
+                )
+                continue
+
+            if retention_start is not None and (item.created_at or item.completed_at) < retention_start:
+                results[index] = MemoryExerciseBatchItemResult(
+                    index=index,
+                    idempotency_key=item.idempotency_key,
+                    status=BatchItemStatus.INVALID,
+                    errors=[f"created_at: must not be before {retention_start:%Y-%m-%d} (retention window)"],
+                )
+                continue
+
+            key = (item.user_id, item.idempotency_key)
+            if key in valid:
+                repeats.append((index, key))
+            else:
+                valid[key] = (index, item)
+
+        claimed = set()
+        if valid:
+            keys_table = SessionIngestKey.__table__
+            claimed = set(db.execute(
+                dialect_insert(db, keys_table)
+                .values([{"user_id": user_id, "idempotency_key": key} for user_id, key in valid])
+                .on_conflict_do_nothing()
+                .returning(keys_table.c.user_id, keys_table.c.idempotency_key)
+            ).tuples().all())
+
+        # Keys claimed by an earlier request
+        session_ids: Dict[Tuple[int, str], Optional[int]] = {}
+        existing = [key for key in valid if key not in claimed]
+        if existing:
+            rows = db.execute(
+                select(SessionIngestKey.user_id, SessionIngestKey.idempotency_key, SessionIngestKey.session_id)
+                .where(tuple_(SessionIngestKey.user_id, SessionIngestKey.idempotency_key).in_(existing))
+            ).tuples().all()
+            session_ids.update({(user_id, key): session_id for user_id, key, session_id in rows})
+
+        new_keys = [key for key in valid if key in claimed]
+        config_ids = ConfigService.intern_many(db, [valid[key][1].config.model_dump(mode="json") for key in new_keys])
+        sessions = [_completed_session(valid[key][1], config_ids) for key in new_keys]
+        scoring.apply_scores(sessions)
+        ranked = not settings.VERIFICATION_ENABLED
+        leaderboard_changes = []
+        if sessions:
+            new_ids = db.scalars(
+                insert(MemoryExerciseSession).returning(MemoryExerciseSession.id, sort_by_parameter_order=True),
+                [_column_values(session) for session in sessions],
+            ).all()
+            db.execute(update(SessionIngestKey), [
+                {"user_id": user_id, "idempotency_key": key, "session_id": session_id}
+                for (user_id, key), session_id in zip(new_keys, new_ids)
+            ])
+
+            for key, session, session_id in zip(new_keys, sessions, new_ids):
+                session.id = session_id
+                session_ids[key] = session_id
+                StatsRollupService.record_attempt(db, session)
+                StatsRollupService.record_completion(db, session)
+                if ranked:
+                    leaderboard_changes.extend(LeaderboardService.record_completion(db, session))
+                    RatingService.record_completion(db, session)
+
+        db.commit()
+        LeaderboardService.publish(leaderboard_changes)
+        if ranked:
+            for session in sessions:
+                score_sketches.record(session.exercise_type, session.difficulty, session.final_score)
+        rated_types = {session.exercise_type for session in sessions} if ranked else set()
+        cache.mark_stale(
+            db,
+            *(stats_service.cache_namespace(session.user_id) for session in sessions),
+            *(leaderboard_service.cache_namespace(key) for key, _ in leaderboard_changes),
+            *(rating_service.cache_namespace(exercise_type) for exercise_type in rated_types),
+        )
+
+        for key, (index, item) in valid.items():
+            results[index] = MemoryExerciseBatchItemResult(
+                index=index,
+                idempotency_key=item.idempotency_key,
+                status=BatchItemStatus.CREATED if key in claimed else BatchItemStatus.DUPLICATE,
+                session_id=session_ids.get(key),
+            )
+        for index, key in repeats:
+            results[index] = MemoryExerciseBatchItemResult(
+                index=index,
+                idempotency_key=key[1],
+                status=BatchItemStatus.DUPLICATE,
+                session_id=session_ids.get(key),
+            )
+
+        return MemoryExerciseBatchResult(
+            created=sum(1 for r in results if r.status == BatchItemStatus.CREATED),
+            duplicates=sum(1 for r in results if r.status == BatchItemStatus.DUPLICATE),
+            invalid=sum(1 for r in results if r.status == BatchItemStatus.INVALID),
+            results=results,
+        )
+
     @staticmethod
     def get_session(
         db: Session,
@@ -89,10 +296,13 @@ class MemoryExerciseService:
         user_id: int
     ) -> Optional[MemoryExerciseSession]:
         """Get a session by ID"""
-        return db.query(MemoryExerciseSession).filter(
+        session = db.query(MemoryExerciseSession).filter(
             MemoryExerciseSession.id == session_id,
             MemoryExerciseSession.user_id == user_id
         ).first()
+        if session is not None:
+            _load_inline_configs(db, [session])
+        return session
 
     @staticmethod
     def get_user_sessions(
@@ -100,9 +310,15 @@ class MemoryExerciseService:
         user_id: int,
         exercise_type: Optional[str] = None,
         limit: int = 10,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None
     ) -> List[MemoryExerciseSession]:
-        """Get user's session history"""
+        """
+        Get user's session history, newest first
+
+        Pass the cursor of the last session of a page (see encode_cursor) to
+        seek straight to the next page; offset is ignored in that case.
+        """
         query = db.query(MemoryExerciseSession).filter(
             MemoryExerciseSession.user_id == user_id
         )
@@ -110,7 +326,39 @@ class MemoryExerciseService:
         if exercise_type:
             query = query.filter(MemoryExerciseSession.exercise_type == exercise_type)
 
-        return query.order_by(desc(MemoryExerciseSession.created_at)).limit(limit).offset(offset).all()
+        if cursor:
+            created_at, session_id = decode_cursor(cursor)
+            query = query.filter(
+                tuple_(MemoryExerciseSession.created_at, MemoryExerciseSession.id) < tuple_(created_at, session_id)
+            )
+            offset = 0
+
+        sessions = query.order_by(
+            desc(MemoryExerciseSession.created_at),
+            desc(MemoryExerciseSession.id),
+        ).limit(limit).offset(offset).all()
+        _load_inline_configs(db, sessions)
+        scoring.derive_breakdowns(sessions)
+        return sessions
+
+    @staticmethod
+    def append_moves(
+        db: Session,
+        session_id: int,
+        user_id: int,
+        batch: MemoryExerciseMoveBatch
+    ) -> MemoryExerciseMoveAppendResult:
+        """Record move events and update the session aggregates from them"""
+        return TelemetryService.append_moves(db, session_id, user_id, batch)
+
+    @staticmethod
+    def get_moves(
+        db: Session,
+        session_id: int,
+        user_id: int
+    ) -> Optional[MemoryExerciseMoves]:
+        """Get the recorded move events of a session"""
+        return TelemetryService.get_moves(db, session_id, user_id)
 
     @staticmethod
     def get_leaderboard(
@@ -118,36 +366,23 @@ class MemoryExerciseService:
         exercise_id: Optional[int] = None,
         exercise_type: Optional[str] = None,
         difficulty: Optional[str] = None,
-        limit: int = 10
+        limit: int = 10,
+        user_id: Optional[int] = None
     ) -> List[MemoryExerciseLeaderboard]:
-        """Get leaderboard for an exercise"""
-        query = db.query(MemoryExerciseSession).filter(
-            MemoryExerciseSession.is_completed == True,
-            MemoryExerciseSession.final_score.isnot(None)
-        )
+        """Get leaderboard for an exercise (best session per user)"""
+        return LeaderboardService.get_leaderboard(db, exercise_id, exercise_type, difficulty, limit, user_id)
 
-        if exercise_id:
-            query = query.filter(MemoryExerciseSession.exercise_id == exercise_id)
-        if exercise_type:
-            query = query.filter(MemoryExerciseSession.exercise_type == exercise_type)
-        if difficulty:
-            query = query.filter(MemoryExerciseSession.difficulty == difficulty)
-
-        sessions = query.order_by(desc(MemoryExerciseSession.final_score)).limit(limit).all()
-
-        return [
-            MemoryExerciseLeaderboard(
-                rank=idx + 1,
-                user_id=session.user_id,
-                final_score=session.final_score,
-                accuracy=session.get_accuracy(),
-                time_elapsed_ms=session.time_elapsed_ms,
-                difficulty=session.difficulty,
-                completed_at=session.completed_at,
-                is_current_user=False  # Set by caller if needed
-            )
-            for idx, session in enumerate(sessions)
-        ]
+    @staticmethod
+    def get_user_rank(
+        db: Session,
+        user_id: int,
+        exercise_id: Optional[int] = None,
+        exercise_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        neighbours: int = 2
+    ) -> Optional[MemoryExerciseLeaderboardRank]:
+        """Get a user's leaderboard rank and neighbouring entries"""
+        return LeaderboardService.get_user_rank(db, user_id, exercise_id, exercise_type, difficulty, neighbours)
 
     @staticmethod
     def get_user_stats(
@@ -155,39 +390,357 @@ class MemoryExerciseService:
         user_id: int
     ) -> List[MemoryExerciseStats]:
         """Get user statistics for all exercise types"""
-        from app.models.memory_exercise import MemoryExerciseType
+        return StatsRollupService.get_user_stats(db, user_id)
 
-        stats_list = []
+    @staticmethod
+    def get_user_progress(
+        db: Session,
+        user_id: int,
+        exercise_type: str,
+        interval: ProgressInterval = ProgressInterval.DAY,
+        difficulty: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        points: Optional[int] = None
+    ) -> MemoryExerciseProgress:
+        """Get a user's score and accuracy per day, week or month"""
+        return ProgressService.get_progress(db, user_id, exercise_type, interval, difficulty, start, end, points)
 
-        for exercise_type in MemoryExerciseType:
-            sessions = db.query(MemoryExerciseSession).filter(
-                MemoryExerciseSession.user_id == user_id,
-                MemoryExerciseSession.exercise_type == exercise_type.value
-            ).all()
+    @staticmethod
+    def get_user_ratings(
+        db: Session,
+        user_id: int
+    ) -> List[MemoryExerciseRating]:
+        """Get a user's skill ratings for all exercise types played"""
+        return RatingService.get_user_ratings(db, user_id)
 
-            completed_sessions = [s for s in sessions if s.is_completed]
+    @staticmethod
+    def get_rating_ladder(
+        db: Session,
+        exercise_type: str,
+        limit: int = 10,
+        offset: int = 0,
+        user_id: Optional[int] = None
+    ) -> List[MemoryExerciseRatingLadder]:
+        """Get the skill ratings of an exercise type, highest first"""
+        return RatingService.get_ladder(db, exercise_type, limit, offset, user_id)
 
-            if not sessions:
-                continue
+    @staticmethod
+    def get_score_distribution(
+        db: Session,
+        exercise_type: str,
+        difficulty: str,
+        user_id: Optional[int] = None,
+        score: Optional[float] = None,
+        bins: int = 20
+    ) -> MemoryExerciseScoreDistribution:
+        """Get the score quantiles and histogram of an exercise type and difficulty"""
+        return ScoreDistributionService.get_distribution(db, exercise_type, difficulty, user_id, score, bins)
 
-            recent_sessions = sorted(completed_sessions, key=lambda x: x.created_at, reverse=True)[:10]
-
-            stats = MemoryExerciseStats(
-                exercise_type=exercise_type,
-                total_attempts=len(sessions),
-                completed_attempts=len(completed_sessions),
-                best_score=max([s.final_score for s in completed_sessions if s.final_score], default=None),
-                best_accuracy=max([s.get_accuracy() for s in completed_sessions], default=None),
-                fastest_time_ms=min([s.time_elapsed_ms for s in completed_sessions if s.time_elapsed_ms > 0], default=None),
-                longest_sequence=max([s.max_sequence_reached for s in completed_sessions if s.max_sequence_reached], default=None),
-                avg_score=sum([s.final_score for s in completed_sessions if s.final_score]) / len(completed_sessions) if completed_sessions else None,
-                avg_accuracy=sum([s.get_accuracy() for s in completed_sessions]) / len(completed_sessions) if completed_sessions else None,
-                avg_time_ms=sum([s.time_elapsed_ms for s in completed_sessions]) / len(completed_sessions) if completed_sessions else None,
-                improvement_rate=None,  # TODO: Calculate trend
-                recent_scores=[s.final_score for s in recent_sessions if s.final_score],
-                recent_accuracies=[s.get_accuracy() for s in recent_sessions],
-            )
 
-            stats_list.append(stats)
+class AsyncMemoryExerciseService:
+    """
+    Async facade over MemoryExerciseService for the API routes
+
+    Each method runs the sync implementation through AsyncSession.run_sync:
+    the ORM code executes in a greenlet while every database round trip is
+    awaited on the async driver, so the event loop is never blocked on I/O.
+    Write methods then invalidate the response cache entries they marked;
+    history, leaderboard, rating ladder and distribution reads go to the
+    read replica if one is configured. A user's own stats, progress and
+    ratings are read from the primary: they are cached right after the
+    write that invalidates them, and a lagging replica would have the
+    stale result cached under the new generation.
+    """
+
+    @staticmethod
+    async def create_session(
+        db: AsyncSession,
+        user_id: int,
+        data: MemoryExerciseSessionCreate
+    ) -> MemoryExerciseSession:
+        """Create a new memory exercise session"""
+        try:
+            return await db.run_sync(MemoryExerciseService.create_session, user_id, data)
+        finally:
+            await cache.invalidate_marked(db.info)
+
+    @staticmethod
+    async def update_session(
+        db: AsyncSession,
+        session_id: int,
+        user_id: int,
+        data: MemoryExerciseSessionUpdate
+    ) -> MemoryExerciseSession:
+        """
+        Update a memory exercise session with performance data
+
+        Progress updates (no completed_at) of an open session go to the
+        write-behind progress buffer; completions are written through, along
+        with any progress still buffered for the session, and queued for
+        verification if it is enabled. With several workers, a completion
+        this worker holds no snapshot for must carry its progress fields
+        (ProgressRequiredError, see progress_buffer).
+        """
+        if settings.PROGRESS_BUFFER_ENABLED and data.completed_at is None:
+            session = await _buffer_progress(db, session_id, user_id, data)
+            if session is not None:
+                return session
+
+        if data.completed_at is not None:
+            progress_buffer.check_completion(session_id, user_id, data.model_dump(include=set(PROGRESS_FIELDS)))
+        buffered = progress_buffer.take(session_id, user_id)
+        try:
+            session = await db.run_sync(MemoryExerciseService.update_session, session_id, user_id, data, buffered)
+        finally:
+            await cache.invalidate_marked(db.info)
+        if session.verification_status == VerificationStatus.PENDING.value:
+            session_verifier.submit(session.id)
+        return session
+
+    @staticmethod
+    async def ingest_sessions(
+        db: AsyncSession,
+        items: List[Dict[str, Any]]
+    ) -> MemoryExerciseBatchResult:
+        """Record a batch of finished sessions in one transaction"""
+        try:
+            return await db.run_sync(MemoryExerciseService.ingest_sessions, items)
+        finally:
+            await cache.invalidate_marked(db.info)
+
+    @staticmethod
+    async def get_session(
+        db: AsyncSession,
+        session_id: int,
+        user_id: int
+    ) -> Optional[MemoryExerciseSession]:
+        """Get a session by ID, including its buffered progress"""
+        buffered = progress_buffer.get(session_id, user_id)
+        if buffered is not None:
+            return buffered
+        return await db.run_sync(MemoryExerciseService.get_session, session_id, user_id)
+
+    @staticmethod
+    async def get_user_sessions(
+        db: AsyncSession,
+        user_id: int,
+        exercise_type: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> List[MemoryExerciseSession]:
+        """Get user's session history, newest first"""
+        return await read_from_replica(db, lambda: db.run_sync(
+            MemoryExerciseService.get_user_sessions, user_id, exercise_type, limit, offset, cursor
+        ))
+
+    @staticmethod
+    async def append_moves(
+        db: AsyncSession,
+        session_id: int,
+        user_id: int,
+        batch: MemoryExerciseMoveBatch
+    ) -> MemoryExerciseMoveAppendResult:
+        """Record move events and update the session aggregates from them"""
+        result = await db.run_sync(MemoryExerciseService.append_moves, session_id, user_id, batch)
+        # The row now has the aggregates; a buffered snapshot would revert them
+        progress_buffer.discard(session_id)
+        return result
+
+    @staticmethod
+    async def get_moves(
+        db: AsyncSession,
+        session_id: int,
+        user_id: int
+    ) -> Optional[MemoryExerciseMoves]:
+        """Get the recorded move events of a session"""
+        return await db.run_sync(MemoryExerciseService.get_moves, session_id, user_id)
+
+    @staticmethod
+    async def get_leaderboard(
+        db: AsyncSession,
+        exercise_id: Optional[int] = None,
+        exercise_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        limit: int = 10,
+        user_id: Optional[int] = None
+    ) -> List[MemoryExerciseLeaderboard]:
+        """Get leaderboard for an exercise (best session per user)"""
+        return await read_from_replica(db, lambda: db.run_sync(
+            MemoryExerciseService.get_leaderboard, exercise_id, exercise_type, difficulty, limit, user_id
+        ))
+
+    @staticmethod
+    async def get_user_rank(
+        db: AsyncSession,
+        user_id: int,
+        exercise_id: Optional[int] = None,
+        exercise_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        neighbours: int = 2
+    ) -> Optional[MemoryExerciseLeaderboardRank]:
+        """Get a user's leaderboard rank and neighbouring entries"""
+        return await read_from_replica(db, lambda: db.run_sync(
+            MemoryExerciseService.get_user_rank, user_id, exercise_id, exercise_type, difficulty, neighbours
+        ))
+
+    @staticmethod
+    async def get_user_stats(
+        db: AsyncSession,
+        user_id: int
+    ) -> List[MemoryExerciseStats]:
+        """Get user statistics for all exercise types"""
+        return await db.run_sync(MemoryExerciseService.get_user_stats, user_id)
+
+    @staticmethod
+    async def get_user_progress(
+        db: AsyncSession,
+        user_id: int,
+        exercise_type: str,
+        interval: ProgressInterval = ProgressInterval.DAY,
+        difficulty: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        points: Optional[int] = None
+    ) -> MemoryExerciseProgress:
+        """Get a user's score and accuracy per day, week or month"""
+        return await db.run_sync(
+            MemoryExerciseService.get_user_progress, user_id, exercise_type, interval, difficulty, start, end, points
+        )
+
+    @staticmethod
+    async def get_user_ratings(
+        db: AsyncSession,
+        user_id: int
+    ) -> List[MemoryExerciseRating]:
+        """Get a user's skill ratings for all exercise types played"""
+        return await db.run_sync(MemoryExerciseService.get_user_ratings, user_id)
+
+    @staticmethod
+    async def get_rating_ladder(
+        db: AsyncSession,
+        exercise_type: str,
+        limit: int = 10,
+        offset: int = 0,
+        user_id: Optional[int] = None
+    ) -> List[MemoryExerciseRatingLadder]:
+        """Get the skill ratings of an exercise type, highest first"""
+        return await read_from_replica(db, lambda: db.run_sync(
+            MemoryExerciseService.get_rating_ladder, exercise_type, limit, offset, user_id
+        ))
+
+    @staticmethod
+    async def get_score_distribution(
+        db: AsyncSession,
+        exercise_type: str,
+        difficulty: str,
+        user_id: Optional[int] = None,
+        score: Optional[float] = None,
+        bins: int = 20
+    ) -> MemoryExerciseScoreDistribution:
+        """Get the score quantiles and histogram of an exercise type and difficulty"""
+        return await read_from_replica(db, lambda: db.run_sync(
+            MemoryExerciseService.get_score_distribution, exercise_type, difficulty, user_id, score, bins
+        ))
+
+
+async def _buffer_progress(
+    db: AsyncSession,
+    session_id: int,
+    user_id: int,
+    data: MemoryExerciseSessionUpdate
+) -> Optional[MemoryExerciseSession]:
+    """
+    Apply a progress update to the session's buffered snapshot
+
+    The session is loaded (and detached) only when it has no snapshot yet.
+    Returns None for completed sessions, which are updated directly.
+    Raises ValueError if the session does not exist.
+    """
+    session = progress_buffer.get(session_id, user_id)
+    if session is None:
+        session = await db.run_sync(MemoryExerciseService.get_session, session_id, user_id)
+        if session is None:
+            raise ValueError("Session not found")
+        if session.is_completed:
+            return None
+        db.expunge(session)
+
+    for name in PROGRESS_FIELDS:
+        value = getattr(data, name)
+        if value is not None:
+            setattr(session, name, value)
+    progress_buffer.put(session)
+    if progress_buffer.full:
+        await progress_buffer.flush()
+    return session
+
+
+def _completed_session(item: MemoryExerciseSessionBatchItem, config_ids: Dict[str, int]) -> MemoryExerciseSession:
+    """Transient session for a batch item (scored by the caller); config_ids from ConfigService.intern_many"""
+    config = item.config.model_dump(mode="json")
+    config_id = config_ids[config_hash(config)]
+    return MemoryExerciseSession(
+        user_id=item.user_id,
+        exercise_id=item.exercise_id,
+        exercise_type=item.config.exercise_type.value,
+        difficulty=item.config.difficulty.value,
+        config_id=config_id,
+        exercise_config=ExerciseConfig(id=config_id, config=config),
+        puzzle_seed=None,
+        is_completed=True,
+        completed_at=item.completed_at,
+        total_moves=item.total_moves,
+        correct_moves=item.correct_moves,
+        incorrect_moves=item.incorrect_moves,
+        time_elapsed_ms=item.time_elapsed_ms,
+        max_sequence_reached=item.max_sequence_reached,
+        created_at=item.created_at or item.completed_at,
+        updated_at=datetime.utcnow(),
+        verification_status=VerificationStatus.UNVERIFIABLE.value if settings.VERIFICATION_ENABLED else None,
+    )
+
+
+def _column_values(session: MemoryExerciseSession) -> Dict[str, Any]:
+    """INSERT parameters for a transient session"""
+    mapper = inspect(MemoryExerciseSession)
+    return {
+        key: getattr(session, key)
+        for key in (mapper.get_property_by_column(column).key for column in MemoryExerciseSession.__table__.columns)
+        if key != "id"
+    }
+
+
+def _load_inline_configs(db: Session, sessions: List[MemoryExerciseSession]) -> None:
+    """
+    Load the inline config of sessions not compacted yet (null config_id)
+
+    Done while the database session is at hand: the async service and
+    detached progress snapshots cannot load it on access.
+    """
+    for session in sessions:
+        if session.config_id is None:
+            db.refresh(session, ["inline_config"])
+
+
+def _format_error(error: Dict[str, Any]) -> str:
+    """One-line message for a pydantic error"""
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+def encode_cursor(session: MemoryExerciseSession) -> str:
+    """Opaque history cursor pointing just after the given session"""
+    raw = f"{session.created_at.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
 
-        return stats_list
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, session_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(session_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
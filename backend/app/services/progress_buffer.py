@@ -0,0 +1,236 @@
+"""
+Progress Buffer - Write-behind buffer for in-progress session updates
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Clients save partial progress with PUT /sessions/{id} many times per game.
+Instead of one read-modify-commit per call, progress updates are applied to
+an in-memory snapshot of the session and written back in batches, one
+executemany UPDATE per flush interval for all sessions touched since the
+last flush. Completion updates are never buffered: they are written
+through synchronously and carry any buffered progress with them.
+
+Durability:
+  - A crash loses at most the progress buffered since the last flush
+    (PROGRESS_FLUSH_INTERVAL_SECONDS); completed sessions are never lost.
+  - Shutdown flushes whatever is pending.
+  - Flushes write absolute values, so a failed batch is simply retried by
+    the next one. They only touch sessions that are not completed and were
+    not written more recently (updated_at), so a late flush never reverts a
+    completion or a newer update made by another worker.
+
+The buffer is per worker. With several workers (SERVER_WORKERS > 1) a
+completing PUT may land on a worker that does not hold the session's
+snapshot, and the other worker's flush is then dropped as the session is
+completed; completions there must carry the progress fields
+(COMPLETION_FIELDS) unless this worker holds the snapshot, otherwise they
+are refused with ProgressRequiredError.
+
+Buffered progress is visible to GET /sessions/{id} on the same worker;
+history listings see it after the next flush. Recording moves
+(POST /sessions/{id}/moves) updates the row itself and discards the
+snapshot; a snapshot older than the row (moves recorded on another worker)
+is not carried into a completion.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import bindparam, false, or_
+
+from app.core.config import settings
+from app.core.database import async_engine
+from app.models.memory_exercise import MemoryExerciseSession
+
+logger = logging.getLogger(__name__)
+
+# Progress fields a buffered PUT may change
+PROGRESS_FIELDS = ("total_moves", "correct_moves", "incorrect_moves", "time_elapsed_ms", "max_sequence_reached")
+
+# Fields a completion must carry when another worker may hold its progress
+COMPLETION_FIELDS = ("total_moves", "correct_moves", "incorrect_moves", "time_elapsed_ms")
+
+_table = MemoryExerciseSession.__table__
+
+# created_at prunes the monthly partitions (migrations/007) to the session's one
+_FLUSH_STATEMENT = (
+    _table.update()
+    .where(
+        _table.c.id == bindparam("b_id"),
+        _table.c.created_at == bindparam("b_created_at"),
+        _table.c.is_completed == false(),
+        or_(_table.c.updated_at.is_(None), _table.c.updated_at <= bindparam("b_updated_at")),
+    )
+    .values(
+        updated_at=bindparam("b_updated_at"),
+        **{name: bindparam(f"b_{name}") for name in PROGRESS_FIELDS},
+    )
+)
+
+
+class ProgressRequiredError(Exception):
+    """A completion without its progress fields, which another worker may hold buffered"""
+
+
+class ProgressBuffer:
+    """Per-process buffer of detached session snapshots awaiting write-back"""
+
+    def __init__(self, flush_interval: float, max_sessions: int):
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self._pending: Dict[int, MemoryExerciseSession] = {}
+        # Batch being written; still served to readers until it has landed
+        self._in_flight: Dict[int, MemoryExerciseSession] = {}
+        self._flush_lock = asyncio.Lock()
+        self.updates_buffered = 0
+        self.rows_flushed = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+
+    def get(self, session_id: int, user_id: int) -> Optional[MemoryExerciseSession]:
+        """Buffered snapshot of a session, None if the session has no unwritten progress"""
+        session = self._pending.get(session_id) or self._in_flight.get(session_id)
+        if session is None or session.user_id != user_id:
+            return None
+        return session
+
+    def put(self, session: MemoryExerciseSession) -> None:
+        """Queue a (detached) snapshot whose progress fields were just updated"""
+        session.updated_at = datetime.utcnow()
+        self._pending[session.id] = session
+        self.updates_buffered += 1
+
+    def take(self, session_id: int, user_id: int) -> Optional[MemoryExerciseSession]:
+        """
+        Remove and return a session's snapshot (it is about to be written through)
+
+        An in-flight snapshot is dropped too, so a failed flush does not
+        requeue pre-completion progress that readers would then be served.
+        """
+        session = self.get(session_id, user_id)
+        if session is not None:
+            self._pending.pop(session_id, None)
+            self._in_flight.pop(session_id, None)
+        return session
+
+    def discard(self, session_id: int) -> None:
+        """Forget a session's snapshot (its row was just written by other means, e.g. /moves)"""
+        self._pending.pop(session_id, None)
+        self._in_flight.pop(session_id, None)
+
+    @property
+    def per_worker(self) -> bool:
+        """Whether other workers may hold snapshots this one cannot see"""
+        return settings.PROGRESS_BUFFER_ENABLED and settings.SERVER_WORKERS > 1
+
+    def check_completion(self, session_id: int, user_id: int, values: Dict[str, Optional[int]]) -> None:
+        """
+        Raise ProgressRequiredError for a completion that may lose buffered progress
+
+        That is with several workers, when this worker holds no snapshot of
+        the session and values lack one of COMPLETION_FIELDS.
+        """
+        if not self.per_worker or self.get(session_id, user_id) is not None:
+            return
+        missing = [name for name in COMPLETION_FIELDS if values.get(name) is None]
+        if missing:
+            raise ProgressRequiredError(
+                f"With several workers, a completion must include {', '.join(missing)}"
+            )
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self.max_sessions
+
+    async def flush(self) -> int:
+        """Write every pending snapshot in one batch; returns the number of sessions sent"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            self._in_flight, self._pending = self._pending, {}
+            # Parameters are captured now: snapshots may keep changing while awaiting
+            params = [
+                {
+                    "b_id": session_id,
+                    "b_created_at": session.created_at,
+                    "b_updated_at": session.updated_at,
+                    **{f"b_{name}": getattr(session, name) for name in PROGRESS_FIELDS},
+                }
+                for session_id, session in self._in_flight.items()
+            ]
+            started = time.perf_counter()
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(_FLUSH_STATEMENT, params)
+            except Exception:
+                self.flush_failures += 1
+                logger.exception("Progress flush of %d sessions failed, retrying with the next batch", len(params))
+                # Sessions taken or discarded meanwhile have left _in_flight
+                for session_id, session in self._in_flight.items():
+                    self._pending.setdefault(session_id, session)
+                return 0
+            finally:
+                self._in_flight = {}
+            self.flushes += 1
+            self.rows_flushed += len(params)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            return len(params)
+
+    async def run(self) -> None:
+        """Flush every flush_interval seconds until cancelled, then flush once more"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters; coalescing_ratio is buffered updates per row written"""
+        return {
+            "pending_sessions": len(self._pending),
+            "updates_buffered": self.updates_buffered,
+            "rows_flushed": self.rows_flushed,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "coalescing_ratio": round(self.updates_buffered / self.rows_flushed, 3) if self.rows_flushed else 0.0,
+        }
+
+
+progress_buffer = ProgressBuffer(settings.PROGRESS_FLUSH_INTERVAL_SECONDS, settings.PROGRESS_BUFFER_MAX_SESSIONS)
+
+
+class _ProgressBufferCollector(Collector):
+    """Buffer counters for GET /metrics"""
+
+    def __init__(self, buffer: ProgressBuffer):
+        self.buffer = buffer
+
+    def collect(self) -> Iterator:
+        stats = self.buffer.stats()
+        yield GaugeMetricFamily(
+            "progress_buffer_pending_sessions", "Sessions with unwritten progress", value=stats["pending_sessions"]
+        )
+        yield CounterMetricFamily(
+            "progress_buffer_updates_buffered", "Progress updates absorbed by the buffer", value=stats["updates_buffered"]
+        )
+        yield CounterMetricFamily(
+            "progress_buffer_rows_flushed", "Session rows written by flushes", value=stats["rows_flushed"]
+        )
+        yield CounterMetricFamily(
+            "progress_buffer_flush_failures", "Flushes that failed and were requeued", value=stats["flush_failures"]
+        )
+        yield GaugeMetricFamily(
+            "progress_buffer_coalescing_ratio", "Buffered updates per row written", value=stats["coalescing_ratio"]
+        )
+
+
+REGISTRY.register(_ProgressBufferCollector(progress_buffer))
@@ -0,0 +1,158 @@
+"""
+Progress Service - Per-user score and accuracy time series
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Completed sessions are grouped by the day, week (starting on Monday) or
+month of their start time in the database: date_trunc on PostgreSQL,
+date/strftime on SQLite. Filtering on user, exercise type and created_at
+is a range scan of the history index, so the cost depends on the user's
+own history only. Long series are reduced to a requested number of points
+with Largest-Triangle-Three-Buckets on the average score, which keeps the
+peaks and dips that a fixed stride would drop.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.timeutils import epoch_seconds
+from app.models.memory_exercise import MemoryExerciseSession
+from app.schemas.memory_exercise import MemoryExerciseProgress, MemoryExerciseProgressPoint, ProgressInterval
+from app.services.stats_service import accuracy_expr
+
+# strftime patterns giving the start of a bucket on SQLite (weeks: see _bucket_start)
+_SQLITE_FORMATS = {
+    ProgressInterval.DAY: "%Y-%m-%d",
+    ProgressInterval.MONTH: "%Y-%m-01",
+}
+
+
+class ProgressService:
+    """Service for per-user progress series"""
+
+    @staticmethod
+    def get_progress(
+        db: Session,
+        user_id: int,
+        exercise_type: str,
+        interval: ProgressInterval = ProgressInterval.DAY,
+        difficulty: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        points: Optional[int] = None
+    ) -> MemoryExerciseProgress:
+        """
+        Aggregates of a user's completed sessions per time bucket, oldest first
+
+        Args:
+            start, end: created_at range [start, end)
+            points: Downsample to at most this many buckets (at least 3)
+        """
+        bucket = _bucket_start(db, interval).label("bucket_start")
+        query = (
+            select(
+                bucket,
+                func.count().label("sessions"),
+                func.avg(MemoryExerciseSession.final_score).label("avg_score"),
+                func.max(MemoryExerciseSession.final_score).label("max_score"),
+                func.avg(accuracy_expr()).label("avg_accuracy"),
+            )
+            .where(
+                MemoryExerciseSession.user_id == user_id,
+                MemoryExerciseSession.exercise_type == exercise_type,
+                MemoryExerciseSession.is_completed == True,  # noqa: E712
+            )
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        if difficulty:
+            query = query.where(MemoryExerciseSession.difficulty == difficulty)
+        if start is not None:
+            query = query.where(MemoryExerciseSession.created_at >= start)
+        if end is not None:
+            query = query.where(MemoryExerciseSession.created_at < end)
+
+        series = [
+            MemoryExerciseProgressPoint(
+                bucket_start=_as_datetime(row.bucket_start),
+                sessions=row.sessions,
+                avg_score=float(row.avg_score) if row.avg_score is not None else None,
+                max_score=float(row.max_score) if row.max_score is not None else None,
+                avg_accuracy=float(row.avg_accuracy),
+            )
+            for row in db.execute(query)
+        ]
+        total_buckets = len(series)
+        if points is not None and total_buckets > points:
+            kept = lttb(
+                [epoch_seconds(point.bucket_start) for point in series],
+                [point.avg_score or 0.0 for point in series],
+                points,
+            )
+            series = [series[i] for i in kept]
+
+        return MemoryExerciseProgress(
+            user_id=user_id,
+            exercise_type=exercise_type,
+            difficulty=difficulty,
+            interval=interval,
+            total_buckets=total_buckets,
+            points=series,
+        )
+
+
+def lttb(x: Sequence[float], y: Sequence[float], threshold: int) -> List[int]:
+    """
+    Indices kept by Largest-Triangle-Three-Buckets downsampling
+
+    The first and last points are always kept; every other kept point is
+    the one of its bucket forming the largest triangle with the previous
+    kept point and the average of the next bucket. x must be increasing
+    and threshold at least 3; shorter series are returned whole.
+    """
+    n = len(x)
+    if n <= threshold:
+        return list(range(n))
+
+    xs = np.asarray(x, dtype=np.float64)
+    ys = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+
+    kept = [0]
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        stop = int((i + 1) * every) + 1
+        next_stop = min(int((i + 2) * every) + 1, n)
+        next_x = xs[stop:next_stop].mean()
+        next_y = ys[stop:next_stop].mean()
+
+        areas = np.abs(
+            (xs[previous] - next_x) * (ys[start:stop] - ys[previous])
+            - (xs[previous] - xs[start:stop]) * (next_y - ys[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept.append(previous)
+    kept.append(n - 1)
+    return kept
+
+
+def _bucket_start(db: Session, interval: ProgressInterval):
+    """SQL expression of the start of a session's bucket"""
+    created_at = MemoryExerciseSession.created_at
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        if interval == ProgressInterval.WEEK:
+            # Next Sunday (or the same day), then back to its Monday
+            return func.date(created_at, "weekday 0", "-6 days")
+        return func.strftime(_SQLITE_FORMATS[interval], created_at)
+    return func.date_trunc(interval.value, created_at)
+
+
+def _as_datetime(value) -> datetime:
+    """Bucket start as a datetime (SQLite returns dates as text)"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
@@ -0,0 +1,176 @@
+"""
+Puzzle Service - Deterministic, seed-addressed puzzles for exercise configs
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+A puzzle is what the player is shown: the shuffled card layout of Memory
+Cards and Image Pairs, the colored cells of Pattern Recall, the cell
+sequence of Sequence Memory. It depends only on the layout fields of the
+config (puzzle_key) and the seed, so storing the seed with a session is
+enough to reproduce the puzzle later.
+
+Generation uses random.Random seeded with a string (hashed with SHA-512),
+whose output does not depend on the Python version or platform. Changing
+the algorithm must bump GENERATOR_VERSION, which is part of that seed.
+
+Puzzles of the preset configs for seeds 0..PUZZLE_POOL_SIZE-1 are
+generated and serialized once at import (see pregenerate), so serving
+them is a dict lookup.
+"""
+
+import random
+import secrets
+from typing import Dict, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+from app.core import cache
+from app.schemas.memory_exercise import (
+    MAX_GRID_CELLS,
+    MAX_PUZZLE_SEED,
+    MemoryExerciseConfig,
+    MemoryExercisePuzzle,
+    MemoryExerciseType,
+)
+
+GENERATOR_VERSION = 1
+
+# Layout fallbacks for configs without grid or sequence settings
+DEFAULT_GRIDS = {
+    MemoryExerciseType.MEMORY_CARDS: (4, 4),
+    MemoryExerciseType.IMAGE_PAIRS: (4, 4),
+    MemoryExerciseType.PATTERN_RECALL: (3, 3),
+    MemoryExerciseType.SEQUENCE_MEMORY: (3, 3),
+}
+DEFAULT_COLORS = ["#3B82F6", "#EF4444", "#10B981", "#F59E0B"]
+DEFAULT_MAX_SEQUENCE_LENGTH = 20
+
+# Bounds of client-supplied configs
+MAX_CELLS = MAX_GRID_CELLS
+MAX_SEQUENCE_LENGTH = 1000
+
+# Share of Pattern Recall cells that are colored (as in the PatternRecall component)
+PATTERN_FILL = 0.4
+
+PuzzleKey = Tuple
+
+
+def puzzle_key(config: MemoryExerciseConfig) -> PuzzleKey:
+    """
+    Config fields the puzzle depends on (difficulty, timing and weights do not matter)
+
+    Raises ValueError for layouts outside MAX_CELLS and MAX_SEQUENCE_LENGTH.
+    """
+    rows, cols = _grid(config)
+    exercise_type = config.exercise_type
+    if exercise_type == MemoryExerciseType.PATTERN_RECALL:
+        return (exercise_type.value, rows, cols, tuple(config.colors or DEFAULT_COLORS))
+    if exercise_type == MemoryExerciseType.SEQUENCE_MEMORY:
+        length = config.max_sequence_length or DEFAULT_MAX_SEQUENCE_LENGTH
+        if not 0 < length <= MAX_SEQUENCE_LENGTH:
+            raise ValueError(f"max_sequence_length must be between 1 and {MAX_SEQUENCE_LENGTH}")
+        return (exercise_type.value, rows, cols, length)
+    return (exercise_type.value, rows, cols)
+
+
+def generate_puzzle(config: MemoryExerciseConfig, seed: int) -> MemoryExercisePuzzle:
+    """The puzzle of a config for a seed (the same for every call, process and platform)"""
+    key = puzzle_key(config)
+    rows, cols = key[1], key[2]
+    cells = rows * cols
+    rng = random.Random(f"{GENERATOR_VERSION}:{key}:{seed}")
+
+    puzzle = MemoryExercisePuzzle(
+        exercise_type=config.exercise_type,
+        seed=seed,
+        generator_version=GENERATOR_VERSION,
+        grid_rows=rows,
+        grid_cols=cols,
+    )
+    if config.exercise_type == MemoryExerciseType.PATTERN_RECALL:
+        colors = list(key[3])
+        pattern: List[Optional[int]] = [None] * cells
+        for cell in rng.sample(range(cells), int(cells * PATTERN_FILL)):
+            pattern[cell] = rng.randrange(len(colors))
+        puzzle.colors = colors
+        puzzle.pattern = pattern
+    elif config.exercise_type == MemoryExerciseType.SEQUENCE_MEMORY:
+        puzzle.sequence = [rng.randrange(cells) for _ in range(key[3])]
+    else:
+        layout = [cell // 2 for cell in range(cells - cells % 2)]
+        rng.shuffle(layout)
+        puzzle.pairs = layout
+    return puzzle
+
+
+class PuzzlePool:
+    """Serialized puzzles of one config for seeds 0..size-1"""
+
+    def __init__(self, config: MemoryExerciseConfig, size: int):
+        self.size = size
+        self.bodies = [to_json(generate_puzzle(config, seed)) for seed in range(size)]
+        self.etags = [cache.make_etag(body) for body in self.bodies]
+
+    def get(self, seed: int) -> Optional[Tuple[bytes, str]]:
+        """Body and ETag of a pooled seed, None outside the pool"""
+        if 0 <= seed < self.size:
+            return self.bodies[seed], self.etags[seed]
+        return None
+
+
+_pools: Dict[PuzzleKey, PuzzlePool] = {}
+
+
+class PuzzleService:
+    """Service serving puzzles from the pools or generating them"""
+
+    @staticmethod
+    def pregenerate(configs: List[MemoryExerciseConfig], size: int) -> int:
+        """Build the pools of the given configs; returns the number of puzzles generated"""
+        generated = 0
+        for config in configs:
+            key = puzzle_key(config)
+            if key not in _pools and size > 0:
+                _pools[key] = PuzzlePool(config, size)
+                generated += size
+        return generated
+
+    @staticmethod
+    def pool_size(config: MemoryExerciseConfig) -> int:
+        """Number of pregenerated seeds of a config (0 without a pool)"""
+        pool = _pools.get(puzzle_key(config))
+        return pool.size if pool is not None else 0
+
+    @staticmethod
+    def assign_seed(config: MemoryExerciseConfig) -> Optional[int]:
+        """
+        Seed of a new session's puzzle, None if the config's layout cannot be generated
+
+        Drawn by the server from the whole seed range (not the pools), so a
+        client can neither pick a seed nor have solved it in advance.
+        """
+        try:
+            puzzle_key(config)
+        except ValueError:
+            return None
+        return secrets.randbelow(MAX_PUZZLE_SEED + 1)
+
+    @staticmethod
+    def get_puzzle(config: MemoryExerciseConfig, seed: int) -> Tuple[bytes, str]:
+        """JSON body and ETag of a puzzle, from its pool when pregenerated"""
+        pool = _pools.get(puzzle_key(config))
+        if pool is not None:
+            pooled = pool.get(seed)
+            if pooled is not None:
+                return pooled
+        body = to_json(generate_puzzle(config, seed))
+        return body, cache.make_etag(body)
+
+
+def _grid(config: MemoryExerciseConfig) -> Tuple[int, int]:
+    """Grid size of a config, falling back to the type's default"""
+    default_rows, default_cols = DEFAULT_GRIDS[config.exercise_type]
+    rows, cols = config.grid_rows or default_rows, config.grid_cols or default_cols
+    if rows < 1 or cols < 1 or rows * cols > MAX_CELLS:
+        raise ValueError(f"Grid must have between 1 and {MAX_CELLS} cells")
+    return rows, cols
@@ -0,0 +1,240 @@
+"""
+Rating Service - Glicko skill ratings per user and exercise type
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Every ranked completion is one Glicko game against the exercise itself.
+The opponent is rated by difficulty (DIFFICULTY_RATINGS, with no
+uncertainty) and the outcome is the score relative to the best the
+difficulty allows, final_score / (MAX_SCORE * multiplier), between 0 and 1.
+Before each game the deviation grows with the days since the user's
+previous one (DEVIATION_GROWTH_PER_DAY, up to INITIAL_DEVIATION), so a
+returning player's rating moves quickly again.
+
+A completion reads and writes one skill_ratings row, whatever the size of
+the history. Batch-ingested sessions are rated in arrival order; rebuild
+replays the whole history in start order instead.
+"""
+
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.memory_exercise import DifficultyLevel, MemoryExerciseSession
+from app.models.skill_rating import SkillRating
+from app.schemas.memory_exercise import MemoryExerciseRating, MemoryExerciseRatingLadder
+from app.services.scoring import DIFFICULTY_MULTIPLIERS, MAX_SCORE
+
+INITIAL_RATING = 1500.0
+INITIAL_DEVIATION = 350.0
+MIN_DEVIATION = 30.0  # Keeps ratings responsive after many sessions
+DEVIATION_GROWTH_PER_DAY = 35.0  # About 100 idle days to go from 50 back to 350
+
+# Ratings of the exercise as an opponent
+DIFFICULTY_RATINGS = {
+    DifficultyLevel.EASY.value: 1200.0,
+    DifficultyLevel.MEDIUM.value: 1500.0,
+    DifficultyLevel.HARD.value: 1800.0,
+    DifficultyLevel.EXPERT.value: 2100.0,
+}
+
+_Q = math.log(10) / 400
+_SECONDS_PER_DAY = 86400.0
+
+# Rows written per INSERT when rebuilding
+REBUILD_CHUNK_SIZE = 10000
+
+
+def cache_namespace(exercise_type: str) -> str:
+    """Response cache namespace of an exercise type's ladder"""
+    return f"ratings:{exercise_type}"
+
+
+def current_deviation(deviation: float, idle_seconds: float) -> float:
+    """Deviation after idle_seconds without a rated session"""
+    days = max(0.0, idle_seconds) / _SECONDS_PER_DAY
+    return min(INITIAL_DEVIATION, math.sqrt(deviation * deviation + DEVIATION_GROWTH_PER_DAY ** 2 * days))
+
+
+def session_outcome(final_score: float, difficulty: str) -> float:
+    """Game outcome of a session, from 0 (nothing achieved) to 1 (best possible score)"""
+    best = MAX_SCORE * DIFFICULTY_MULTIPLIERS.get(difficulty, 1.0)
+    return min(1.0, max(0.0, final_score / best))
+
+
+def rate(rating: float, deviation: float, difficulty: str, final_score: float) -> Tuple[float, float]:
+    """
+    Glicko update for one session: (rating, deviation) after it
+
+    `deviation` is the pre-game deviation (widened by current_deviation).
+    """
+    opponent = DIFFICULTY_RATINGS.get(difficulty, INITIAL_RATING)
+    expected = 1 / (1 + 10 ** ((opponent - rating) / 400))
+    d_squared_inverse = _Q * _Q * expected * (1 - expected)
+    precision = 1 / (deviation * deviation) + d_squared_inverse
+    new_rating = rating + _Q / precision * (session_outcome(final_score, difficulty) - expected)
+    return new_rating, max(MIN_DEVIATION, math.sqrt(1 / precision))
+
+
+class RatingService:
+    """Service maintaining and reading the skill_ratings table"""
+
+    @staticmethod
+    def record_completion(db: Session, session: MemoryExerciseSession) -> None:
+        """
+        Rate a ranked completion (caller commits)
+
+        The rating row is locked for the rest of the caller's transaction,
+        so concurrent completions of one user serialize.
+        """
+        if session.final_score is None:
+            return
+        completed_at = session.completed_at or session.created_at
+        db.execute(
+            dialect_insert(db, SkillRating.__table__)
+            .values(
+                user_id=session.user_id,
+                exercise_type=session.exercise_type,
+                rating=INITIAL_RATING,
+                deviation=INITIAL_DEVIATION,
+                sessions=0,
+                last_completed_at=completed_at,
+            )
+            .on_conflict_do_nothing()
+        )
+        row = db.get(
+            SkillRating,
+            (session.user_id, session.exercise_type),
+            with_for_update=True,
+            populate_existing=True,
+        )
+        deviation = current_deviation(row.deviation, (completed_at - row.last_completed_at).total_seconds())
+        row.rating, row.deviation = rate(row.rating, deviation, session.difficulty, session.final_score)
+        row.sessions += 1
+        row.last_completed_at = max(row.last_completed_at, completed_at)
+        db.flush()
+
+    @staticmethod
+    def get_user_ratings(db: Session, user_id: int) -> List[MemoryExerciseRating]:
+        """A user's ratings on every exercise type played"""
+        now = datetime.utcnow()
+        rows = db.scalars(
+            select(SkillRating).where(SkillRating.user_id == user_id).order_by(SkillRating.exercise_type)
+        ).all()
+        return [
+            MemoryExerciseRating(
+                user_id=row.user_id,
+                exercise_type=row.exercise_type,
+                rating=row.rating,
+                deviation=current_deviation(row.deviation, (now - row.last_completed_at).total_seconds()),
+                sessions=row.sessions,
+                last_completed_at=row.last_completed_at,
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def get_ladder(
+        db: Session,
+        exercise_type: str,
+        limit: int = 10,
+        offset: int = 0,
+        user_id: Optional[int] = None
+    ) -> List[MemoryExerciseRatingLadder]:
+        """Ratings of an exercise type, highest first (an index range scan of idx_skill_ratings_ladder)"""
+        now = datetime.utcnow()
+        rows = db.scalars(
+            select(SkillRating)
+            .where(SkillRating.exercise_type == exercise_type)
+            .order_by(SkillRating.rating.desc(), SkillRating.user_id)
+            .limit(limit)
+            .offset(offset)
+        ).all()
+        return [
+            MemoryExerciseRatingLadder(
+                rank=offset + index + 1,
+                user_id=row.user_id,
+                rating=row.rating,
+                deviation=current_deviation(row.deviation, (now - row.last_completed_at).total_seconds()),
+                sessions=row.sessions,
+                last_completed_at=row.last_completed_at,
+                is_current_user=row.user_id == user_id,
+            )
+            for index, row in enumerate(rows)
+        ]
+
+    @staticmethod
+    def rebuild(db: Session, chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+        """
+        Recompute every rating by replaying ranked sessions
+
+        One query streams the sessions ordered by user, exercise type and
+        start time (the history index order), so only the rating being
+        folded is held in memory; finished ratings are inserted chunk_size
+        at a time. Commits and returns the number of ratings.
+        """
+        db.execute(delete(SkillRating))
+
+        result = db.execute(
+            select(
+                MemoryExerciseSession.user_id,
+                MemoryExerciseSession.exercise_type,
+                MemoryExerciseSession.difficulty,
+                MemoryExerciseSession.final_score,
+                MemoryExerciseSession.completed_at,
+                MemoryExerciseSession.created_at,
+            )
+            .where(
+                MemoryExerciseSession.is_completed == True,  # noqa: E712
+                MemoryExerciseSession.final_score.isnot(None),
+                MemoryExerciseSession.ranked(),
+            )
+            .order_by(
+                MemoryExerciseSession.user_id,
+                MemoryExerciseSession.exercise_type,
+                MemoryExerciseSession.created_at,
+                MemoryExerciseSession.id,
+            )
+            .execution_options(yield_per=chunk_size)
+        )
+
+        written = 0
+        batch: List[Dict[str, Any]] = []
+        current: Optional[Dict[str, Any]] = None
+        for rows in result.partitions():
+            for user_id, exercise_type, difficulty, final_score, completed_at, created_at in rows:
+                completed_at = completed_at or created_at
+                if current is None or (current["user_id"], current["exercise_type"]) != (user_id, exercise_type):
+                    if current is not None:
+                        batch.append(current)
+                    current = {
+                        "user_id": user_id,
+                        "exercise_type": exercise_type,
+                        "rating": INITIAL_RATING,
+                        "deviation": INITIAL_DEVIATION,
+                        "sessions": 0,
+                        "last_completed_at": completed_at,
+                    }
+                deviation = current_deviation(
+                    current["deviation"], (completed_at - current["last_completed_at"]).total_seconds()
+                )
+                current["rating"], current["deviation"] = rate(current["rating"], deviation, difficulty, final_score)
+                current["sessions"] += 1
+                current["last_completed_at"] = max(current["last_completed_at"], completed_at)
+
+            if len(batch) >= chunk_size:
+                db.execute(insert(SkillRating), batch)
+                written += len(batch)
+                batch = []
+
+        if current is not None:
+            batch.append(current)
+        if batch:
+            db.execute(insert(SkillRating), batch)
+            written += len(batch)
+        db.commit()
+        return written
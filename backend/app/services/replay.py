@@ -0,0 +1,175 @@
+"""
+Session Replay - Check a completed session's claims against its move log and puzzle
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Runs in the verification worker processes (see verification_service): the
+inputs and the result are plain picklable values and nothing here touches
+the database.
+
+What one logged move is, per exercise type:
+  - Memory Cards, Image Pairs: one flipped card. Consecutive flips form an
+    attempt, correct (both flips) when the two cards show the same image
+    and were not matched before.
+  - Pattern Recall: one selected cell, correct when it is colored.
+  - Sequence Memory: one tapped cell, correct when it is the next cell of
+    the current level (the first `level` cells of the puzzle sequence). A
+    completed level adds one cell, a wrong tap restarts the level.
+
+Flags of the checks a session can fail:
+  no_move_log        nothing was logged, so nothing can be replayed
+  no_puzzle          no puzzle_seed, or a config the generator rejects
+  move_counts        claimed total/correct/incorrect moves differ from the log
+  time_elapsed       shorter than the last logged move, or past the time limit
+  too_fast           too large a share of moves faster than humanly possible
+  cell_out_of_grid   a move outside the puzzle
+  correct_mismatch   a move's correct flag differs from the replay
+  sequence_length    max_sequence_reached beyond the level the replay reached
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.memory_exercise import MemoryExerciseConfig, MemoryExercisePuzzle, MemoryExerciseType
+from app.services.puzzle_service import generate_puzzle
+
+FLAG_NO_MOVE_LOG = "no_move_log"
+FLAG_NO_PUZZLE = "no_puzzle"
+FLAG_MOVE_COUNTS = "move_counts"
+FLAG_TIME_ELAPSED = "time_elapsed"
+FLAG_TOO_FAST = "too_fast"
+FLAG_CELL_OUT_OF_GRID = "cell_out_of_grid"
+FLAG_CORRECT_MISMATCH = "correct_mismatch"
+FLAG_SEQUENCE_LENGTH = "sequence_length"
+
+# Clients stop the clock at the limit; allow for timer and network jitter
+TIME_LIMIT_GRACE_MS = 2000
+
+# As in the SequenceMemory component
+DEFAULT_INITIAL_SEQUENCE_LENGTH = 3
+
+
+def replay_session(
+    config: Dict[str, Any],
+    puzzle_seed: Optional[int],
+    claimed: Dict[str, Optional[int]],
+    offset_ms: np.ndarray,
+    cell: np.ndarray,
+    correct: np.ndarray,
+    min_move_ms: int,
+    max_fast_share: float
+) -> List[str]:
+    """
+    Flags of the checks a completed session fails, empty if it is consistent
+
+    Args:
+        config: Stored MemoryExerciseConfig of the session
+        claimed: Session's total_moves, correct_moves, incorrect_moves,
+            time_elapsed_ms and max_sequence_reached
+        offset_ms, cell, correct: Move log (see TelemetryService.load_moves)
+        min_move_ms: Gaps below this count as too fast
+        max_fast_share: Share of too-fast gaps that flags the session
+    """
+    total = len(offset_ms)
+    if total == 0:
+        return [FLAG_NO_MOVE_LOG]
+
+    flags = []
+    correct_count = int(correct.sum())
+    if (
+        (claimed["total_moves"] or 0) != total
+        or (claimed["correct_moves"] or 0) != correct_count
+        or (claimed["incorrect_moves"] or 0) != total - correct_count
+    ):
+        flags.append(FLAG_MOVE_COUNTS)
+
+    elapsed = claimed["time_elapsed_ms"] or 0
+    time_limit = config.get("time_limit_ms")
+    if elapsed < int(offset_ms[-1]) or (time_limit and elapsed > time_limit + TIME_LIMIT_GRACE_MS):
+        flags.append(FLAG_TIME_ELAPSED)
+    if total > 1 and float(np.mean(np.diff(offset_ms) < min_move_ms)) > max_fast_share:
+        flags.append(FLAG_TOO_FAST)
+
+    puzzle = _puzzle(config, puzzle_seed)
+    if puzzle is None:
+        flags.append(FLAG_NO_PUZZLE)
+        return flags
+
+    if int(cell.min()) < 0 or int(cell.max()) >= _playable_cells(puzzle):
+        flags.append(FLAG_CELL_OUT_OF_GRID)
+        return flags
+
+    expected, level = _REPLAYS[puzzle.exercise_type](puzzle, config, cell)
+    if not np.array_equal(expected, correct):
+        flags.append(FLAG_CORRECT_MISMATCH)
+    if level is not None and (claimed["max_sequence_reached"] or 0) > level:
+        flags.append(FLAG_SEQUENCE_LENGTH)
+    return flags
+
+
+def _puzzle(config: Dict[str, Any], puzzle_seed: Optional[int]) -> Optional[MemoryExercisePuzzle]:
+    """Puzzle the session was served, None if it cannot be reproduced"""
+    if puzzle_seed is None:
+        return None
+    try:
+        return generate_puzzle(MemoryExerciseConfig.model_validate(config), puzzle_seed)
+    except ValueError:  # Also pydantic's ValidationError
+        return None
+
+
+def _playable_cells(puzzle: MemoryExercisePuzzle) -> int:
+    """Cells a move may target (odd card grids leave the last cell empty)"""
+    if puzzle.pairs is not None:
+        return len(puzzle.pairs)
+    return puzzle.grid_rows * puzzle.grid_cols
+
+
+def _replay_pairs(puzzle: MemoryExercisePuzzle, config: Dict[str, Any], cell: np.ndarray) -> Tuple[np.ndarray, None]:
+    """Expected correct flags of card flips"""
+    layout = puzzle.pairs
+    flips = cell.tolist()
+    expected = np.zeros(len(flips), dtype=bool)
+    matched = set()
+    # A trailing unpaired flip (the game ended mid-attempt) is never correct
+    for i in range(0, len(flips) - 1, 2):
+        first, second = flips[i], flips[i + 1]
+        if first != second and layout[first] == layout[second] and first not in matched and second not in matched:
+            expected[i] = expected[i + 1] = True
+            matched.update((first, second))
+    return expected, None
+
+
+def _replay_pattern(puzzle: MemoryExercisePuzzle, config: Dict[str, Any], cell: np.ndarray) -> Tuple[np.ndarray, None]:
+    """Expected correct flags of cell selections"""
+    colored = np.array([color is not None for color in puzzle.pattern], dtype=bool)
+    return colored[cell], None
+
+
+def _replay_sequence(puzzle: MemoryExercisePuzzle, config: Dict[str, Any], cell: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Expected correct flags of taps, and the level reached"""
+    sequence = puzzle.sequence
+    level = min(config.get("initial_sequence_length") or DEFAULT_INITIAL_SEQUENCE_LENGTH, len(sequence))
+    taps = cell.tolist()
+    expected = np.zeros(len(taps), dtype=bool)
+    position = 0
+    for i, tapped in enumerate(taps):
+        if level > len(sequence):
+            break  # Every level completed: later taps are wrong
+        if tapped != sequence[position]:
+            position = 0
+            continue
+        expected[i] = True
+        position += 1
+        if position == level:
+            level += 1
+            position = 0
+    return expected, min(level, len(sequence))
+
+
+_REPLAYS = {
+    MemoryExerciseType.MEMORY_CARDS: _replay_pairs,
+    MemoryExerciseType.IMAGE_PAIRS: _replay_pairs,
+    MemoryExerciseType.PATTERN_RECALL: _replay_pattern,
+    MemoryExerciseType.SEQUENCE_MEMORY: _replay_sequence,
+}
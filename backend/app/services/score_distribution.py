@@ -0,0 +1,315 @@
+"""
+Score Distribution - Mergeable score sketches per exercise type and difficulty
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Every (exercise_type, difficulty) pair has a DDSketch-style sketch of the
+final scores of its completed sessions: scores are counted in logarithmic
+buckets, so every quantile is within RELATIVE_ACCURACY of the true score
+and a percentile is only uncertain within the one bucket the score falls
+in. Sketches merge by adding counts, whatever the order.
+
+Each worker counts completions in memory (O(1) per session) and adds its
+counts to score_sketch_buckets every SCORE_SKETCH_FLUSH_INTERVAL_SECONDS
+with one upsert. Reads combine the persisted sketch, reloaded at most every
+SCORE_SKETCH_CACHE_TTL_SECONDS, with the counts this worker has not written
+yet; a few hundred buckets are read whatever the number of sessions.
+
+A crash loses the counts of at most one flush interval; recount from the
+sessions with python -m app.commands.rebuild_score_sketches.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dialect_insert
+from app.models.memory_exercise import MemoryExerciseSession
+from app.models.score_sketch import ScoreSketchBucket
+from app.schemas.memory_exercise import MemoryExerciseScoreDistribution, ScoreHistogramBin
+from app.services.leaderboard_service import LeaderboardService
+from app.services.scoring import MAX_SCORE
+
+logger = logging.getLogger(__name__)
+
+# Changing these remaps every bucket: rebuild the sketches afterwards
+RELATIVE_ACCURACY = 0.01
+MIN_SCORE = 0.01  # Scores up to this are counted as zero (bucket 0)
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Quantiles reported by the distribution endpoint
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+# Rows read per round trip when rebuilding
+REBUILD_CHUNK_SIZE = 50000
+
+SketchKey = Tuple[str, str]
+
+
+def bucket_index(score: float) -> int:
+    """Bucket counting a score"""
+    if score <= MIN_SCORE:
+        return 0
+    return math.ceil(math.log(score / MIN_SCORE) / _LOG_GAMMA)
+
+
+def bucket_indexes(scores: np.ndarray) -> np.ndarray:
+    """bucket_index over an array of scores"""
+    with np.errstate(divide="ignore"):
+        indexes = np.ceil(np.log(np.maximum(scores, MIN_SCORE) / MIN_SCORE) / _LOG_GAMMA)
+    return indexes.astype(np.int64)
+
+
+def bucket_value(index: int) -> float:
+    """Score representing a bucket, within RELATIVE_ACCURACY of every score counted in it"""
+    if index <= 0:
+        return 0.0
+    return min(MAX_SCORE, MIN_SCORE * _GAMMA ** index * 2 / (_GAMMA + 1))
+
+
+class ScoreSketch:
+    """Bucket counts of one score distribution"""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts or {})
+        self.total = sum(self.counts.values())
+
+    def add(self, score: float, count: int = 1) -> None:
+        index = bucket_index(score)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+
+    def merge(self, other: "ScoreSketch") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+
+    def copy(self) -> "ScoreSketch":
+        return ScoreSketch(self.counts)
+
+    def percentile(self, score: float) -> Optional[float]:
+        """Share of scores below `score` in percent, counting half of its own bucket; None if empty"""
+        if not self.total:
+            return None
+        target = bucket_index(score)
+        below = sum(count for index, count in self.counts.items() if index < target)
+        return 100.0 * (below + self.counts.get(target, 0) / 2) / self.total
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0 <= q <= 1), None if empty"""
+        if not self.total:
+            return None
+        rank = q * (self.total - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return bucket_value(index)
+        return bucket_value(max(self.counts))
+
+    def histogram(self, bins: int) -> List[ScoreHistogramBin]:
+        """Counts in `bins` equal-width bins over [0, MAX_SCORE]"""
+        width = MAX_SCORE / bins
+        counts = [0] * bins
+        for index, count in self.counts.items():
+            counts[min(bins - 1, int(bucket_value(index) / width))] += count
+        return [
+            ScoreHistogramBin(lower=round(i * width, 6), upper=round((i + 1) * width, 6), count=count)
+            for i, count in enumerate(counts)
+        ]
+
+
+class ScoreSketches:
+    """Per-process sketches: cached persisted counts plus counts not written yet"""
+
+    def __init__(self, flush_interval: float, cache_ttl: float):
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self._pending: Dict[SketchKey, ScoreSketch] = {}
+        # Batch being written; still counted by readers until it has landed
+        self._in_flight: Dict[SketchKey, ScoreSketch] = {}
+        self._loaded: Dict[SketchKey, Tuple[float, ScoreSketch]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self.flush_failures = 0
+
+    def record(self, exercise_type: str, difficulty: str, score: float) -> None:
+        """Count the final score of a completed session"""
+        with self._lock:
+            sketch = self._pending.get((exercise_type, difficulty))
+            if sketch is None:
+                sketch = self._pending[(exercise_type, difficulty)] = ScoreSketch()
+            sketch.add(score)
+
+    def get(self, db: Session, exercise_type: str, difficulty: str) -> ScoreSketch:
+        """Current distribution of a pair (a copy the caller may keep)"""
+        key = (exercise_type, difficulty)
+        loaded = self._loaded.get(key)
+        if loaded is None or time.monotonic() - loaded[0] >= self.cache_ttl:
+            loaded = (time.monotonic(), _load_sketch(db, key))
+            with self._lock:
+                self._loaded[key] = loaded
+
+        sketch = loaded[1].copy()
+        with self._lock:
+            for unwritten in (self._in_flight.get(key), self._pending.get(key)):
+                if unwritten is not None:
+                    sketch.merge(unwritten)
+        return sketch
+
+    def invalidate(self) -> None:
+        """Drop the cached persisted sketches so they reload on next access"""
+        with self._lock:
+            self._loaded.clear()
+
+    async def flush(self) -> int:
+        """Add the pending counts to score_sketch_buckets; returns the number of buckets written"""
+        async with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._in_flight, self._pending = self._pending, {}
+            params = [
+                {"exercise_type": exercise_type, "difficulty": difficulty, "bucket": index, "count": count}
+                for (exercise_type, difficulty), sketch in self._in_flight.items()
+                for index, count in sketch.counts.items()
+            ]
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(_increment_statement(db.sync_session), params)
+                    await db.commit()
+            except Exception:
+                self.flush_failures += 1
+                logger.exception("Score sketch flush of %d buckets failed, retrying with the next batch", len(params))
+                with self._lock:
+                    for key, sketch in self._in_flight.items():
+                        pending = self._pending.setdefault(key, ScoreSketch())
+                        pending.merge(sketch)
+                    self._in_flight = {}
+                return 0
+
+            with self._lock:
+                # Reload the written pairs rather than counting the batch twice
+                for key in self._in_flight:
+                    self._loaded.pop(key, None)
+                self._in_flight = {}
+            return len(params)
+
+    async def run(self) -> None:
+        """Flush every flush_interval seconds until cancelled, then flush once more"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+
+score_sketches = ScoreSketches(settings.SCORE_SKETCH_FLUSH_INTERVAL_SECONDS, settings.SCORE_SKETCH_CACHE_TTL_SECONDS)
+
+
+class ScoreDistributionService:
+    """Service for score distribution queries and maintenance"""
+
+    @staticmethod
+    def get_distribution(
+        db: Session,
+        exercise_type: str,
+        difficulty: str,
+        user_id: Optional[int] = None,
+        score: Optional[float] = None,
+        bins: int = 20
+    ) -> MemoryExerciseScoreDistribution:
+        """
+        Quantiles and histogram of a pair's final scores
+
+        With a user, the percentile is that of their best score on the
+        pair's leaderboard, unless an explicit score is given.
+        """
+        sketch = score_sketches.get(db, exercise_type, difficulty)
+        if score is None and user_id is not None:
+            score = LeaderboardService.get_user_best(db, user_id, exercise_type, difficulty)
+
+        return MemoryExerciseScoreDistribution(
+            exercise_type=exercise_type,
+            difficulty=difficulty,
+            total_sessions=sketch.total,
+            relative_accuracy=RELATIVE_ACCURACY,
+            quantiles={f"p{q * 100:g}": sketch.quantile(q) for q in QUANTILES} if sketch.total else {},
+            histogram=sketch.histogram(bins),
+            user_id=user_id,
+            score=score,
+            percentile=sketch.percentile(score) if score is not None else None,
+        )
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """
+        Recount every sketch from completed, ranked sessions
+
+        Streams the scores and counts them in NumPy a chunk at a time.
+        Commits and returns the number of buckets written. Counts other
+        workers have not flushed yet are added on top when they flush.
+        """
+        counts: Dict[SketchKey, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        result = db.execute(
+            select(MemoryExerciseSession.exercise_type, MemoryExerciseSession.difficulty, MemoryExerciseSession.final_score)
+            .where(
+                MemoryExerciseSession.is_completed == True,  # noqa: E712 - matches the partial index predicate
+                MemoryExerciseSession.final_score.isnot(None),
+                MemoryExerciseSession.ranked(),
+            )
+            .execution_options(yield_per=REBUILD_CHUNK_SIZE)
+        )
+        for rows in result.partitions():
+            scores: Dict[SketchKey, List[float]] = defaultdict(list)
+            for exercise_type, difficulty, final_score in rows:
+                scores[(exercise_type, difficulty)].append(final_score)
+            for key, values in scores.items():
+                indexes, occurrences = np.unique(bucket_indexes(np.asarray(values, dtype=np.float64)), return_counts=True)
+                for index, count in zip(indexes.tolist(), occurrences.tolist()):
+                    counts[key][index] += count
+
+        db.execute(delete(ScoreSketchBucket))
+        rows = [
+            {"exercise_type": exercise_type, "difficulty": difficulty, "bucket": index, "count": count}
+            for (exercise_type, difficulty), buckets in counts.items()
+            for index, count in buckets.items()
+        ]
+        if rows:
+            db.execute(insert(ScoreSketchBucket), rows)
+        db.commit()
+        score_sketches.invalidate()
+        return len(rows)
+
+
+def _load_sketch(db: Session, key: SketchKey) -> ScoreSketch:
+    """Persisted sketch of a pair"""
+    rows = db.execute(
+        select(ScoreSketchBucket.bucket, ScoreSketchBucket.count)
+        .where(ScoreSketchBucket.exercise_type == key[0], ScoreSketchBucket.difficulty == key[1])
+    ).all()
+    return ScoreSketch(dict(rows))
+
+
+def _increment_statement(db: Session):
+    """Upsert adding each row's count to its bucket"""
+    table = ScoreSketchBucket.__table__
+    stmt = dialect_insert(db, table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.exercise_type, table.c.difficulty, table.c.bucket],
+        set_={"count": table.c["count"] + stmt.excluded["count"]},
+    )
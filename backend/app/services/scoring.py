@@ -0,0 +1,277 @@
+"""
+Scoring - Session score and breakdown over columnar arrays
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+The formulas work element-wise on NumPy arrays so historic sessions can be
+rescored a chunk at a time; a single session goes through the same code
+with length-1 arrays.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.memory_exercise import DifficultyLevel, MemoryExerciseType
+
+# Score multiplier per difficulty (unknown difficulties score as easy)
+DIFFICULTY_MULTIPLIERS = {
+    DifficultyLevel.EASY.value: 1.0,
+    DifficultyLevel.MEDIUM.value: 1.2,
+    DifficultyLevel.HARD.value: 1.5,
+    DifficultyLevel.EXPERT.value: 2.0,
+}
+
+# Config fallbacks
+DEFAULT_TIME_LIMIT_MS = 60000
+DEFAULT_WEIGHT = 0.5
+
+# Sequence Memory bonus: points per sequence step, capped
+SEQUENCE_BONUS_PER_STEP = 2.0
+SEQUENCE_BONUS_CAP = 20.0
+
+MAX_SCORE = 100.0
+
+
+class ScoreColumns(NamedTuple):
+    """Per-session score components, one array element per session"""
+    final_score: np.ndarray
+    accuracy: np.ndarray
+    accuracy_score: np.ndarray
+    time_score: np.ndarray
+    difficulty_multiplier: np.ndarray
+
+
+def score_columns(
+    *,
+    is_completed: Any,
+    total_moves: Any,
+    correct_moves: Any,
+    time_elapsed_ms: Any,
+    max_sequence_reached: Any,
+    is_sequence_memory: Any,
+    difficulty_multiplier: Any,
+    time_limit_ms: Any,
+    time_weight: Any,
+    accuracy_weight: Any,
+) -> ScoreColumns:
+    """
+    Compute scores for many sessions at once
+
+    All arguments are equal-length arrays (or scalars) with nulls already
+    replaced: 0 for max_sequence_reached, DEFAULT_TIME_LIMIT_MS and
+    DEFAULT_WEIGHT for missing config values.
+
+    Returns:
+        ScoreColumns: final_score is 0 for incomplete or move-less sessions and
+        capped at MAX_SCORE. time_score is the weighted breakdown value, which
+        (unlike the score) counts a zero elapsed time as a full time score.
+    """
+    completed = np.asarray(is_completed, dtype=bool)
+    total = np.asarray(total_moves, dtype=np.float64)
+    correct = np.asarray(correct_moves, dtype=np.float64)
+    elapsed = np.asarray(time_elapsed_ms, dtype=np.float64)
+    max_sequence = np.asarray(max_sequence_reached, dtype=np.float64)
+    multiplier = np.asarray(difficulty_multiplier, dtype=np.float64)
+    limit = np.asarray(time_limit_ms, dtype=np.float64)
+    time_w = np.asarray(time_weight, dtype=np.float64)
+    accuracy_w = np.asarray(accuracy_weight, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = np.where(total > 0, correct / total * 100.0, 0.0)
+        time_ratio = np.where(limit > 0, np.minimum(1.0, elapsed / limit), 0.0)
+
+    # Faster = better; the score itself ignores sessions without a time
+    time_points = (1.0 - time_ratio) * 100.0
+    scored_time = np.where((elapsed > 0) & (limit > 0), time_points, 0.0)
+
+    base = accuracy * accuracy_w + scored_time * time_w
+    bonus = np.where(
+        np.asarray(is_sequence_memory, dtype=bool),
+        np.minimum(SEQUENCE_BONUS_CAP, max_sequence * SEQUENCE_BONUS_PER_STEP),
+        0.0,
+    )
+    final = np.minimum(MAX_SCORE, (base + bonus) * multiplier)
+    final = np.where(completed & (total > 0), final, 0.0)
+
+    return ScoreColumns(
+        final_score=final,
+        accuracy=accuracy,
+        accuracy_score=accuracy * accuracy_w,
+        time_score=time_points * time_w,
+        difficulty_multiplier=np.broadcast_to(multiplier, final.shape),
+    )
+
+
+def difficulty_multipliers(difficulties: Sequence[str]) -> np.ndarray:
+    """Multiplier array for a sequence of difficulty values"""
+    return np.array([DIFFICULTY_MULTIPLIERS.get(d, 1.0) for d in difficulties], dtype=np.float64)
+
+
+def config_value(config: Optional[Dict[str, Any]], key: str, default: float) -> float:
+    """Read a numeric config entry, treating a missing or null value as the default"""
+    value = (config or {}).get(key)
+    return default if value is None else value
+
+
+def score_sessions(sessions: Sequence[Any]) -> ScoreColumns:
+    """Score session-like objects (MemoryExerciseSession or transient copies)"""
+    return score_columns(
+        is_completed=[bool(s.is_completed) for s in sessions],
+        total_moves=[s.total_moves or 0 for s in sessions],
+        correct_moves=[s.correct_moves or 0 for s in sessions],
+        time_elapsed_ms=[s.time_elapsed_ms or 0 for s in sessions],
+        max_sequence_reached=[s.max_sequence_reached or 0 for s in sessions],
+        is_sequence_memory=[s.exercise_type == MemoryExerciseType.SEQUENCE_MEMORY.value for s in sessions],
+        difficulty_multiplier=difficulty_multipliers([s.difficulty for s in sessions]),
+        time_limit_ms=[config_value(s.config, "time_limit_ms", DEFAULT_TIME_LIMIT_MS) for s in sessions],
+        time_weight=[config_value(s.config, "time_weight", DEFAULT_WEIGHT) for s in sessions],
+        accuracy_weight=[config_value(s.config, "accuracy_weight", DEFAULT_WEIGHT) for s in sessions],
+    )
+
+
+def apply_scores(sessions: Sequence[Any]) -> None:
+    """
+    Set final_score on completed session objects in one pass
+
+    The breakdown is not stored (it is derived from the same columns on
+    read, see MemoryExerciseSession.score_breakdown) but kept on the
+    objects, so serializing them right away costs nothing more.
+    """
+    scores = score_sessions(sessions)
+    final_scores = scores.final_score.tolist()
+    for session, final_score in zip(sessions, final_scores):
+        session.final_score = final_score
+        session.stored_score_breakdown = None
+    _keep_breakdowns(sessions, scores, final_scores)
+
+
+def breakdown_inputs(session: Any) -> tuple:
+    """Values a session's derived breakdown depends on"""
+    return (
+        session.final_score,
+        session.total_moves,
+        session.correct_moves,
+        session.incorrect_moves,
+        session.time_elapsed_ms,
+        session.max_sequence_reached,
+        session.exercise_type,
+        session.difficulty,
+        session.config_id,
+    )
+
+
+def derive_breakdowns(sessions: Sequence[Any]) -> None:
+    """
+    Derive the breakdowns of scored sessions without a stored one, in one pass
+
+    Called on a page of sessions before serializing it; score_breakdown
+    would otherwise derive them one at a time.
+    """
+    pending = [
+        session for session in sessions
+        if session.stored_score_breakdown is None and session.is_completed and session.final_score is not None
+        and (getattr(session, "_derived_breakdown", None) or (None,))[0] != breakdown_inputs(session)
+    ]
+    if pending:
+        _keep_breakdowns(pending, score_sessions(pending), [session.final_score for session in pending])
+
+
+def _keep_breakdowns(sessions: Sequence[Any], scores: ScoreColumns, final_scores: Sequence[float]) -> None:
+    """Attach derived breakdowns to session objects, with the values they were derived from"""
+    details = breakdowns(
+        scores,
+        final_scores,
+        [s.time_elapsed_ms for s in sessions],
+        [s.total_moves for s in sessions],
+        [s.correct_moves for s in sessions],
+        [s.incorrect_moves for s in sessions],
+        [s.max_sequence_reached for s in sessions],
+    )
+    for session, breakdown in zip(sessions, details):
+        session._derived_breakdown = (breakdown_inputs(session), breakdown)
+
+
+def row_breakdowns(
+    exercise_types: Sequence[str],
+    difficulties: Sequence[str],
+    configs: Sequence[Optional[Dict[str, Any]]],
+    final_scores: Sequence[float],
+    time_elapsed_ms: Sequence[Optional[int]],
+    total_moves: Sequence[Optional[int]],
+    correct_moves: Sequence[Optional[int]],
+    incorrect_moves: Sequence[Optional[int]],
+    max_sequence_reached: Sequence[Optional[int]],
+) -> List[Dict[str, Any]]:
+    """
+    Derived breakdowns of completed, scored sessions given as columns (exports, compaction)
+
+    Rows sharing a config should share the dict object: its values are
+    read once per distinct object.
+    """
+    if not final_scores:
+        return []
+    parameters: Dict[int, Tuple[float, float, float]] = {}
+    for config in configs:
+        if id(config) not in parameters:
+            parameters[id(config)] = (
+                config_value(config, "time_limit_ms", DEFAULT_TIME_LIMIT_MS),
+                config_value(config, "time_weight", DEFAULT_WEIGHT),
+                config_value(config, "accuracy_weight", DEFAULT_WEIGHT),
+            )
+    time_limits, time_weights, accuracy_weights = zip(*(parameters[id(config)] for config in configs))
+    sequence_memory = MemoryExerciseType.SEQUENCE_MEMORY.value
+    scores = score_columns(
+        is_completed=np.ones(len(final_scores), dtype=bool),
+        total_moves=[value or 0 for value in total_moves],
+        correct_moves=[value or 0 for value in correct_moves],
+        time_elapsed_ms=[value or 0 for value in time_elapsed_ms],
+        max_sequence_reached=[value or 0 for value in max_sequence_reached],
+        is_sequence_memory=[t == sequence_memory for t in exercise_types],
+        difficulty_multiplier=difficulty_multipliers(difficulties),
+        time_limit_ms=time_limits,
+        time_weight=time_weights,
+        accuracy_weight=accuracy_weights,
+    )
+    return breakdowns(
+        scores, final_scores, time_elapsed_ms, total_moves, correct_moves, incorrect_moves, max_sequence_reached
+    )
+
+
+def breakdowns(
+    scores: ScoreColumns,
+    final_scores: Sequence[Optional[float]],
+    time_elapsed_ms: Sequence[int],
+    total_moves: Sequence[int],
+    correct_moves: Sequence[int],
+    incorrect_moves: Sequence[int],
+    max_sequence_reached: Sequence[Optional[int]],
+) -> List[Dict[str, Any]]:
+    """Score breakdown dicts (see ScoreBreakdown schema), one per session"""
+    return [
+        {
+            "accuracy": float(accuracy),
+            "accuracy_score": float(accuracy_score),
+            "time_score": float(time_score),
+            "time_elapsed_ms": elapsed,
+            "total_moves": total,
+            "correct_moves": correct,
+            "incorrect_moves": incorrect,
+            "max_sequence": max_sequence,
+            "difficulty_multiplier": float(multiplier),
+            "final_score": final or 0.0,
+        }
+        for accuracy, accuracy_score, time_score, multiplier, final, elapsed, total, correct, incorrect, max_sequence
+        in zip(
+            scores.accuracy.tolist(),
+            scores.accuracy_score.tolist(),
+            scores.time_score.tolist(),
+            scores.difficulty_multiplier.tolist(),
+            final_scores,
+            time_elapsed_ms,
+            total_moves,
+            correct_moves,
+            incorrect_moves,
+            max_sequence_reached,
+        )
+    ]
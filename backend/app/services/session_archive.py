@@ -0,0 +1,292 @@
+"""
+Session Archive - Parquet files of sessions moved out of the database
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Expired monthly partitions of memory_exercise_sessions are exported to
+<SESSION_ARCHIVE_DIR>/memory_exercise_sessions_pYYYYMM.parquet (zstd) by
+app.commands.maintain_partitions. The files keep every column, with the
+session's config (from exercise_configs) and score breakdown (derived
+unless stored) as JSON text, so they stand alone. Files written before
+config_id and the verification columns were added are read with those
+columns null.
+"""
+
+import os
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import orjson
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import JSON, MetaData, Select, Table, Text, cast, column, select
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.models.exercise_config import ExerciseConfig
+from app.models.memory_exercise import MemoryExerciseSession
+from app.services import scoring
+
+# Column order and types of archived sessions
+SESSION_ARROW_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("exercise_id", pa.int64()),
+    ("exercise_type", pa.string()),
+    ("difficulty", pa.string()),
+    ("config_id", pa.int64()),
+    ("config", pa.string()),
+    ("is_completed", pa.bool_()),
+    ("completed_at", pa.timestamp("us")),
+    ("total_moves", pa.int32()),
+    ("correct_moves", pa.int32()),
+    ("incorrect_moves", pa.int32()),
+    ("time_elapsed_ms", pa.int32()),
+    ("max_sequence_reached", pa.int32()),
+    ("final_score", pa.float64()),
+    ("score_breakdown", pa.string()),
+    ("verification_status", pa.string()),
+    ("verification_flags", pa.string()),
+    ("created_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+    ("puzzle_seed", pa.int64()),
+])
+
+_INDEX = {name: index for index, name in enumerate(SESSION_ARROW_SCHEMA.names)}
+_ID, _CONFIG, _BREAKDOWN = _INDEX["id"], _INDEX["config"], _INDEX["score_breakdown"]
+_IS_COMPLETED, _FINAL_SCORE = _INDEX["is_completed"], _INDEX["final_score"]
+
+_ARCHIVE_FILE = re.compile(r"^memory_exercise_sessions_p(\d{4})(\d{2})\.parquet$")
+
+# Help of the rebuild commands' --ignore-archive flag (see rebuild_refusal)
+IGNORE_ARCHIVE_HELP = "Rebuild even though months are archived, leaving their sessions out"
+
+
+def session_columns(table: Table) -> List:
+    """
+    Columns of a sessions table (or partition) in SESSION_ARROW_SCHEMA order, JSON as text
+
+    config is null for sessions not compacted yet (see
+    MemoryExerciseSession.inline_config), fetch theirs with
+    inline_configs_query; score_breakdown is the stored one, pass the rows
+    through with_score_breakdowns to fill in derived ones.
+    """
+    columns = []
+    for name in SESSION_ARROW_SCHEMA.names:
+        if name == "config":
+            columns.append(
+                select(cast(ExerciseConfig.config, Text))
+                .where(ExerciseConfig.id == table.c.config_id)
+                .scalar_subquery()
+                .label(name)
+            )
+        elif isinstance(table.c[name].type, JSON):
+            columns.append(cast(table.c[name], Text).label(name))
+        else:
+            columns.append(table.c[name])
+    return columns
+
+
+def inline_configs_query(table: Table, rows: Sequence[Sequence]) -> Optional[Select]:
+    """(id, config as JSON text) of the rows without an interned config, None if there are none"""
+    ids = [row[_ID] for row in rows if row[_CONFIG] is None]
+    if not ids:
+        return None
+    # The legacy column is not part of the table's metadata (dropped by migration 013)
+    return select(table.c.id, cast(column("config", JSON), Text)).select_from(table).where(table.c.id.in_(ids))
+
+
+def with_inline_configs(rows: Sequence[Sequence], configs: Dict[int, str]) -> List[Sequence]:
+    """Rows of session_columns with the configs read by inline_configs_query filled in"""
+    return [
+        (*row[:_CONFIG], configs[row[_ID]], *row[_CONFIG + 1:]) if row[_ID] in configs else row
+        for row in rows
+    ]
+
+
+def with_score_breakdowns(rows: Sequence[Sequence]) -> List[Sequence]:
+    """Rows of session_columns with the breakdowns of scored sessions that store none derived"""
+    missing = [
+        index for index, row in enumerate(rows)
+        if row[_BREAKDOWN] is None and row[_IS_COMPLETED] and row[_FINAL_SCORE] is not None
+    ]
+    if not missing:
+        return rows
+    scored = [rows[index] for index in missing]
+    configs: Dict[Optional[str], Optional[Dict[str, Any]]] = {}  # Parsed once per distinct config
+    for row in scored:
+        if row[_CONFIG] not in configs:
+            configs[row[_CONFIG]] = orjson.loads(row[_CONFIG]) if row[_CONFIG] is not None else None
+
+    def values(name: str) -> List:
+        return [row[_INDEX[name]] for row in scored]
+
+    derived = scoring.row_breakdowns(
+        values("exercise_type"),
+        values("difficulty"),
+        [configs[row[_CONFIG]] for row in scored],
+        values("final_score"),
+        values("time_elapsed_ms"),
+        values("total_moves"),
+        values("correct_moves"),
+        values("incorrect_moves"),
+        values("max_sequence_reached"),
+    )
+    rows = list(rows)
+    for index, breakdown in zip(missing, derived):
+        row = list(rows[index])
+        row[_BREAKDOWN] = orjson.dumps(breakdown).decode()
+        rows[index] = row
+    return rows
+
+
+def record_batches(
+    rows: Iterator[Sequence],
+    chunk_size: int,
+    prepare: Callable[[List[Sequence]], List[Sequence]] = with_score_breakdowns
+) -> Iterator[pa.RecordBatch]:
+    """Group rows (in SESSION_ARROW_SCHEMA order) into record batches, each chunk passed through prepare"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield to_record_batch(prepare(chunk))
+            chunk = []
+    if chunk:
+        yield to_record_batch(prepare(chunk))
+
+
+def to_record_batch(rows: Sequence[Sequence]) -> pa.RecordBatch:
+    """Record batch of rows in SESSION_ARROW_SCHEMA order"""
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, SESSION_ARROW_SCHEMA)],
+        schema=SESSION_ARROW_SCHEMA,
+    )
+
+
+def export_table(conn: Connection, table_name: str, path: Path, chunk_size: int = 50000) -> int:
+    """
+    Stream a sessions table (e.g. a detached partition) into a Parquet file
+
+    Rows are read through a server-side cursor and written one row group
+    per chunk, so memory stays bounded. The file appears atomically under
+    its final name. Returns the number of rows written.
+    """
+    table = MemoryExerciseSession.__table__.to_metadata(MetaData(), name=table_name)
+    result = conn.execute(
+        select(*session_columns(table)).order_by(table.c.id).execution_options(yield_per=chunk_size)
+    )
+
+    def prepare(chunk: List[Sequence]) -> List[Sequence]:
+        query = inline_configs_query(table, chunk)
+        if query is not None:
+            chunk = with_inline_configs(chunk, dict(conn.execute(query).tuples().all()))
+        return with_score_breakdowns(chunk)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".parquet.partial")
+    written = 0
+    with pq.ParquetWriter(partial, SESSION_ARROW_SCHEMA, compression="zstd") as writer:
+        for batch in record_batches(result, chunk_size, prepare):
+            writer.write_batch(batch)
+            written += batch.num_rows
+    os.replace(partial, path)
+    return written
+
+
+def archive_path(month: date, archive_dir: Optional[str] = None) -> Path:
+    """File holding the archived sessions of a month"""
+    return Path(archive_dir or settings.SESSION_ARCHIVE_DIR) / f"memory_exercise_sessions_p{month:%Y%m}.parquet"
+
+
+def retention_cutoff(retention_months: Optional[int] = None) -> Optional[datetime]:
+    """
+    Start of the oldest month kept in the database, None if every month is kept
+
+    Sessions started earlier would land in a partition that is detached
+    and archived, or in the default partition, which is never archived.
+    """
+    months = settings.SESSION_RETENTION_MONTHS if retention_months is None else retention_months
+    if months <= 0:
+        return None
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def archived_months(archive_dir: Optional[str] = None) -> List[date]:
+    """Months present in the archive, oldest first"""
+    directory = Path(archive_dir or settings.SESSION_ARCHIVE_DIR)
+    if not directory.is_dir():
+        return []
+    months = []
+    for entry in directory.iterdir():
+        match = _ARCHIVE_FILE.match(entry.name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def rebuild_refusal(archive_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Why rebuilding derived tables from the database would lose history, None if nothing is archived
+
+    Rollup, leaderboard, sketch and rating rebuilds read the live table
+    only, so once months are archived they would drop those sessions.
+    """
+    months = archived_months(archive_dir)
+    if not months:
+        return None
+    return (
+        f"{len(months)} archived months ({months[0]:%Y-%m} to {months[-1]:%Y-%m}) would be left out of the rebuild; "
+        "pass --ignore-archive to rebuild from the sessions still in the database"
+    )
+
+
+def read_archived_sessions(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    exercise_type: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    archive_dir: Optional[str] = None
+) -> pa.Table:
+    """
+    Load archived sessions with created_at in [start, end)
+
+    Only the monthly files overlapping the range are opened, and the
+    remaining filters are pushed down to the Parquet reader.
+    """
+    files = [
+        archive_path(month, archive_dir)
+        for month in archived_months(archive_dir)
+        if (end is None or datetime(month.year, month.month, 1) < end)
+        and (start is None or _next_month(month) > start)
+    ]
+    if not files:
+        return SESSION_ARROW_SCHEMA.empty_table().select(columns or SESSION_ARROW_SCHEMA.names)
+
+    criteria = []
+    if start is not None:
+        criteria.append(ds.field("created_at") >= pa.scalar(start, pa.timestamp("us")))
+    if end is not None:
+        criteria.append(ds.field("created_at") < pa.scalar(end, pa.timestamp("us")))
+    if user_id is not None:
+        criteria.append(ds.field("user_id") == user_id)
+    if exercise_type is not None:
+        criteria.append(ds.field("exercise_type") == exercise_type)
+
+    expression = None
+    for criterion in criteria:
+        expression = criterion if expression is None else expression & criterion
+
+    dataset = ds.dataset([str(path) for path in files], schema=SESSION_ARROW_SCHEMA, format="parquet")
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def _next_month(month: date) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
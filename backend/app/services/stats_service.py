@@ -0,0 +1,322 @@
+"""
+Stats Rollup Service - Incremental per-user statistics
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import Float, Select, and_, case, cast, delete, desc, func, insert, select, update
+
+from app.core.database import dialect_insert
+from app.core.timeutils import epoch_seconds
+from app.models.memory_exercise import MemoryExerciseSession, MemoryExerciseType
+from app.models.user_exercise_stats import UserExerciseStats
+from app.schemas.memory_exercise import MemoryExerciseStats
+
+# Number of most recent completed sessions reported in stats
+RECENT_WINDOW = 10
+
+# Column values for a freshly created rollup row
+_EMPTY_ROLLUP = {
+    "total_attempts": 0,
+    "completed_attempts": 0,
+    "score_count": 0,
+    "score_sum": 0.0,
+    "score_sq_sum": 0.0,
+    "score_index_sum": 0.0,
+    "accuracy_sum": 0.0,
+    "time_sum_ms": 0,
+    "recent": [],
+}
+
+
+def cache_namespace(user_id: int) -> str:
+    """Response cache namespace of a user's stats"""
+    return f"stats:{user_id}"
+
+
+class StatsRollupService:
+    """Service maintaining and reading the user_exercise_stats rollup"""
+
+    @staticmethod
+    def record_attempt(db: Session, session: MemoryExerciseSession) -> None:
+        """Count a newly created session (caller commits)"""
+        _ensure_row(db, session.user_id, session.exercise_type, session.difficulty)
+        db.execute(
+            update(UserExerciseStats)
+            .where(
+                UserExerciseStats.user_id == session.user_id,
+                UserExerciseStats.exercise_type == session.exercise_type,
+                UserExerciseStats.difficulty == session.difficulty,
+            )
+            .values(total_attempts=UserExerciseStats.total_attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def record_completion(db: Session, session: MemoryExerciseSession) -> None:
+        """
+        Fold a session that just transitioned to completed into its rollup row
+
+        The row is locked for the duration of the caller's transaction so that
+        concurrent completions for the same user serialize. Caller commits.
+        """
+        _ensure_row(db, session.user_id, session.exercise_type, session.difficulty)
+        row = db.get(
+            UserExerciseStats,
+            (session.user_id, session.exercise_type, session.difficulty),
+            with_for_update=True,
+            populate_existing=True,
+        )
+
+        accuracy = session.get_accuracy()
+        time_ms = session.time_elapsed_ms or 0
+        score = session.final_score
+
+        row.completed_attempts += 1
+        row.accuracy_sum += accuracy
+        row.time_sum_ms += time_ms
+        if score is not None:
+            row.score_count += 1
+            row.score_sum += score
+            row.score_sq_sum += score * score
+            row.score_index_sum += row.score_count * score
+            row.best_score = score if row.best_score is None else max(row.best_score, score)
+
+        row.best_accuracy = accuracy if row.best_accuracy is None else max(row.best_accuracy, accuracy)
+        if time_ms > 0:
+            row.fastest_time_ms = time_ms if row.fastest_time_ms is None else min(row.fastest_time_ms, time_ms)
+        if session.max_sequence_reached:
+            row.longest_sequence = max(row.longest_sequence or 0, session.max_sequence_reached)
+
+        # Assign a new list so the JSON column is flagged dirty
+        entry = [epoch_seconds(session.completed_at or session.created_at), score, accuracy]
+        row.recent = sorted([entry, *row.recent], key=lambda item: item[0], reverse=True)[:RECENT_WINDOW]
+
+        # Write now: a later record_* call in the same transaction reloads the row
+        db.flush()
+
+    @staticmethod
+    def get_user_stats(
+        db: Session,
+        user_id: int
+    ) -> List[MemoryExerciseStats]:
+        """Get user statistics for all exercise types from the rollup"""
+        rows = db.scalars(
+            select(UserExerciseStats).where(UserExerciseStats.user_id == user_id)
+        ).all()
+
+        by_type: Dict[str, List[UserExerciseStats]] = {}
+        for row in rows:
+            by_type.setdefault(row.exercise_type, []).append(row)
+
+        return [
+            _merge_rollups(exercise_type, by_type[exercise_type.value])
+            for exercise_type in MemoryExerciseType
+            if exercise_type.value in by_type
+        ]
+
+    @staticmethod
+    def rebuild(
+        db: Session,
+        user_id: Optional[int] = None,
+        chunk_size: int = 1000
+    ) -> int:
+        """
+        Recompute rollup rows from session history
+
+        Streams one aggregated row per user × exercise type × difficulty and
+        writes them back in chunks. Commits and returns the number of rows.
+        """
+        criteria = []
+        cleanup = delete(UserExerciseStats)
+        if user_id is not None:
+            criteria.append(MemoryExerciseSession.user_id == user_id)
+            cleanup = cleanup.where(UserExerciseStats.user_id == user_id)
+        db.execute(cleanup)
+
+        query = session_aggregates(
+            [
+                MemoryExerciseSession.user_id,
+                MemoryExerciseSession.exercise_type,
+                MemoryExerciseSession.difficulty,
+            ],
+            *criteria,
+        )
+
+        written = 0
+        batch = []
+        for row in db.execute(query.execution_options(yield_per=chunk_size)):
+            batch.append(_rollup_values(row))
+            if len(batch) >= chunk_size:
+                db.execute(insert(UserExerciseStats), batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            db.execute(insert(UserExerciseStats), batch)
+            written += len(batch)
+
+        db.commit()
+        return written
+
+
+def _ensure_row(db: Session, user_id: int, exercise_type: str, difficulty: str) -> None:
+    """Create the rollup row if it does not exist yet"""
+    db.execute(
+        dialect_insert(db, UserExerciseStats.__table__)
+        .values(user_id=user_id, exercise_type=exercise_type, difficulty=difficulty, **_EMPTY_ROLLUP)
+        .on_conflict_do_nothing()
+    )
+
+
+def _merge_rollups(exercise_type: MemoryExerciseType, rows: List[UserExerciseStats]) -> MemoryExerciseStats:
+    """
+    Combine the per-difficulty rollups of one exercise type
+
+    The improvement rate is the per-difficulty score slope averaged with
+    weights equal to each difficulty's number of scored sessions, since raw
+    scores are not comparable across difficulty multipliers.
+    """
+    completed = sum(row.completed_attempts for row in rows)
+    scored = sum(row.score_count for row in rows)  # Completed sessions with a final score
+
+    slope_weight = 0
+    slope_total = 0.0
+    for row in rows:
+        slope = row.improvement_rate()
+        if slope is not None:
+            slope_total += slope * row.score_count
+            slope_weight += row.score_count
+
+    recent = sorted(
+        (entry for row in rows for entry in row.recent),
+        key=lambda item: item[0],
+        reverse=True,
+    )[:RECENT_WINDOW]
+
+    return MemoryExerciseStats(
+        exercise_type=exercise_type,
+        total_attempts=sum(row.total_attempts for row in rows),
+        completed_attempts=completed,
+        best_score=max((row.best_score for row in rows if row.best_score is not None), default=None),
+        best_accuracy=max((row.best_accuracy for row in rows if row.best_accuracy is not None), default=None),
+        fastest_time_ms=min((row.fastest_time_ms for row in rows if row.fastest_time_ms is not None), default=None),
+        longest_sequence=max((row.longest_sequence for row in rows if row.longest_sequence is not None), default=None),
+        avg_score=sum(row.score_sum for row in rows) / scored if scored else None,
+        avg_accuracy=sum(row.accuracy_sum for row in rows) / completed if completed else None,
+        avg_time_ms=round(sum(row.time_sum_ms for row in rows) / completed) if completed else None,
+        improvement_rate=slope_total / slope_weight if slope_weight else None,
+        recent_scores=[score for _, score, _ in recent if score is not None],
+        recent_accuracies=[accuracy for _, _, accuracy in recent],
+    )
+
+
+def accuracy_expr():
+    """SQL expression mirroring MemoryExerciseSession.get_accuracy()"""
+    return case(
+        (
+            MemoryExerciseSession.total_moves > 0,
+            cast(MemoryExerciseSession.correct_moves, Float) * 100.0 / MemoryExerciseSession.total_moves,
+        ),
+        else_=0.0,
+    )
+
+
+def session_aggregates(group_by: List[Any], *criteria: Any) -> Select:
+    """
+    Build the grouped rollup query over memory_exercise_sessions
+
+    Completed sessions are ranked with window functions (newest first for the
+    recent window, oldest first as the ordinal used by the score trend), then
+    collapsed into one row per group carrying the same running sums as
+    UserExerciseStats plus ``recent_at_<k>``/``recent_score_<k>``/
+    ``recent_accuracy_<k>`` columns for k in 1..RECENT_WINDOW.
+
+    Args:
+        group_by: Session columns to group on
+        criteria: Filters applied before ranking
+    """
+    finished_at = func.coalesce(MemoryExerciseSession.completed_at, MemoryExerciseSession.created_at)
+    partition = [*group_by, MemoryExerciseSession.is_completed]
+    ranked = (
+        select(
+            *group_by,
+            MemoryExerciseSession.is_completed,
+            MemoryExerciseSession.final_score,
+            MemoryExerciseSession.time_elapsed_ms,
+            MemoryExerciseSession.max_sequence_reached,
+            finished_at.label("finished_at"),
+            accuracy_expr().label("accuracy"),
+            func.row_number().over(
+                partition_by=partition,
+                order_by=(desc(finished_at), desc(MemoryExerciseSession.id)),
+            ).label("recent_rank"),
+            # Scored sessions get their own partition so the ordinal matches
+            # the incremental update, which only counts sessions with a score
+            func.row_number().over(
+                partition_by=[*partition, MemoryExerciseSession.final_score.is_(None)],
+                order_by=(finished_at, MemoryExerciseSession.id),
+            ).label("score_ordinal"),
+        )
+        .where(*criteria)
+        .subquery()
+    )
+    c = ranked.c
+    done = c.is_completed.is_(True)
+    scored = and_(done, c.final_score.isnot(None))
+
+    recent_columns = []
+    for k in range(1, RECENT_WINDOW + 1):
+        in_window = and_(done, c.recent_rank == k)
+        recent_columns.append(func.max(case((in_window, c.finished_at))).label(f"recent_at_{k}"))
+        recent_columns.append(func.max(case((in_window, c.final_score))).label(f"recent_score_{k}"))
+        recent_columns.append(func.max(case((in_window, c.accuracy))).label(f"recent_accuracy_{k}"))
+
+    group_columns = [c[col.key] for col in group_by]
+    return select(
+        *group_columns,
+        func.count().label("total_attempts"),
+        func.count(case((done, 1))).label("completed_attempts"),
+        func.count(case((scored, 1))).label("score_count"),
+        func.coalesce(func.sum(case((scored, c.final_score))), 0.0).label("score_sum"),
+        func.coalesce(func.sum(case((scored, c.final_score * c.final_score))), 0.0).label("score_sq_sum"),
+        func.coalesce(func.sum(case((scored, cast(c.score_ordinal, Float) * c.final_score))), 0.0).label("score_index_sum"),
+        func.coalesce(func.sum(case((done, c.accuracy))), 0.0).label("accuracy_sum"),
+        func.coalesce(func.sum(case((done, c.time_elapsed_ms))), 0).label("time_sum_ms"),
+        func.max(case((scored, c.final_score))).label("best_score"),
+        func.max(case((done, c.accuracy))).label("best_accuracy"),
+        func.min(case((and_(done, c.time_elapsed_ms > 0), c.time_elapsed_ms))).label("fastest_time_ms"),
+        func.max(case((and_(done, c.max_sequence_reached > 0), c.max_sequence_reached))).label("longest_sequence"),
+        *recent_columns,
+    ).group_by(*group_columns)
+
+
+def _rollup_values(row: Any) -> Dict[str, Any]:
+    """Convert one row of session_aggregates() into UserExerciseStats column values"""
+    values = {
+        key: row._mapping[key]
+        for key in (
+            "user_id", "exercise_type", "difficulty",
+            "total_attempts", "completed_attempts", "score_count",
+            "fastest_time_ms", "longest_sequence",
+        )
+    }
+    for key in ("score_sum", "score_sq_sum", "score_index_sum", "accuracy_sum", "best_score", "best_accuracy"):
+        value = row._mapping[key]
+        values[key] = float(value) if value is not None else None
+    values["time_sum_ms"] = int(row.time_sum_ms)
+
+    recent = []
+    for k in range(1, RECENT_WINDOW + 1):
+        finished_at = row._mapping[f"recent_at_{k}"]
+        if finished_at is None:
+            break
+        score = row._mapping[f"recent_score_{k}"]
+        recent.append([
+            epoch_seconds(finished_at),
+            float(score) if score is not None else None,
+            float(row._mapping[f"recent_accuracy_{k}"]),
+        ])
+    values["recent"] = recent
+    return values
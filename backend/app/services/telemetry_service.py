@@ -0,0 +1,225 @@
+"""
+Telemetry Service - Per-move events of memory exercise sessions
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Each appended batch becomes one session_move_chunks row whose payload packs
+the events column-wise:
+
+    header   3 bytes: format version, delta width, cell width
+    deltas   move_count unsigned ints, gap to the previous move (first: 0)
+    cells    move_count unsigned ints
+    correct  move_count bits, np.packbits order
+
+Widths are 1, 2 or 4 bytes (little-endian), the smallest that fits the
+batch; with sub-minute gaps and small grids a move costs about 3.1 bytes.
+"""
+
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models.memory_exercise import MemoryExerciseSession
+from app.models.session_move_chunk import SessionMoveChunk
+from app.schemas.memory_exercise import (
+    MemoryExerciseMoveAppendResult,
+    MemoryExerciseMoveBatch,
+    MemoryExerciseMoves,
+)
+
+PAYLOAD_VERSION = 1
+
+_HEADER = struct.Struct("<BBB")
+_WIDTH_TYPES = {1: np.dtype("<u1"), 2: np.dtype("<u2"), 4: np.dtype("<u4")}
+
+
+class SessionCompletedError(Exception):
+    """Moves were sent for a session that is already completed"""
+
+
+class MoveOrderError(Exception):
+    """A batch starts before the last move already recorded for the session"""
+
+
+def _width(max_value: int) -> int:
+    """Smallest supported byte width holding max_value (MemoryExerciseMoveBatch bounds keep it within 4)"""
+    for width, dtype in _WIDTH_TYPES.items():
+        if max_value <= np.iinfo(dtype).max:
+            return width
+    raise OverflowError("Value too large for move payload")
+
+
+def pack_moves(offset_ms: np.ndarray, cell: np.ndarray, correct: np.ndarray) -> Tuple[int, bytes]:
+    """Pack one batch of ordered events; returns (base_offset_ms, payload)"""
+    base = int(offset_ms[0])
+    deltas = np.diff(offset_ms, prepend=base)
+    delta_width = _width(int(deltas.max()))
+    cell_width = _width(int(cell.max()))
+    payload = b"".join((
+        _HEADER.pack(PAYLOAD_VERSION, delta_width, cell_width),
+        deltas.astype(_WIDTH_TYPES[delta_width]).tobytes(),
+        cell.astype(_WIDTH_TYPES[cell_width]).tobytes(),
+        np.packbits(correct).tobytes(),
+    ))
+    return base, payload
+
+
+def unpack_moves(base_offset_ms: int, move_count: int, payload: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Inverse of pack_moves: (offset_ms, cell, correct) arrays"""
+    version, delta_width, cell_width = _HEADER.unpack_from(payload)
+    if version != PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported move payload version {version}")
+    position = _HEADER.size
+    deltas = np.frombuffer(payload, _WIDTH_TYPES[delta_width], move_count, position)
+    position += move_count * delta_width
+    cell = np.frombuffer(payload, _WIDTH_TYPES[cell_width], move_count, position)
+    position += move_count * cell_width
+    correct = np.unpackbits(np.frombuffer(payload, np.uint8, offset=position), count=move_count).astype(bool)
+    return np.cumsum(deltas, dtype=np.int64) + base_offset_ms, cell.astype(np.int64), correct
+
+
+def end_offset(base_offset_ms: int, move_count: int, payload: bytes) -> int:
+    """Offset of the last move of a packed batch (decodes the deltas only)"""
+    _, delta_width, _ = _HEADER.unpack_from(payload)
+    deltas = np.frombuffer(payload, _WIDTH_TYPES[delta_width], move_count, _HEADER.size)
+    return base_offset_ms + int(deltas.sum(dtype=np.int64))
+
+
+class TelemetryService:
+    """Service recording and reading per-move telemetry"""
+
+    @staticmethod
+    def append_moves(
+        db: Session,
+        session_id: int,
+        user_id: int,
+        batch: MemoryExerciseMoveBatch
+    ) -> MemoryExerciseMoveAppendResult:
+        """
+        Append a batch of moves and fold it into the session aggregates
+
+        The aggregates are advanced by one UPDATE ... RETURNING, which also
+        checks ownership and locks the session row so concurrent batches for
+        the same session serialize. Raises ValueError if the session does not
+        exist, SessionCompletedError once it is completed and MoveOrderError
+        if the batch starts before the session's last recorded move (offsets
+        must not decrease across batches either, or reaction times would
+        come out negative).
+        """
+        offset_ms = np.asarray(batch.offset_ms, dtype=np.int64)
+        cell = np.asarray(batch.cell, dtype=np.int64)
+        correct = np.asarray(batch.correct, dtype=bool)
+        count = len(offset_ms)
+        correct_count = int(correct.sum())
+        last_offset = int(offset_ms[-1])
+
+        elapsed = func.coalesce(MemoryExerciseSession.time_elapsed_ms, 0)
+        row = db.execute(
+            update(MemoryExerciseSession)
+            .where(
+                MemoryExerciseSession.id == session_id,
+                MemoryExerciseSession.user_id == user_id,
+                MemoryExerciseSession.is_completed == False,  # noqa: E712
+            )
+            .values(
+                total_moves=func.coalesce(MemoryExerciseSession.total_moves, 0) + count,
+                correct_moves=func.coalesce(MemoryExerciseSession.correct_moves, 0) + correct_count,
+                incorrect_moves=func.coalesce(MemoryExerciseSession.incorrect_moves, 0) + count - correct_count,
+                time_elapsed_ms=case((elapsed < last_offset, last_offset), else_=elapsed),
+            )
+            .returning(
+                MemoryExerciseSession.total_moves,
+                MemoryExerciseSession.correct_moves,
+                MemoryExerciseSession.incorrect_moves,
+                MemoryExerciseSession.time_elapsed_ms,
+            )
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if row is None:
+            db.rollback()
+            exists = db.scalar(
+                select(MemoryExerciseSession.id).where(
+                    MemoryExerciseSession.id == session_id,
+                    MemoryExerciseSession.user_id == user_id,
+                )
+            )
+            if exists is None:
+                raise ValueError("Session not found")
+            raise SessionCompletedError("Session is already completed")
+
+        # The session row is locked: no other batch can land in between
+        last_chunk = db.execute(
+            select(SessionMoveChunk.base_offset_ms, SessionMoveChunk.move_count, SessionMoveChunk.payload)
+            .where(SessionMoveChunk.session_id == session_id)
+            .order_by(SessionMoveChunk.id.desc())
+            .limit(1)
+        ).first()
+        if last_chunk is not None:
+            last_recorded = end_offset(*last_chunk)
+            if offset_ms[0] < last_recorded:
+                db.rollback()
+                raise MoveOrderError(
+                    f"offset_ms starts at {int(offset_ms[0])}, before the last recorded move ({last_recorded})"
+                )
+
+        base_offset, payload = pack_moves(offset_ms, cell, correct)
+        db.add(SessionMoveChunk(
+            session_id=session_id,
+            base_offset_ms=base_offset,
+            move_count=count,
+            correct_count=correct_count,
+            payload=payload,
+        ))
+        db.commit()
+
+        return MemoryExerciseMoveAppendResult(
+            session_id=session_id,
+            appended=count,
+            total_moves=row.total_moves,
+            correct_moves=row.correct_moves,
+            incorrect_moves=row.incorrect_moves,
+            time_elapsed_ms=row.time_elapsed_ms,
+        )
+
+    @staticmethod
+    def load_moves(db: Session, session_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(offset_ms, cell, correct) arrays of a session's moves in append order"""
+        chunks = db.execute(
+            select(SessionMoveChunk.base_offset_ms, SessionMoveChunk.move_count, SessionMoveChunk.payload)
+            .where(SessionMoveChunk.session_id == session_id)
+            .order_by(SessionMoveChunk.id)
+        ).all()
+        if not chunks:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+        columns = [unpack_moves(*chunk) for chunk in chunks]
+        return tuple(np.concatenate([c[i] for c in columns]) for i in range(3))
+
+    @staticmethod
+    def get_moves(
+        db: Session,
+        session_id: int,
+        user_id: int
+    ) -> Optional[MemoryExerciseMoves]:
+        """All recorded moves of a session in append order, None if the session does not exist"""
+        exists = db.scalar(
+            select(MemoryExerciseSession.id).where(
+                MemoryExerciseSession.id == session_id,
+                MemoryExerciseSession.user_id == user_id,
+            )
+        )
+        if exists is None:
+            return None
+
+        offset_ms, cell, correct = TelemetryService.load_moves(db, session_id)
+        return MemoryExerciseMoves(
+            session_id=session_id,
+            offset_ms=offset_ms.tolist(),
+            cell=cell.tolist(),
+            correct=correct.tolist(),
+            reaction_ms=np.diff(offset_ms, prepend=0).tolist(),
+        )
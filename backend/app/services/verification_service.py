@@ -0,0 +1,320 @@
+"""
+Verification Service - Replay completed sessions before they are ranked
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+With VERIFICATION_ENABLED, a completing session is scored and counted in
+the user's stats as usual but marked 'pending' instead of entering the
+leaderboards, score distributions and skill ratings. After the commit its
+id is put on this worker's bounded queue; consumer tasks load the session
+and its move log, replay them in a process pool (app.services.replay,
+CPU-bound, so it never runs on the event loop) and record the result.
+Verified sessions are then ranked exactly as an unverified completion
+would have been; rejected ones keep the failed checks in
+verification_flags. Offline sessions from the batch endpoint have nothing
+to replay: they are marked 'unverifiable' and never queued nor ranked.
+
+When the queue is full the session simply stays pending: every
+VERIFICATION_SWEEP_INTERVAL_SECONDS each worker requeues sessions pending
+for longer than that, which also covers sessions queued by a worker that
+stopped. Recording is conditional on the session still being pending, so a
+session replayed twice is ranked once.
+
+Exposed in GET /metrics (and /health):
+  - session_verification_queue_depth       sessions waiting for a consumer
+  - session_verification_latency_seconds   completion (or sweep) to recorded result
+  - session_verification_replay_seconds    replay time in the process pool
+  - session_verification_*_total           verified, rejected, failed and overflowed sessions
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.exercise_config import ExerciseConfig
+from app.models.memory_exercise import MemoryExerciseSession, VerificationStatus
+from app.services import leaderboard_service, rating_service, stats_service
+from app.services.leaderboard_service import LeaderboardService
+from app.services.rating_service import RatingService
+from app.services.replay import replay_session
+from app.services.score_distribution import score_sketches
+from app.services.telemetry_service import TelemetryService
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+VERIFY_LATENCY = Histogram(
+    "session_verification_latency_seconds", "Time from queueing a session to recording its verification",
+    buckets=_LATENCY_BUCKETS,
+)
+VERIFY_REPLAY = Histogram(
+    "session_verification_replay_seconds", "Replay time of a session in the process pool",
+    buckets=_LATENCY_BUCKETS,
+)
+
+# Sessions read per sweep query, at most the free queue slots
+SWEEP_BATCH_SIZE = 500
+
+_CLAIMED_FIELDS = ("total_moves", "correct_moves", "incorrect_moves", "time_elapsed_ms", "max_sequence_reached")
+
+
+class SessionVerifier:
+    """Per-process queue of pending sessions and the consumers replaying them"""
+
+    def __init__(self, workers: int, queue_size: int, sweep_interval: float):
+        self.workers = workers
+        self.sweep_interval = sweep_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._queued: Set[int] = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.in_progress = 0
+        self.verified = 0
+        self.rejected = 0
+        self.failures = 0
+        self.overflows = 0
+        self.last_latency_ms = 0.0
+
+    def submit(self, session_id: int) -> bool:
+        """Queue a pending session; False if the queue is full (the sweep requeues it later)"""
+        if session_id in self._queued:
+            return True
+        try:
+            self._queue.put_nowait((session_id, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.overflows += 1
+            return False
+        self._queued.add(session_id)
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def verify(self, session_id: int) -> Optional[VerificationStatus]:
+        """Replay one session and record the result; None if it is no longer pending"""
+        async with AsyncSessionLocal() as db:
+            inputs = await db.run_sync(_load_inputs, session_id)
+            if inputs is None:
+                return None
+            started = time.perf_counter()
+            executor = self._executor
+            try:
+                flags = await asyncio.get_running_loop().run_in_executor(
+                    executor, replay_session, *inputs,
+                    settings.VERIFICATION_MIN_MOVE_MS, settings.VERIFICATION_MAX_FAST_MOVE_SHARE,
+                )
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                raise
+            VERIFY_REPLAY.observe(time.perf_counter() - started)
+            try:
+                return await db.run_sync(_record_result, session_id, flags)
+            finally:
+                await cache.invalidate_marked(db.info)
+
+    async def sweep(self) -> int:
+        """Requeue sessions pending for longer than the sweep interval; returns the number queued"""
+        free = self._queue.maxsize - self._queue.qsize()
+        if free <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=self.sweep_interval)
+        async with AsyncSessionLocal() as db:
+            session_ids = (await db.scalars(
+                select(MemoryExerciseSession.id)
+                .where(
+                    MemoryExerciseSession.verification_status == VerificationStatus.PENDING.value,
+                    MemoryExerciseSession.updated_at < cutoff,
+                )
+                .order_by(MemoryExerciseSession.id)
+                .limit(min(free, SWEEP_BATCH_SIZE))
+            )).all()
+        return sum(1 for session_id in session_ids if session_id not in self._queued and self.submit(session_id))
+
+    async def run(self) -> None:
+        """Start the process pool, consumers and sweep; until cancelled"""
+        self._executor = _new_executor(self.workers)
+        consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        try:
+            while True:
+                try:
+                    await self.sweep()
+                except Exception:
+                    logger.exception("Verification sweep failed")
+                await asyncio.sleep(self.sweep_interval)
+        finally:
+            for consumer in consumers:
+                consumer.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _consume(self) -> None:
+        """Verify queued sessions one at a time (one consumer per pool process)"""
+        while True:
+            session_id, queued_at = await self._queue.get()
+            self.in_progress += 1
+            try:
+                status = await self.verify(session_id)
+            except BrokenProcessPool:
+                # Still pending: the sweep retries it on the new pool
+                self.failures += 1
+                logger.exception("Verification pool broke on session %d", session_id)
+                continue
+            except Exception:
+                # Still pending: the sweep retries it
+                self.failures += 1
+                logger.exception("Verification of session %d failed", session_id)
+                continue
+            finally:
+                self.in_progress -= 1
+                self._queued.discard(session_id)
+                self._queue.task_done()
+
+            latency = time.perf_counter() - queued_at
+            VERIFY_LATENCY.observe(latency)
+            self.last_latency_ms = latency * 1000
+            if status == VerificationStatus.VERIFIED:
+                self.verified += 1
+            elif status == VerificationStatus.REJECTED:
+                self.rejected += 1
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Restart a broken pool
+
+        Every replay running on it fails at once; only the first to get here
+        replaces it, the others find a different pool already in place.
+        """
+        with self._executor_lock:
+            if self._executor is not broken:
+                return
+            self._executor = _new_executor(self.workers)
+        logger.warning("Verification pool restarted")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_progress": self.in_progress,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "overflows": self.overflows,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+        }
+
+
+session_verifier = SessionVerifier(
+    settings.VERIFICATION_WORKERS, settings.VERIFICATION_QUEUE_SIZE, settings.VERIFICATION_SWEEP_INTERVAL_SECONDS
+)
+
+
+def _new_executor(workers: int) -> ProcessPoolExecutor:
+    """Replay processes; spawned, not forked, as the parent runs an event loop and connection pools"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _load_inputs(db: Session, session_id: int) -> Optional[Tuple]:
+    """replay_session arguments of a pending session, None if it is not pending"""
+    session = db.execute(
+        select(ExerciseConfig.config, MemoryExerciseSession.puzzle_seed, *(
+            getattr(MemoryExerciseSession, name) for name in _CLAIMED_FIELDS
+        ))
+        .outerjoin(ExerciseConfig, ExerciseConfig.id == MemoryExerciseSession.config_id)
+        .where(
+            MemoryExerciseSession.id == session_id,
+            MemoryExerciseSession.verification_status == VerificationStatus.PENDING.value,
+        )
+    ).first()
+    if session is None:
+        return None
+    config = session.config
+    if config is None:  # Not compacted yet (see MemoryExerciseSession.inline_config)
+        config = db.scalar(select(MemoryExerciseSession.inline_config).where(MemoryExerciseSession.id == session_id))
+    claimed = {name: getattr(session, name) for name in _CLAIMED_FIELDS}
+    return (config, session.puzzle_seed, claimed, *TelemetryService.load_moves(db, session_id))
+
+
+def _record_result(db: Session, session_id: int, flags: List[str]) -> Optional[VerificationStatus]:
+    """
+    Store a replay result and rank the session if it passed
+
+    The row is locked and must still be pending, so concurrent replays of a
+    session (two workers' sweeps) record it once.
+    """
+    session = db.scalars(
+        select(MemoryExerciseSession)
+        .where(
+            MemoryExerciseSession.id == session_id,
+            MemoryExerciseSession.verification_status == VerificationStatus.PENDING.value,
+        )
+        .with_for_update(of=MemoryExerciseSession)  # Not the shared exercise_configs row
+    ).first()
+    if session is None:
+        db.rollback()
+        return None
+
+    status = VerificationStatus.REJECTED if flags else VerificationStatus.VERIFIED
+    session.verification_status = status.value
+    session.verification_flags = flags or None
+    leaderboard_changes = []
+    if status == VerificationStatus.VERIFIED:
+        leaderboard_changes = LeaderboardService.record_completion(db, session)
+        RatingService.record_completion(db, session)
+
+    db.commit()
+    LeaderboardService.publish(leaderboard_changes)
+    if status == VerificationStatus.VERIFIED:
+        score_sketches.record(session.exercise_type, session.difficulty, session.final_score)
+        cache.mark_stale(
+            db,
+            stats_service.cache_namespace(session.user_id),
+            rating_service.cache_namespace(session.exercise_type),
+            *(leaderboard_service.cache_namespace(key) for key, _ in leaderboard_changes),
+        )
+    return status
+
+
+_COUNTERS = {
+    "verified": "Sessions verified and ranked",
+    "rejected": "Sessions rejected by the replay",
+    "failures": "Verifications that failed and were left pending",
+    "overflows": "Sessions left pending because the queue was full",
+}
+
+
+class _SessionVerifierCollector(Collector):
+    """Queue depth and result counters for GET /metrics"""
+
+    def __init__(self, verifier: SessionVerifier):
+        self.verifier = verifier
+
+    def collect(self) -> Iterator:
+        stats = self.verifier.stats()
+        yield GaugeMetricFamily(
+            "session_verification_queue_depth", "Sessions queued for verification", value=stats["queue_depth"]
+        )
+        yield GaugeMetricFamily(
+            "session_verification_in_progress", "Sessions being replayed", value=stats["in_progress"]
+        )
+        for name, documentation in _COUNTERS.items():
+            yield CounterMetricFamily(f"session_verification_{name}", documentation, value=stats[name])
+
+
+REGISTRY.register(_SessionVerifierCollector(session_verifier))
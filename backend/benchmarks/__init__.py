@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Brain Training backend
+
+Run from the backend directory with: python -m benchmarks.<name> --help
+"""
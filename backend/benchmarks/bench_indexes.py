@@ -0,0 +1,190 @@
+"""
+Index benchmark - write and read throughput of the legacy vs tuned session indexes
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Creates a scratch copy of memory_exercise_sessions once with the seven
+single-column indexes of migration 001 and once with the composite/partial
+indexes of migration 004, then times inserts, completion updates, history
+pages and leaderboard queries against each.
+
+Usage:
+    python -m benchmarks.bench_indexes                                  # SQLite temp file
+    python -m benchmarks.bench_indexes --url postgresql://user:pw@localhost/bench --rows 200000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Index, MetaData, create_engine, desc, select, text
+
+from app.models.memory_exercise import MemoryExerciseSession, MemoryExerciseType, DifficultyLevel
+
+TABLE_NAME = "bench_memory_exercise_sessions"
+
+# Migration 001 indexes
+LEGACY_INDEXES = {
+    "user_id": ["user_id"],
+    "exercise_id": ["exercise_id"],
+    "exercise_type": ["exercise_type"],
+    "difficulty": ["difficulty"],
+    "completed": ["is_completed"],
+    "score": ["final_score"],
+    "created_at": ["created_at"],
+}
+
+
+def build_table(variant: str):
+    """Copy of the session table carrying the given index variant"""
+    metadata = MetaData()
+    table = MemoryExerciseSession.__table__.to_metadata(metadata, name=TABLE_NAME)
+    if variant == "legacy":
+        table.indexes.clear()
+        for suffix, columns in LEGACY_INDEXES.items():
+            Index(f"bench_legacy_{suffix}", *(table.c[column] for column in columns))
+    else:
+        for index in table.indexes:
+            index.name = f"bench_{index.name}"
+    return metadata, table
+
+
+def make_rows(count: int, users: int, seed: int):
+    """Synthetic sessions spread over a year"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    types = [t.value for t in MemoryExerciseType]
+    difficulties = [d.value for d in DifficultyLevel]
+    for i in range(count):
+        created_at = start + timedelta(seconds=i * 30)
+        yield {
+            "user_id": rng.randint(1, users),
+            "exercise_id": rng.choice([None, 1, 2, 3]),
+            "exercise_type": rng.choice(types),
+            "difficulty": rng.choice(difficulties),
+            "config_id": 1,
+            "is_completed": False,
+            "total_moves": 0,
+            "correct_moves": 0,
+            "incorrect_moves": 0,
+            "time_elapsed_ms": 0,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+def timed(label: str, operations: int, fn) -> dict:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    return {"label": label, "ops": operations, "seconds": elapsed, "rate": operations / elapsed}
+
+
+def run_variant(engine, variant: str, args) -> list:
+    metadata, table = build_table(variant)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    rng = random.Random(args.seed)
+    results = []
+
+    def insert_rows():
+        rows = list(make_rows(args.rows, args.users, args.seed))
+        for start in range(0, len(rows), args.batch):
+            with engine.begin() as conn:
+                conn.execute(table.insert(), rows[start:start + args.batch])
+
+    results.append(timed("insert rows", args.rows, insert_rows))
+
+    update_ids = rng.sample(range(1, args.rows + 1), min(args.updates, args.rows))
+
+    def complete_sessions():
+        for start in range(0, len(update_ids), args.batch):
+            with engine.begin() as conn:
+                for session_id in update_ids[start:start + args.batch]:
+                    conn.execute(
+                        table.update().where(table.c.id == session_id).values(
+                            is_completed=True,
+                            total_moves=20,
+                            correct_moves=15,
+                            time_elapsed_ms=rng.randint(1000, 60000),
+                            final_score=rng.uniform(0, 100),
+                            completed_at=datetime(2025, 1, 1),
+                        )
+                    )
+
+    results.append(timed("complete sessions", len(update_ids), complete_sessions))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ANALYZE {TABLE_NAME}"))
+
+    types = [t.value for t in MemoryExerciseType]
+    difficulties = [d.value for d in DifficultyLevel]
+
+    def history_pages(with_type: bool):
+        with engine.connect() as conn:
+            for _ in range(args.queries):
+                query = select(table).where(table.c.user_id == rng.randint(1, args.users))
+                if with_type:
+                    query = query.where(table.c.exercise_type == rng.choice(types))
+                conn.execute(query.order_by(desc(table.c.created_at), desc(table.c.id)).limit(10)).all()
+
+    def leaderboards():
+        with engine.connect() as conn:
+            for _ in range(args.queries):
+                conn.execute(
+                    select(table)
+                    .where(
+                        table.c.is_completed == True,  # noqa: E712 - matches the partial index predicate
+                        table.c.final_score.isnot(None),
+                        table.c.exercise_type == rng.choice(types),
+                        table.c.difficulty == rng.choice(difficulties),
+                    )
+                    .order_by(desc(table.c.final_score))
+                    .limit(10)
+                ).all()
+
+    results.append(timed("history page", args.queries, lambda: history_pages(False)))
+    results.append(timed("history page by type", args.queries, lambda: history_pages(True)))
+    results.append(timed("leaderboard top 10", args.queries, leaderboards))
+
+    metadata.drop_all(engine)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Database URL (default: SQLite temp file)")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=500, help="Rows per transaction")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    scratch = None
+    url = args.url
+    if url is None:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        url = f"sqlite:///{scratch.name}"
+
+    engine = create_engine(url)
+    try:
+        report = {variant: run_variant(engine, variant, args) for variant in ("legacy", "tuned")}
+    finally:
+        engine.dispose()
+        if scratch is not None:
+            os.unlink(scratch.name)
+
+    print(f"{engine.dialect.name}: {args.rows} rows, {args.users} users\n")
+    print(f"{'workload':<24}{'legacy ops/s':>14}{'tuned ops/s':>14}{'change':>10}")
+    for before, after in zip(report["legacy"], report["tuned"]):
+        change = (after["rate"] / before["rate"] - 1) * 100
+        print(f"{before['label']:<24}{before['rate']:>14.0f}{after['rate']:>14.0f}{change:>+9.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Replica check - read routing of RoutingSession and read_from_replica
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Runs the API against two local SQLite databases standing in for the
+primary and the read replica, holding different sessions so every
+response tells which one served it:
+  1. replica reachable: history is read from the replica, a session
+     created on the primary is still found by id there, and nothing falls
+     back,
+  2. replica unreachable (its directory does not exist): history is read
+     from the primary, with one fallback counted, and the replica is then
+     skipped for DATABASE_REPLICA_RETRY_SECONDS.
+
+Settings and engines are read on import, so each scenario runs in its own
+process. Exits with status 1 if a check fails.
+
+Usage:
+    python -m benchmarks.check_replica
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+USER_ID = 1
+
+# Ids of the sessions only the replica holds, far above the primary's
+REPLICA_SESSION_IDS = [1001, 1002, 1003]
+
+SCENARIOS = ("replica", "replica-down")
+
+
+def seed_replica(url: str) -> None:
+    """Schema and REPLICA_SESSION_IDS (with their config) in the replica database"""
+    from sqlalchemy import create_engine, insert
+
+    from app.core.database import Base
+    from app.models.exercise_config import ExerciseConfig
+    from app.models.memory_exercise import MemoryExerciseSession
+    from app.services.config_service import config_hash
+
+    config = {"exercise_type": "memory_cards", "difficulty": "hard", "time_limit_ms": 90000}
+    created_at = datetime(2024, 1, 1)
+    replica = create_engine(url)
+    Base.metadata.create_all(replica)
+    with replica.begin() as conn:
+        conn.execute(insert(ExerciseConfig), [{"id": 1, "config_hash": config_hash(config), "config": config}])
+        conn.execute(insert(MemoryExerciseSession), [
+            {
+                "id": session_id,
+                "user_id": USER_ID,
+                "exercise_type": config["exercise_type"],
+                "difficulty": config["difficulty"],
+                "config_id": 1,
+                "is_completed": False,
+                "created_at": created_at + timedelta(minutes=i),
+                "updated_at": created_at + timedelta(minutes=i),
+            }
+            for i, session_id in enumerate(REPLICA_SESSION_IDS)
+        ])
+    replica.dispose()
+
+
+def fallbacks(client) -> float:
+    """db_replica_fallbacks_total of this process"""
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith("db_replica_fallbacks_total "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def run_scenario(scenario: str) -> bool:
+    """Checks of one scenario against the databases named by the environment; True if all passed"""
+    from fastapi.testclient import TestClient
+
+    from app.core.database import Base, engine
+    from app.main import app
+
+    if scenario == "replica":
+        seed_replica(os.environ["DATABASE_REPLICA_URL"])
+    Base.metadata.create_all(engine)
+
+    prefix = "/api/v1/memory-exercises"
+    failed = []
+
+    def check(label: str, passed: bool, detail: object) -> None:
+        print(f"  {'ok  ' if passed else 'FAIL'} {label}: {detail}")
+        if not passed:
+            failed.append(label)
+
+    print(scenario)
+    with TestClient(app) as client:
+        created = client.post(prefix + "/sessions", json={
+            "user_id": USER_ID, "config": {"exercise_type": "memory_cards", "difficulty": "easy"},
+        })
+        check("session created on the primary", created.status_code == 201, created.status_code)
+        session_id = created.json()["id"]
+
+        found = client.get(f"{prefix}/sessions/{session_id}", params={"user_id": USER_ID})
+        check("session found by id on the primary", found.status_code == 200, found.status_code)
+
+        history = client.get(prefix + "/sessions", params={"user_id": USER_ID, "limit": 50})
+        ids = sorted(session["id"] for session in history.json())
+        if scenario == "replica":
+            check("history read from the replica", ids == REPLICA_SESSION_IDS, ids)
+            check("no fallback", fallbacks(client) == 0, fallbacks(client))
+        else:
+            check("history read from the primary", ids == [session_id], ids)
+            check("one fallback counted", fallbacks(client) == 1, fallbacks(client))
+            client.get(prefix + "/sessions", params={"user_id": USER_ID, "limit": 50})
+            check("replica skipped while down", fallbacks(client) == 1, fallbacks(client))
+
+    return not failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        sys.exit(0 if run_scenario(args.scenario) else 1)
+
+    passed = True
+    with tempfile.TemporaryDirectory() as scratch:
+        for scenario in SCENARIOS:
+            directory = Path(scratch) / scenario
+            directory.mkdir()
+            replica = directory / "replica.db" if scenario == "replica" else directory / "missing" / "replica.db"
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{directory / 'primary.db'}",
+                "ASYNC_DATABASE_URL": "",
+                "DATABASE_REPLICA_URL": f"sqlite:///{replica}",
+                "DATABASE_REPLICA_RETRY_SECONDS": "300",
+                "VERIFICATION_ENABLED": "false",
+                "STARTUP_WARM_LEADERBOARDS": "false",
+                "LOG_LEVEL": "WARNING",
+            }
+            result = subprocess.run([sys.executable, "-m", "benchmarks.check_replica", "--scenario", scenario], env=env)
+            passed = passed and result.returncode == 0
+
+    print("all checks passed" if passed else "some checks FAILED")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Live session load test - concurrent games over WebSocket versus progress PUTs
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Simulates N games played at once. Each game starts a session, reports its
+progress every --interval-ms for --updates updates, then completes. In
+"put" mode a game is a client saving progress with PUT /sessions/{id} (one
+request at a time, as the frontend does); in "ws" mode it holds one
+connection to /sessions/live and streams progress arrays.
+
+Reported per mode and concurrency:
+  - updates/s achieved against the target (games / interval), while
+    games are reporting progress (creation and completion excluded)
+  - on-time share: updates sent within one interval of their schedule (a
+    game that cannot keep up falls behind and sends late)
+  - update latency p50/p99: PUT round trip, or send to covering ack (acks
+    are coalesced, so this includes up to LIVE_ACK_DELAY_MS)
+  - completion latency p50/p99
+
+Run against a single worker to compare concurrent games per worker:
+
+    uvicorn app.main:app --workers 1 --port 8000 &
+    python -m benchmarks.live_load_test --mode both --concurrency 100,400,1000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+import orjson
+import websockets
+
+from benchmarks.load_test import API, percentile
+
+CONFIG = {"exercise_type": "pattern_recall", "difficulty": "medium", "time_limit_ms": 60000}
+
+
+class GameStats:
+    """Samples collected by the simulated games of one run"""
+
+    def __init__(self):
+        self.update_latencies: List[float] = []
+        self.complete_latencies: List[float] = []
+        self.updates = 0
+        self.on_time = 0
+        self.first_update = self.last_update = 0.0
+        self.completed = 0
+        self.errors = 0
+
+
+def _progress(step: int, rng: random.Random) -> Dict[str, int]:
+    correct = step - rng.randint(0, step // 4)
+    return {
+        "total_moves": step,
+        "correct_moves": correct,
+        "incorrect_moves": step - correct,
+        "time_elapsed_ms": step * 900,
+    }
+
+
+async def _wait_for_slot(scheduled: float, interval: float, stats: GameStats) -> None:
+    """Sleep until an update's scheduled time; count it on time if not already an interval late"""
+    now = time.perf_counter()
+    stats.first_update = stats.first_update or now
+    if now < scheduled:
+        await asyncio.sleep(scheduled - now)
+    elif now - scheduled > interval:
+        return
+    stats.on_time += 1
+
+
+async def play_put(
+    client: httpx.AsyncClient, user_id: int, updates: int, interval: float, stats: GameStats, rng: random.Random
+) -> None:
+    """One game saving progress with PUT requests"""
+    response = await client.post(f"{API}/sessions", json={"user_id": user_id, "config": CONFIG})
+    response.raise_for_status()
+    session_id = response.json()["id"]
+    start = time.perf_counter()
+    for step in range(1, updates + 1):
+        await _wait_for_slot(start + step * interval, interval, stats)
+        sent = time.perf_counter()
+        response = await client.put(
+            f"{API}/sessions/{session_id}", params={"user_id": user_id}, json=_progress(step, rng)
+        )
+        if response.status_code >= 400:
+            stats.errors += 1
+        stats.update_latencies.append(time.perf_counter() - sent)
+        stats.updates += 1
+        stats.last_update = time.perf_counter()
+
+    sent = time.perf_counter()
+    response = await client.put(f"{API}/sessions/{session_id}", params={"user_id": user_id}, json={
+        **_progress(updates, rng), "completed_at": "2024-01-01T00:00:00",
+    })
+    response.raise_for_status()
+    stats.complete_latencies.append(time.perf_counter() - sent)
+    stats.completed += 1
+
+
+async def play_ws(
+    ws_url: str, user_id: int, updates: int, interval: float, stats: GameStats, rng: random.Random
+) -> None:
+    """One game streaming progress over a live session connection, honouring its window"""
+    async with websockets.connect(f"{ws_url}{API}/sessions/live?user_id={user_id}", max_queue=None) as ws:
+        await ws.send(orjson.dumps({"op": "start", "config": CONFIG}))
+        ready = orjson.loads(await ws.recv())
+        window = ready["window"]
+        sent_at: Dict[int, float] = {}
+        acked = 0
+        acked_event = asyncio.Event()
+        completed: asyncio.Future = asyncio.get_running_loop().create_future()
+
+        async def receive() -> None:
+            nonlocal acked
+            try:
+                async for raw in ws:
+                    message = orjson.loads(raw)
+                    if message["op"] == "ack":
+                        now = time.perf_counter()
+                        for seq in range(acked + 1, message["seq"] + 1):
+                            stats.update_latencies.append(now - sent_at.pop(seq))
+                        acked = message["seq"]
+                        acked_event.set()
+                    elif message["op"] == "completed":
+                        completed.set_result(message)
+                        return
+                    else:
+                        raise RuntimeError(message.get("detail"))
+            except Exception as e:
+                completed.set_exception(e)
+            finally:
+                if not completed.done():
+                    completed.set_exception(RuntimeError("Connection closed before completion"))
+                acked_event.set()  # Wakes a sender waiting for the window
+
+        receiver = asyncio.create_task(receive())
+        start = time.perf_counter()
+        try:
+            for step in range(1, updates + 1):
+                await _wait_for_slot(start + step * interval, interval, stats)
+                while step - acked > window and not completed.done():
+                    acked_event.clear()
+                    await acked_event.wait()
+                if completed.done():
+                    await completed  # Raises the error that ended the connection
+                progress = _progress(step, rng)
+                sent_at[step] = time.perf_counter()
+                await ws.send(orjson.dumps([
+                    step, progress["total_moves"], progress["correct_moves"], progress["incorrect_moves"],
+                    progress["time_elapsed_ms"], None,
+                ]))
+                stats.updates += 1
+                stats.last_update = time.perf_counter()
+
+            sent = time.perf_counter()
+            await ws.send(b'{"op":"complete"}')
+            await completed
+            stats.complete_latencies.append(time.perf_counter() - sent)
+            stats.completed += 1
+        finally:
+            receiver.cancel()
+
+
+async def run_games(
+    mode: str, base_url: str, concurrency: int, updates: int, interval_ms: int, seed: int = 42
+) -> dict:
+    """Play `concurrency` games at once, their starts spread over one interval"""
+    stats = GameStats()
+    interval = interval_ms / 1000
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    ws_url = base_url.replace("http", "ws", 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def game(game_id: int) -> None:
+            rng = random.Random(seed + game_id)
+            await asyncio.sleep(interval * game_id / concurrency)
+            try:
+                if mode == "put":
+                    await play_put(client, game_id + 1, updates, interval, stats, rng)
+                else:
+                    await play_ws(ws_url, game_id + 1, updates, interval, stats, rng)
+            except (httpx.HTTPError, websockets.WebSocketException, RuntimeError, OSError):
+                stats.errors += 1
+
+        await asyncio.gather(*(game(i) for i in range(concurrency)))
+
+    stats.update_latencies.sort()
+    stats.complete_latencies.sort()
+    return {
+        "games": concurrency,
+        "completed": stats.completed,
+        "errors": stats.errors,
+        "target_ups": concurrency / interval,
+        "ups": stats.updates / max(1e-9, stats.last_update - stats.first_update),
+        "on_time": stats.on_time / max(1, stats.updates),
+        "update_p50_ms": percentile(stats.update_latencies, 0.50) * 1000,
+        "update_p99_ms": percentile(stats.update_latencies, 0.99) * 1000,
+        "complete_p50_ms": percentile(stats.complete_latencies, 0.50) * 1000,
+        "complete_p99_ms": percentile(stats.complete_latencies, 0.99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mode", default="both", choices=["put", "ws", "both"])
+    parser.add_argument("--concurrency", default="100,400", help="Comma-separated numbers of concurrent games")
+    parser.add_argument("--updates", type=int, default=30, help="Progress updates per game")
+    parser.add_argument("--interval-ms", type=int, default=250, help="Time between a game's updates")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    modes = ["put", "ws"] if args.mode == "both" else [args.mode]
+    results = []
+    for concurrency in (int(value) for value in args.concurrency.split(",")):
+        for mode in modes:
+            result = asyncio.run(run_games(mode, args.base_url, concurrency, args.updates, args.interval_ms))
+            results.append({"mode": mode, **result})
+            print(
+                f"{mode} x{concurrency}: {result['ups']:.0f}/{result['target_ups']:.0f} updates/s, "
+                f"{result['on_time']:.1%} on time, update p50 {result['update_p50_ms']:.1f} ms "
+                f"p99 {result['update_p99_ms']:.1f} ms, complete p99 {result['complete_p99_ms']:.1f} ms "
+                f"({result['completed']} completed, {result['errors']} errors)"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
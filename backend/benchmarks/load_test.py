@@ -0,0 +1,244 @@
+"""
+HTTP load test - fixed-concurrency throughput and latency against a running API
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Drives one workload with N concurrent clients for a fixed duration and
+reports req/s and latency percentiles. Point it at a single worker to
+measure per-worker throughput, e.g. before/after a change:
+
+    uvicorn app.main:app --workers 1 --port 8000 &
+    python -m benchmarks.load_test --workload history --concurrency 64 --duration 20
+
+Against a dataset loaded with benchmarks.seed_data, skip the API seeding
+and pass the same user count; --workload all runs every workload in turn
+and --output keeps the results for comparison:
+
+    python -m benchmarks.load_test --workload all --users 100000 --seed-sessions 0 --output before.json
+
+Workloads: create, update (progress PUT of an open session), history,
+stats, leaderboard, presets, session (GET by id),
+write (create + complete one session; req/s counts create/update pairs),
+puzzle (preset puzzle by seed, mostly from the pregenerated pools),
+puzzle_custom (POST /puzzles with a non-preset layout, generated per request)
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+
+API = "/api/v1/memory-exercises"
+EXERCISE_TYPES = ["memory_cards", "pattern_recall", "sequence_memory", "image_pairs"]
+WORKLOADS = [
+    "create", "update", "history", "stats", "leaderboard", "presets", "session", "write", "puzzle", "puzzle_custom",
+]
+
+# Preset (exercise type, difficulty) pairs, see CONFIG_PRESETS
+PUZZLE_PRESETS = [
+    ("memory_cards", "easy"), ("memory_cards", "medium"), ("memory_cards", "hard"),
+    ("pattern_recall", "easy"), ("sequence_memory", "easy"), ("image_pairs", "easy"),
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_load(
+    request: Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]],
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    seed: int = 42,
+) -> dict:
+    """Run `request` from `concurrency` clients for `duration` seconds"""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker(worker_id: int) -> None:
+            nonlocal errors
+            rng = random.Random(seed + worker_id)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await request(client, rng)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def seed_sessions(base_url: str, users: int, sessions: int) -> List[tuple]:
+    """Create and complete sessions through the API; returns (session_id, user_id)"""
+    created = []
+    rng = random.Random(0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        for _ in range(sessions):
+            user_id = rng.randint(1, users)
+            response = await client.post(f"{API}/sessions", json={
+                "user_id": user_id,
+                "config": {"exercise_type": "memory_cards", "difficulty": "easy", "time_limit_ms": 60000},
+            })
+            response.raise_for_status()
+            session_id = response.json()["id"]
+            moves = rng.randint(8, 30)
+            correct = rng.randint(0, moves)
+            await client.put(f"{API}/sessions/{session_id}", params={"user_id": user_id}, json={
+                "total_moves": moves,
+                "correct_moves": correct,
+                "incorrect_moves": moves - correct,
+                "time_elapsed_ms": rng.randint(5000, 60000),
+                "completed_at": "2024-01-01T00:00:00",
+            })
+            created.append((session_id, user_id))
+    return created
+
+
+async def open_sessions(base_url: str, users: int, count: int) -> List[tuple]:
+    """Create sessions left in progress for the update workload; returns (session_id, user_id)"""
+    created = []
+    rng = random.Random(1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        for _ in range(count):
+            user_id = rng.randint(1, users)
+            response = await client.post(f"{API}/sessions", json={
+                "user_id": user_id,
+                "config": {"exercise_type": "pattern_recall", "difficulty": "medium", "time_limit_ms": 60000},
+            })
+            response.raise_for_status()
+            created.append((response.json()["id"], user_id))
+    return created
+
+
+def make_workload(name: str, users: int, sessions: List[tuple], in_progress: List[tuple] = ()):
+    """Request factory for a named workload"""
+    if name == "create":
+        return lambda client, rng: client.post(f"{API}/sessions", json={
+            "user_id": rng.randint(1, users),
+            "config": {"exercise_type": rng.choice(EXERCISE_TYPES), "difficulty": "easy", "time_limit_ms": 60000},
+        })
+    if name == "update":
+        def save_progress(client, rng):
+            session_id, user_id = rng.choice(in_progress)
+            moves = rng.randint(1, 60)
+            return client.put(f"{API}/sessions/{session_id}", params={"user_id": user_id}, json={
+                "total_moves": moves,
+                "correct_moves": rng.randint(0, moves),
+                "time_elapsed_ms": rng.randint(1000, 60000),
+            })
+        return save_progress
+    if name == "presets":
+        return lambda client, rng: client.get(f"{API}/presets/{rng.choice(EXERCISE_TYPES)}")
+    if name == "puzzle":
+        def get_puzzle(client, rng):
+            exercise_type, difficulty = rng.choice(PUZZLE_PRESETS)
+            return client.get(f"{API}/puzzles/{exercise_type}/{difficulty}", params={"seed": rng.randrange(300)})
+        return get_puzzle
+    if name == "puzzle_custom":
+        return lambda client, rng: client.post(f"{API}/puzzles", json={
+            "config": {"exercise_type": "memory_cards", "difficulty": "hard", "grid_rows": 10, "grid_cols": 10},
+            "seed": rng.randrange(1_000_000),
+        })
+    if name == "history":
+        return lambda client, rng: client.get(f"{API}/sessions", params={"user_id": rng.randint(1, users)})
+    if name == "stats":
+        return lambda client, rng: client.get(f"{API}/stats", params={"user_id": rng.randint(1, users)})
+    if name == "leaderboard":
+        return lambda client, rng: client.get(f"{API}/leaderboard", params={"exercise_type": "memory_cards"})
+    if name == "session":
+        def get_session(client, rng):
+            session_id, user_id = rng.choice(sessions)
+            return client.get(f"{API}/sessions/{session_id}", params={"user_id": user_id})
+        return get_session
+    if name == "write":
+        async def create_and_complete(client, rng):
+            user_id = rng.randint(1, users)
+            response = await client.post(f"{API}/sessions", json={
+                "user_id": user_id,
+                "config": {"exercise_type": "memory_cards", "difficulty": "easy", "time_limit_ms": 60000},
+            })
+            if response.status_code >= 400:
+                return response
+            moves = rng.randint(8, 30)
+            correct = rng.randint(0, moves)
+            return await client.put(f"{API}/sessions/{response.json()['id']}", params={"user_id": user_id}, json={
+                "total_moves": moves,
+                "correct_moves": correct,
+                "incorrect_moves": moves - correct,
+                "time_elapsed_ms": rng.randint(5000, 60000),
+                "completed_at": "2024-01-01T00:00:00",
+            })
+        return create_and_complete
+    raise ValueError(f"Unknown workload {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--workload", default="history", choices=WORKLOADS + ["all"])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per workload")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--seed-sessions", type=int, default=200, help="Sessions created before the run (0 to skip)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workloads = list(WORKLOADS) if args.workload == "all" else [args.workload]
+    if workloads == ["write"]:
+        args.seed_sessions = 0
+    sessions = asyncio.run(seed_sessions(args.base_url, args.users, args.seed_sessions)) if args.seed_sessions else []
+    if "session" in workloads and not sessions:
+        if args.workload != "all":
+            parser.error("the session workload needs --seed-sessions > 0")
+        workloads.remove("session")
+    in_progress = asyncio.run(open_sessions(args.base_url, args.users, args.concurrency * 4)) if "update" in workloads else []
+
+    results = []
+    for workload in workloads:
+        result = asyncio.run(run_load(
+            make_workload(workload, args.users, sessions, in_progress),
+            args.base_url,
+            args.concurrency,
+            args.duration,
+        ))
+        results.append({"workload": workload, "concurrency": args.concurrency, **result})
+        print(
+            f"{workload} x{args.concurrency}: {result['rps']:.0f} req/s, "
+            f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms "
+            f"({result['requests']} requests, {result['errors']} errors)"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Puzzle micro-benchmarks: generation per request against the pregenerated pools
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+import pytest
+
+from app.schemas.memory_exercise import DifficultyLevel, MemoryExerciseConfig, MemoryExerciseType
+from app.services.puzzle_service import PuzzleService, generate_puzzle
+
+CONFIGS = {
+    "cards_8x8": MemoryExerciseConfig(
+        exercise_type=MemoryExerciseType.MEMORY_CARDS, difficulty=DifficultyLevel.HARD, grid_rows=8, grid_cols=8
+    ),
+    "pattern_3x3": MemoryExerciseConfig(
+        exercise_type=MemoryExerciseType.PATTERN_RECALL, difficulty=DifficultyLevel.EASY, grid_rows=3, grid_cols=3
+    ),
+    "sequence_20": MemoryExerciseConfig(
+        exercise_type=MemoryExerciseType.SEQUENCE_MEMORY, difficulty=DifficultyLevel.EASY, max_sequence_length=20
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CONFIGS)
+def bench_generate_puzzle(benchmark, name):
+    puzzle = benchmark(generate_puzzle, CONFIGS[name], 12345)
+    assert puzzle.seed == 12345
+
+
+@pytest.mark.parametrize("name", CONFIGS)
+def bench_pooled_puzzle(benchmark, name):
+    PuzzleService.pregenerate([CONFIGS[name]], 256)
+    body, etag = benchmark(PuzzleService.get_puzzle, CONFIGS[name], 123)
+    assert body and etag
@@ -0,0 +1,33 @@
+"""
+Scoring micro-benchmarks: per-session model methods and the vectorized batch path
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from app.services import scoring
+
+
+def bench_calculate_score(benchmark, session):
+    score = benchmark(session.calculate_score)
+    assert 0.0 <= score <= scoring.MAX_SCORE
+
+
+def bench_generate_score_breakdown(benchmark, session):
+    breakdown = benchmark(session.generate_score_breakdown)
+    assert breakdown["total_moves"] == session.total_moves
+
+
+def bench_apply_scores_10k(benchmark, sessions_10k):
+    benchmark(scoring.apply_scores, sessions_10k)
+    assert all(s.final_score is not None for s in sessions_10k)
+
+
+def bench_derive_breakdowns_page(benchmark, history_page):
+    """Breakdowns of a history page read from the database (none stored, none derived yet)"""
+    def derive():
+        for session in history_page:
+            session._derived_breakdown = None
+        scoring.derive_breakdowns(history_page)
+
+    benchmark(derive)
+    assert all(s.score_breakdown["final_score"] == s.final_score for s in history_page)
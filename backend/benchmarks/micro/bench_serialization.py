@@ -0,0 +1,39 @@
+"""
+Response serialization micro-benchmarks, using the routes' own serializers
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+from pydantic_core import to_json
+
+from app.routes.memory_exercises import _SESSION_LIST, _session_response
+from app.schemas.memory_exercise import MemoryExerciseLeaderboard
+
+
+def bench_session_response(benchmark, session):
+    response = benchmark(_session_response, session)
+    assert response.status_code == 200
+
+
+def bench_history_page(benchmark, history_page):
+    def serialize():
+        return _SESSION_LIST.dump_json(_SESSION_LIST.validate_python(history_page, from_attributes=True))
+
+    assert len(benchmark(serialize)) > 0
+
+
+def bench_leaderboard_page(benchmark, history_page):
+    entries = [
+        MemoryExerciseLeaderboard(
+            rank=rank,
+            user_id=s.user_id,
+            final_score=s.final_score,
+            accuracy=s.accuracy,
+            time_elapsed_ms=s.time_elapsed_ms,
+            difficulty=s.difficulty,
+            completed_at=s.completed_at,
+            is_current_user=False,
+        )
+        for rank, s in enumerate(history_page, start=1)
+    ]
+    assert len(benchmark(to_json, entries)) > 0
@@ -0,0 +1,73 @@
+"""
+Fixtures of the micro-benchmarks: transient sessions, no database needed
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+
+from app.models.exercise_config import ExerciseConfig
+from app.models.memory_exercise import DifficultyLevel, MemoryExerciseSession, MemoryExerciseType
+from app.services import scoring
+
+
+def make_sessions(count: int, seed: int = 0) -> List[MemoryExerciseSession]:
+    """Completed, scored sessions with every column set, as loaded from the database"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    config_ids = {
+        (exercise_type.value, difficulty.value): i + 1
+        for i, (exercise_type, difficulty) in enumerate(
+            (t, d) for t in MemoryExerciseType for d in DifficultyLevel
+        )
+    }
+    sessions = []
+    for i in range(count):
+        exercise_type = rng.choice(list(MemoryExerciseType)).value
+        difficulty = rng.choice(list(DifficultyLevel)).value
+        total = rng.randint(8, 60)
+        correct = rng.randint(0, total)
+        created_at = start + timedelta(minutes=i)
+        sessions.append(MemoryExerciseSession(
+            id=i + 1,
+            user_id=rng.randint(1, 1000),
+            exercise_id=None,
+            exercise_type=exercise_type,
+            difficulty=difficulty,
+            config_id=config_ids[(exercise_type, difficulty)],
+            exercise_config=ExerciseConfig(id=config_ids[(exercise_type, difficulty)], config={
+                "exercise_type": exercise_type, "difficulty": difficulty, "time_limit_ms": 60000,
+                "time_weight": 0.5, "accuracy_weight": 0.5,
+            }),
+            is_completed=True,
+            completed_at=created_at + timedelta(seconds=45),
+            total_moves=total,
+            correct_moves=correct,
+            incorrect_moves=total - correct,
+            time_elapsed_ms=rng.randint(5000, 90000),
+            max_sequence_reached=rng.randint(3, 15) if exercise_type == MemoryExerciseType.SEQUENCE_MEMORY.value else None,
+            created_at=created_at,
+            updated_at=created_at + timedelta(seconds=45),
+        ))
+    scoring.apply_scores(sessions)
+    return sessions
+
+
+@pytest.fixture(scope="session")
+def session() -> MemoryExerciseSession:
+    return make_sessions(1)[0]
+
+
+@pytest.fixture(scope="session")
+def history_page() -> List[MemoryExerciseSession]:
+    """One page of GET /sessions at the maximum page size"""
+    return make_sessions(100)
+
+
+@pytest.fixture(scope="session")
+def sessions_10k() -> List[MemoryExerciseSession]:
+    return make_sessions(10000)
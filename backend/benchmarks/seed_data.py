@@ -0,0 +1,190 @@
+"""
+Synthetic dataset - bulk-load sessions for benchmarks and load tests
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Writes a reproducible history (same --seed, same rows) straight into the
+database named by DATABASE_URL, then rebuilds the stats rollup,
+leaderboards, score sketches and skill ratings so every read endpoint sees
+a consistent dataset. User ids are 1..--users, matching the load test's
+--users.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed_data --users 1000 --sessions 20000
+    python -m benchmarks.seed_data --users 100000 --sessions 1000000     # local Postgres
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+from app.core.database import Base, SessionLocal, engine
+from app.models.memory_exercise import DifficultyLevel, MemoryExerciseSession, MemoryExerciseType
+from app.schemas.memory_exercise import MemoryExerciseConfig
+from app.services import scoring
+from app.services.config_service import ConfigService, config_hash
+from app.services.leaderboard_service import LeaderboardService
+from app.services.rating_service import RatingService
+from app.services.score_distribution import ScoreDistributionService
+from app.services.stats_service import StatsRollupService
+
+TYPES = [t.value for t in MemoryExerciseType]
+DIFFICULTIES = [d.value for d in DifficultyLevel]
+
+
+def _config_ids() -> dict:
+    """Interned config id per exercise type × difficulty"""
+    configs = {
+        (exercise_type, difficulty): MemoryExerciseConfig(
+            exercise_type=exercise_type, difficulty=difficulty, time_limit_ms=60000
+        ).model_dump(mode="json")
+        for exercise_type in TYPES
+        for difficulty in DIFFICULTIES
+    }
+    db = SessionLocal()
+    try:
+        ids = ConfigService.intern_many(db, configs.values())
+        db.commit()
+    finally:
+        db.close()
+    return {key: ids[config_hash(config)] for key, config in configs.items()}
+
+
+def generate_chunk(rng: np.random.Generator, count: int, users: int, days: int, completed_share: float) -> dict:
+    """Column values and scores of `count` synthetic sessions"""
+    type_index = rng.integers(0, len(TYPES), count)
+    difficulty_index = rng.integers(0, len(DIFFICULTIES), count)
+    is_completed = rng.random(count) < completed_share
+    total = rng.integers(8, 60, count)
+    correct = np.floor(total * rng.beta(6, 2, count)).astype(np.int64)
+    elapsed = rng.integers(5000, 90000, count)
+    is_sequence = type_index == TYPES.index(MemoryExerciseType.SEQUENCE_MEMORY.value)
+    max_sequence = np.where(is_sequence, rng.integers(3, 15, count), 0)
+    offsets = np.sort(rng.integers(0, days * 86400, count))  # seconds into the chunk's span
+
+    scores = scoring.score_columns(
+        is_completed=is_completed,
+        total_moves=total,
+        correct_moves=correct,
+        time_elapsed_ms=elapsed,
+        max_sequence_reached=max_sequence,
+        is_sequence_memory=is_sequence,
+        difficulty_multiplier=scoring.difficulty_multipliers([DIFFICULTIES[i] for i in difficulty_index]),
+        time_limit_ms=np.full(count, scoring.DEFAULT_TIME_LIMIT_MS),
+        time_weight=np.full(count, scoring.DEFAULT_WEIGHT),
+        accuracy_weight=np.full(count, scoring.DEFAULT_WEIGHT),
+    )
+    return {
+        "user_id": rng.integers(1, users + 1, count),
+        "type_index": type_index,
+        "difficulty_index": difficulty_index,
+        "is_completed": is_completed,
+        "total": total,
+        "correct": correct,
+        "elapsed": elapsed,
+        "max_sequence": np.where(is_sequence, max_sequence, -1),
+        "offsets": offsets,
+        "scores": scores,
+    }
+
+
+def chunk_rows(chunk: dict, config_ids: dict, start: datetime) -> list:
+    """INSERT parameters for a generated chunk (score breakdowns are derived on read)"""
+    final_scores = [
+        score if completed else None
+        for score, completed in zip(chunk["scores"].final_score.tolist(), chunk["is_completed"].tolist())
+    ]
+    max_sequence = [value if value >= 0 else None for value in chunk["max_sequence"].tolist()]
+    total = chunk["total"].tolist()
+    correct = chunk["correct"].tolist()
+    incorrect = [t - c for t, c in zip(total, correct)]
+    elapsed = chunk["elapsed"].tolist()
+
+    rows = []
+    for i, (user_id, type_index, difficulty_index, completed, offset) in enumerate(zip(
+        chunk["user_id"].tolist(),
+        chunk["type_index"].tolist(),
+        chunk["difficulty_index"].tolist(),
+        chunk["is_completed"].tolist(),
+        chunk["offsets"].tolist(),
+    )):
+        exercise_type, difficulty = TYPES[type_index], DIFFICULTIES[difficulty_index]
+        created_at = start + timedelta(seconds=offset)
+        completed_at = created_at + timedelta(milliseconds=elapsed[i]) if completed else None
+        rows.append({
+            "user_id": user_id,
+            "exercise_id": None,
+            "exercise_type": exercise_type,
+            "difficulty": difficulty,
+            "config_id": config_ids[(exercise_type, difficulty)],
+            "is_completed": completed,
+            "completed_at": completed_at,
+            "total_moves": total[i],
+            "correct_moves": correct[i],
+            "incorrect_moves": incorrect[i],
+            "time_elapsed_ms": elapsed[i],
+            "max_sequence_reached": max_sequence[i],
+            "final_score": final_scores[i],
+            "created_at": created_at,
+            "updated_at": completed_at or created_at,
+        })
+    return rows
+
+
+def seed(users: int, sessions: int, chunk_size: int, seed_value: int, days: int, completed_share: float) -> int:
+    """Insert the synthetic sessions chunk by chunk; returns the number written"""
+    rng = np.random.default_rng(seed_value)
+    config_ids = _config_ids()
+    start = datetime(2024, 1, 1)
+    span = max(1, days // max(1, -(-sessions // chunk_size)))  # days covered per chunk, keeps created_at increasing
+
+    written = 0
+    chunk_start = start
+    with engine.begin() as conn:
+        while written < sessions:
+            count = min(chunk_size, sessions - written)
+            chunk = generate_chunk(rng, count, users, span, completed_share)
+            conn.execute(insert(MemoryExerciseSession), chunk_rows(chunk, config_ids, chunk_start))
+            written += count
+            chunk_start += timedelta(days=span)
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per INSERT batch")
+    parser.add_argument("--days", type=int, default=365, help="History span")
+    parser.add_argument("--completed-share", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-rebuild", action="store_true", help="Do not rebuild stats, leaderboards, sketches and ratings")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    written = seed(args.users, args.sessions, args.chunk_size, args.seed, args.days, args.completed_share)
+    print(f"Inserted {written} sessions for {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    if not args.skip_rebuild:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            stats = StatsRollupService.rebuild(db)
+            entries = LeaderboardService.rebuild(db)
+            buckets = ScoreDistributionService.rebuild(db)
+            ratings = RatingService.rebuild(db)
+        finally:
+            db.close()
+        print(
+            f"Rebuilt {stats} stats rows, {entries} leaderboard entries, {buckets} sketch buckets "
+            f"and {ratings} ratings in {time.perf_counter() - started:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
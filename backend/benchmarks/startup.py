@@ -0,0 +1,84 @@
+"""
+Startup benchmark - time from process start to the first successful response
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Starts the server N times and polls GET /health until it answers 200,
+reporting import time of app.main and process-start-to-first-response
+time. Uses the environment's DATABASE_URL (run app.commands.migrate first).
+
+Usage:
+    python -m benchmarks.startup                                  # uvicorn, one process
+    python -m benchmarks.startup --server gunicorn --workers 4    # production entry point
+"""
+
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def import_seconds() -> float:
+    """Import time of app.main in a fresh interpreter"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def server_command(server: str, port: int, workers: int) -> list:
+    if server == "gunicorn":
+        return [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app",
+            "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+        ]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+
+
+def first_response_seconds(command: list, port: int, timeout: float) -> float:
+    """Seconds from spawning the server until /health answers 200"""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"No response within {timeout}s")
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn only")
+    parser.add_argument("--port", type=int, default=8017)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    command = server_command(args.server, args.port, args.workers)
+    starts = [first_response_seconds(command, args.port, args.timeout) for _ in range(args.runs)]
+
+    print(f"import app.main: median {statistics.median(imports) * 1000:.0f} ms, min {min(imports) * 1000:.0f} ms")
+    print(
+        f"{args.server} start to first response: median {statistics.median(starts) * 1000:.0f} ms, "
+        f"min {min(starts) * 1000:.0f} ms ({args.runs} runs)"
+    )
+
+
+if __name__ == "__main__":
+    main()
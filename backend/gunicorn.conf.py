@@ -0,0 +1,60 @@
+"""
+Gunicorn configuration - production server
+@author Jay "The Ermite" Goncalves
+@copyright Jay The Ermite
+
+Runs SERVER_WORKERS uvicorn workers (0: one per CPU). The memory cache
+backend is per process and a completion would only invalidate the cached
+stats and leaderboards of the worker that handled it, so with
+CACHE_BACKEND=memory a single worker runs and SERVER_WORKERS > 1 refuses
+to start; use CACHE_BACKEND=redis for several. With SERVER_PRELOAD the app is
+imported once in the master and the workers fork from it, sharing the
+already imported modules and compiled schemas; each worker then runs the
+lifespan warm-up (connection pool, leaderboards) on its own.
+
+Usage:
+    python -m app.commands.migrate
+    gunicorn -c gunicorn.conf.py app.main:app
+"""
+
+import multiprocessing
+
+from app.core.config import settings
+
+
+def _workers() -> int:
+    """Worker count; one with the per-process memory cache"""
+    if settings.CACHE_BACKEND == "memory":
+        if settings.SERVER_WORKERS > 1:
+            raise RuntimeError(
+                f"SERVER_WORKERS={settings.SERVER_WORKERS} needs a shared cache: "
+                "set CACHE_BACKEND=redis (the memory backend would serve stale responses)"
+            )
+        return 1
+    return settings.SERVER_WORKERS or multiprocessing.cpu_count()
+
+
+bind = f"{settings.SERVER_HOST}:{settings.SERVER_PORT}"
+workers = _workers()
+# Workers fork from this process: the app sees the actual count (see progress_buffer)
+settings.SERVER_WORKERS = workers
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = settings.SERVER_PRELOAD
+timeout = 60
+# Shutdown runs the last progress buffer flush
+graceful_timeout = 30
+keepalive = 5
+loglevel = settings.LOG_LEVEL.lower()
+accesslog = "-" if settings.DEBUG else None
+
+
+def post_fork(server, worker):
+    """Give each worker fresh pools: connections must never be shared across processes"""
+    if not preload_app:
+        return
+    from app.core.database import async_engine, engine, replica_engine
+
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.sync_engine.dispose(close=False)
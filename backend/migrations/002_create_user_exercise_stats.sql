@@ -0,0 +1,29 @@
+-- Migration 002: Create user_exercise_stats rollup table
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Populate from existing sessions with: python -m app.commands.rebuild_stats
+
+CREATE TABLE IF NOT EXISTS user_exercise_stats (
+    user_id INTEGER NOT NULL,
+    exercise_type VARCHAR(50) NOT NULL,
+    difficulty VARCHAR(20) NOT NULL,
+    total_attempts INTEGER NOT NULL DEFAULT 0,
+    completed_attempts INTEGER NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score_sq_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score_index_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    accuracy_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    time_sum_ms BIGINT NOT NULL DEFAULT 0,
+    best_score DOUBLE PRECISION,
+    best_accuracy DOUBLE PRECISION,
+    fastest_time_ms INTEGER,
+    longest_sequence INTEGER,
+    recent JSONB NOT NULL DEFAULT '[]'::jsonb,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, exercise_type, difficulty)
+);
+
+-- Add comment
+COMMENT ON TABLE user_exercise_stats IS 'Incrementally maintained per-user statistics rollup';
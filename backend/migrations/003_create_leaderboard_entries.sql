@@ -0,0 +1,22 @@
+-- Migration 003: Create leaderboard_entries table
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- One row per user and leaderboard partition ("<type>:<difficulty>:<exercise_id>",
+-- "*" for any). Populate from existing sessions with:
+--   python -m app.commands.rebuild_leaderboards
+
+CREATE TABLE IF NOT EXISTS leaderboard_entries (
+    partition_key VARCHAR(100) NOT NULL,
+    user_id INTEGER NOT NULL,
+    session_id INTEGER NOT NULL,
+    final_score REAL NOT NULL,
+    accuracy REAL NOT NULL,
+    time_elapsed_ms INTEGER NOT NULL,
+    difficulty VARCHAR(20) NOT NULL,
+    completed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (partition_key, user_id)
+);
+
+-- Add comment
+COMMENT ON TABLE leaderboard_entries IS 'Best completed session per user for each leaderboard partition';
@@ -0,0 +1,41 @@
+-- Migration 004: Replace single-column session indexes with query-shaped ones
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Every index costs on each INSERT/UPDATE, so only keep the ones the queries use:
+--   history      WHERE user_id = ? [AND exercise_type = ?] ORDER BY created_at DESC, id DESC
+--   leaderboards WHERE is_completed AND final_score IS NOT NULL
+--                  [AND exercise_type = ? AND difficulty = ?] ORDER BY final_score DESC
+-- Run outside a transaction (psql -f does by default): CONCURRENTLY avoids
+-- blocking writes while the indexes build.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_sessions_user_created
+    ON memory_exercise_sessions (user_id, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_sessions_user_type_created
+    ON memory_exercise_sessions (user_id, exercise_type, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_sessions_leaderboard
+    ON memory_exercise_sessions (exercise_type, difficulty, final_score DESC)
+    WHERE is_completed AND final_score IS NOT NULL;
+
+-- Superseded by the composite indexes above (from migration 001)
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_exercise_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_exercise_type;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_difficulty;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_completed;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_score;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memory_sessions_created_at;
+
+-- Same indexes when the table was created by SQLAlchemy create_all (ix_ prefix),
+-- including the one duplicating the primary key
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_id;
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_exercise_id;
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_exercise_type;
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_difficulty;
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_is_completed;
+DROP INDEX CONCURRENTLY IF EXISTS ix_memory_exercise_sessions_final_score;
+
+ANALYZE memory_exercise_sessions;
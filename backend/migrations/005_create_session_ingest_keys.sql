@@ -0,0 +1,14 @@
+-- Migration 005: Create session_ingest_keys table for idempotent batch ingestion
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+
+CREATE TABLE IF NOT EXISTS session_ingest_keys (
+    user_id INTEGER NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    session_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+-- Add comment
+COMMENT ON TABLE session_ingest_keys IS 'Idempotency keys claimed by POST /memory-exercises/sessions/batch';
@@ -0,0 +1,24 @@
+-- Migration 006: Create session_move_chunks table for per-move telemetry
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Append-only: one row per POST /sessions/{id}/moves batch, events packed
+-- column-wise in payload (see app/services/telemetry_service.py).
+
+CREATE TABLE IF NOT EXISTS session_move_chunks (
+    id BIGSERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    base_offset_ms INTEGER NOT NULL,
+    move_count INTEGER NOT NULL,
+    correct_count INTEGER NOT NULL,
+    payload BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_session_move_chunks_session_id ON session_move_chunks (session_id);
+
+-- Payloads are already packed; skip TOAST compression attempts
+ALTER TABLE session_move_chunks ALTER COLUMN payload SET STORAGE EXTERNAL;
+
+-- Add comment
+COMMENT ON TABLE session_move_chunks IS 'Per-move telemetry of memory exercise sessions, packed per appended batch';
@@ -0,0 +1,87 @@
+-- Migration 007: Range-partition memory_exercise_sessions by month of created_at
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Rebuilds the table as a partitioned table with one partition per month
+-- (memory_exercise_sessions_pYYYYMM) plus a default partition for rows
+-- outside every range (e.g. offline sessions with a far past created_at).
+-- Existing rows are copied, so run it in a maintenance window; the old
+-- table is kept as memory_exercise_sessions_legacy until dropped by hand.
+--
+-- The primary key becomes (id, created_at): a partitioned table's unique
+-- constraints must include the partition key. Ids still come from the same
+-- sequence and stay unique.
+--
+-- Afterwards, schedule the maintenance command (creates upcoming months,
+-- detaches and archives expired ones):
+--   python -m app.commands.maintain_partitions
+
+-- Creates the partition holding the given month (no-op if it exists); also
+-- used by app/commands/maintain_partitions.py
+CREATE OR REPLACE FUNCTION create_memory_session_partition(for_month DATE) RETURNS TEXT AS $$
+DECLARE
+    start_at DATE := date_trunc('month', for_month)::DATE;
+    partition_name TEXT := format('memory_exercise_sessions_p%s', to_char(start_at, 'YYYYMM'));
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF memory_exercise_sessions FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_at, (start_at + INTERVAL '1 month')::DATE
+    );
+    RETURN partition_name;
+END
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    partition_month DATE;
+    last_month DATE := (date_trunc('month', now()) + INTERVAL '3 months')::DATE;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'memory_exercise_sessions'::regclass
+    ) THEN
+        RAISE NOTICE 'memory_exercise_sessions is already partitioned';
+        RETURN;
+    END IF;
+
+    ALTER TABLE memory_exercise_sessions RENAME TO memory_exercise_sessions_legacy;
+    ALTER TABLE memory_exercise_sessions_legacy RENAME CONSTRAINT memory_exercise_sessions_pkey TO memory_exercise_sessions_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_memory_sessions_user_created RENAME TO idx_memory_sessions_legacy_user_created;
+    ALTER INDEX IF EXISTS idx_memory_sessions_user_type_created RENAME TO idx_memory_sessions_legacy_user_type_created;
+    ALTER INDEX IF EXISTS idx_memory_sessions_leaderboard RENAME TO idx_memory_sessions_legacy_leaderboard;
+
+    CREATE TABLE memory_exercise_sessions (
+        LIKE memory_exercise_sessions_legacy INCLUDING DEFAULTS INCLUDING COMMENTS,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    -- Keep the id sequence when the legacy table is dropped
+    ALTER SEQUENCE memory_exercise_sessions_id_seq OWNED BY memory_exercise_sessions.id;
+
+    -- Same query-shaped indexes as migration 004, created on every partition
+    CREATE INDEX idx_memory_sessions_user_created
+        ON memory_exercise_sessions (user_id, created_at DESC, id DESC);
+    CREATE INDEX idx_memory_sessions_user_type_created
+        ON memory_exercise_sessions (user_id, exercise_type, created_at DESC, id DESC);
+    CREATE INDEX idx_memory_sessions_leaderboard
+        ON memory_exercise_sessions (exercise_type, difficulty, final_score DESC)
+        WHERE is_completed AND final_score IS NOT NULL;
+
+    SELECT COALESCE(date_trunc('month', MIN(created_at)), date_trunc('month', now()))::DATE
+    INTO partition_month
+    FROM memory_exercise_sessions_legacy;
+
+    WHILE partition_month <= last_month LOOP
+        PERFORM create_memory_session_partition(partition_month);
+        partition_month := (partition_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+
+    CREATE TABLE memory_exercise_sessions_default PARTITION OF memory_exercise_sessions DEFAULT;
+
+    INSERT INTO memory_exercise_sessions SELECT * FROM memory_exercise_sessions_legacy;
+END
+$$;
+
+ANALYZE memory_exercise_sessions;
+
+-- Once the copy is verified:
+-- DROP TABLE memory_exercise_sessions_legacy;
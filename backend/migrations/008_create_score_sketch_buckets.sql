@@ -0,0 +1,19 @@
+-- Migration 008: Create score_sketch_buckets table for score distributions
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- One row per (exercise_type, difficulty) and logarithmic score bucket, with
+-- the number of completed sessions scoring in it (see
+-- app/services/score_distribution.py). Populate from existing sessions with:
+--   python -m app.commands.rebuild_score_sketches
+
+CREATE TABLE IF NOT EXISTS score_sketch_buckets (
+    exercise_type VARCHAR(50) NOT NULL,
+    difficulty VARCHAR(20) NOT NULL,
+    bucket INTEGER NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (exercise_type, difficulty, bucket)
+);
+
+-- Add comment
+COMMENT ON TABLE score_sketch_buckets IS 'Mergeable final score sketches per exercise type and difficulty';
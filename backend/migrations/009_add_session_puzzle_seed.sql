@@ -0,0 +1,12 @@
+-- Migration 009: Record the puzzle seed of each session
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- The seed, with the stored config, reproduces the puzzle the player was
+-- shown (see app/services/puzzle_service.py). Null for sessions whose
+-- puzzle was generated by the client. On the partitioned table (007) the
+-- column is added to every partition.
+
+ALTER TABLE memory_exercise_sessions ADD COLUMN IF NOT EXISTS puzzle_seed INTEGER;
+
+COMMENT ON COLUMN memory_exercise_sessions.puzzle_seed IS 'Seed of the server-generated puzzle, null if generated by the client';
@@ -0,0 +1,21 @@
+-- Migration 010: Replay verification status of completed sessions
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- With VERIFICATION_ENABLED, completed sessions are 'pending' until their
+-- move log has been replayed against their puzzle, then 'verified' or
+-- 'rejected' (see app/services/verification_service.py). Only verified
+-- sessions, and those completed while verification was off (null), are
+-- ranked. On the partitioned table (007) columns and index are added to
+-- every partition.
+
+ALTER TABLE memory_exercise_sessions ADD COLUMN IF NOT EXISTS verification_status VARCHAR(20);
+ALTER TABLE memory_exercise_sessions ADD COLUMN IF NOT EXISTS verification_flags JSON;
+
+COMMENT ON COLUMN memory_exercise_sessions.verification_status IS 'pending, verified or rejected; null if completed without verification';
+COMMENT ON COLUMN memory_exercise_sessions.verification_flags IS 'Checks a rejected session failed';
+
+-- Sweep of sessions whose verification was not queued (full queue, restart)
+CREATE INDEX IF NOT EXISTS idx_memory_sessions_verification_pending
+    ON memory_exercise_sessions (id)
+    WHERE verification_status = 'pending';
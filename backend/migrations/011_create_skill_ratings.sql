@@ -0,0 +1,25 @@
+-- Migration 011: Create skill_ratings table for per-user Glicko ratings
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- One row per (user_id, exercise_type), updated in place by every ranked
+-- completion (see app/services/rating_service.py). Populate from existing
+-- sessions with:
+--   python -m app.commands.rebuild_ratings
+
+CREATE TABLE IF NOT EXISTS skill_ratings (
+    user_id INTEGER NOT NULL,
+    exercise_type VARCHAR(50) NOT NULL,
+    rating DOUBLE PRECISION NOT NULL,
+    deviation DOUBLE PRECISION NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    last_completed_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, exercise_type)
+);
+
+-- Ladders: WHERE exercise_type = ? ORDER BY rating DESC, user_id
+CREATE INDEX IF NOT EXISTS idx_skill_ratings_ladder ON skill_ratings (exercise_type, rating DESC, user_id);
+
+-- Add comment
+COMMENT ON TABLE skill_ratings IS 'Glicko rating and deviation per user and exercise type';
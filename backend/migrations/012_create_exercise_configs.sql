@@ -0,0 +1,29 @@
+-- Migration 012: Intern session configs into exercise_configs
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Sessions reference their config by id instead of each row carrying the
+-- JSON (see app/services/config_service.py), and score_breakdown is only
+-- stored when it differs from the one derived from the session's columns.
+-- First step of three:
+--   1. this migration (new table, nullable config_id, config made optional),
+--   2. python -m app.commands.compact_sessions once the new version is
+--      deployed (configs are hashed in Python, so this cannot be done in
+--      SQL); sessions without a config_id are read from config meanwhile,
+--   3. migration 013 (config_id required, config dropped).
+-- On the partitioned table (007) the column is added to every partition.
+
+CREATE TABLE IF NOT EXISTS exercise_configs (
+    id SERIAL PRIMARY KEY,
+    config_hash VARCHAR(64) NOT NULL,
+    config JSON NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_exercise_configs_hash UNIQUE (config_hash)
+);
+
+ALTER TABLE memory_exercise_sessions ADD COLUMN IF NOT EXISTS config_id INTEGER;
+ALTER TABLE memory_exercise_sessions ALTER COLUMN config DROP NOT NULL;
+
+COMMENT ON TABLE exercise_configs IS 'Distinct exercise configs, keyed by the SHA-256 of their canonical JSON';
+COMMENT ON COLUMN memory_exercise_sessions.config_id IS 'exercise_configs.id of the session config';
+COMMENT ON COLUMN memory_exercise_sessions.score_breakdown IS 'Only when it differs from the breakdown derived from the session columns';
@@ -0,0 +1,15 @@
+-- Migration 013: Drop the inline config of memory_exercise_sessions
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Last step of 012: run once every session has a config_id, i.e. after
+--   python -m app.commands.compact_sessions
+-- has run with the new version deployed (it prints the sizes before and
+-- after); the SET NOT NULL below fails otherwise. Dropping the column does not shrink the table: new rows reuse
+-- the freed space after VACUUM, and VACUUM FULL (exclusive lock) or
+-- pg_repack, partition by partition, returns it to the operating system.
+
+ALTER TABLE memory_exercise_sessions ALTER COLUMN config_id SET NOT NULL;
+ALTER TABLE memory_exercise_sessions DROP COLUMN IF EXISTS config;
+
+VACUUM ANALYZE memory_exercise_sessions;
@@ -0,0 +1,60 @@
+-- Migration 014: Move default partition rows when creating a monthly partition
+-- Author: Jay "The Ermite" Goncalves
+-- Copyright: Jay The Ermite
+--
+-- Replaces create_memory_session_partition from 007. A month whose
+-- partition does not exist yet can already have rows in the default
+-- partition (e.g. sessions dated past the last pre-created month), and
+-- PostgreSQL then refuses CREATE TABLE ... PARTITION OF ("partition
+-- constraint for default partition would be violated"), failing every
+-- later maintain_partitions run. The function now detaches the default
+-- partition, creates the month, moves the month's rows into it and
+-- reattaches the default partition, all in one transaction. The parent is
+-- locked (ACCESS EXCLUSIVE) meanwhile, which only happens when the
+-- default partition does hold rows of the month.
+
+CREATE OR REPLACE FUNCTION create_memory_session_partition(for_month DATE) RETURNS TEXT AS $$
+DECLARE
+    start_at DATE := date_trunc('month', for_month)::DATE;
+    end_at DATE := (date_trunc('month', for_month) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := format('memory_exercise_sessions_p%s', to_char(start_at, 'YYYYMM'));
+    default_name TEXT := 'memory_exercise_sessions_default';
+    moved BIGINT := 0;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhrelid = to_regclass(default_name) AND inhparent = 'memory_exercise_sessions'::regclass
+    ) THEN
+        EXECUTE format(
+            'SELECT count(*) FROM %I WHERE created_at >= %L AND created_at < %L',
+            default_name, start_at, end_at
+        ) INTO moved;
+    END IF;
+
+    IF moved = 0 THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF memory_exercise_sessions FOR VALUES FROM (%L) TO (%L)',
+            partition_name, start_at, end_at
+        );
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format('ALTER TABLE memory_exercise_sessions DETACH PARTITION %I', default_name);
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF memory_exercise_sessions FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_at, end_at
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        default_name, start_at, end_at, partition_name
+    );
+    EXECUTE format('ALTER TABLE memory_exercise_sessions ATTACH PARTITION %I DEFAULT', default_name);
+    RAISE NOTICE 'Moved % rows from % to %', moved, default_name, partition_name;
+    RETURN partition_name;
+END
+$$ LANGUAGE plpgsql;